@@ -0,0 +1,86 @@
+"""Compare wire size and CPU cost of the TCP protocol's framings on typical payloads.
+
+Usage: PYTHONPATH=src python benchmarks/bench_framing.py [--iterations N]
+
+Rows cover NDJSON (the default protocol) and every binary framing ``hello`` can
+negotiate here; options whose optional dependency is missing are skipped.
+"""
+
+import argparse
+import io
+import json
+import time
+
+from cody import framing
+
+PAYLOADS = {
+    "stream_delta": {"ok": True, "request_id": "0f3c9a", "type": "delta", "delta": "token "},
+    "long_reply": {
+        "ok": True,
+        "request_id": "0f3c9a",
+        "reply": "Here is how the router picks a provider. " * 60,
+        "provider": "ollama-cloud",
+        "intent": "explain",
+    },
+    "sandbox_stdout": {
+        "ok": True,
+        "request_id": "0f3c9a",
+        "exit_code": 0,
+        "stdout": "".join(f"step {i}: loss={1 / (i + 1):.6f}\n" for i in range(400)),
+        "stderr": "",
+    },
+}
+
+
+def _ndjson_row(payload: dict, iterations: int) -> tuple[int, float, float]:
+    line = (json.dumps(payload) + "\n").encode("utf-8")
+    start = time.perf_counter()
+    for _ in range(iterations):
+        (json.dumps(payload) + "\n").encode("utf-8")
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(iterations):
+        json.loads(line)
+    decode = time.perf_counter() - start
+    return len(line), encode, decode
+
+
+def _binary_row(
+    codec: framing.FrameCodec, payload: dict, iterations: int
+) -> tuple[int, float, float]:
+    frame = codec.encode(payload)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.encode(payload)
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.read_frame(io.BytesIO(frame))
+    decode = time.perf_counter() - start
+    return len(frame), encode, decode
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'payload':<16} {'framing':<18} {'bytes':>8} {'encode us':>10} {'decode us':>10}")
+    for name, payload in PAYLOADS.items():
+        rows = [("ndjson", _ndjson_row(payload, args.iterations))]
+        for encoding in framing.available_encodings():
+            for compression in framing.available_compressions():
+                codec = framing.FrameCodec(encoding=encoding, compression=compression)
+                rows.append(
+                    (f"{encoding}+{compression}", _binary_row(codec, payload, args.iterations))
+                )
+        for label, (size, encode, decode) in rows:
+            per_call = 1e6 / args.iterations
+            print(
+                f"{name:<16} {label:<18} {size:>8} "
+                f"{encode * per_call:>10.2f} {decode * per_call:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Multi-threaded short-term memory throughput: one global lock vs ``StripedShortTermMemory``.
+
+Usage: PYTHONPATH=src python benchmarks/bench_memory_concurrency.py [--ops N] [--threads 1,2,4,8,16]
+
+Each thread appends turns to its own conversations and reads one back after every
+append, so every operation takes a lock. After each run, the turns still stored plus
+the turns evicted by the ring buffers must equal the number of appends; a lost
+update fails the benchmark.
+
+With the GIL, only one thread runs Python code at a time, so both stores stay
+roughly flat as threads are added. Stripes pay off on free-threaded builds and when
+lock holders are preempted, since a stalled holder then blocks one stripe, not the
+whole store.
+"""
+
+import argparse
+import threading
+import time
+
+from cody.memory import ShortTermMemory, StripedShortTermMemory
+
+CONVERSATIONS_PER_THREAD = 64
+
+
+class GlobalLockShortTerm:
+    """Baseline: the whole store behind one lock."""
+
+    def __init__(self, max_turns: int) -> None:
+        self._lock = threading.Lock()
+        self._memory = ShortTermMemory(max_turns=max_turns, max_bytes=1 << 40)
+
+    def append(self, conversation_id: str, role: str, content: str) -> None:
+        with self._lock:
+            self._memory.append(conversation_id, role, content)
+
+    def turns(self, conversation_id: str) -> list:
+        with self._lock:
+            return list(self._memory.view(conversation_id))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return self._memory.stats()
+
+
+def _run(store, threads: int, ops: int) -> float:
+    per_thread = ops // threads
+    start_line = threading.Barrier(threads + 1)
+
+    def worker(index: int) -> None:
+        start_line.wait()
+        for i in range(per_thread):
+            conversation_id = f"t{index}-c{i % CONVERSATIONS_PER_THREAD}"
+            store.append(conversation_id, "user", "message body")
+            store.turns(conversation_id)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    start_line.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    expected = per_thread * threads
+    stored = sum(
+        len(store.turns(f"t{index}-c{c}"))
+        for index in range(threads)
+        for c in range(CONVERSATIONS_PER_THREAD)
+    )
+    stats = store.stats()
+    if stats["appends"] != expected or stored + stats["evicted_turns"] != expected:
+        raise SystemExit(
+            f"lost updates: {expected} appends, {stored} stored + {stats['evicted_turns']} evicted"
+        )
+    return expected / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--ops", type=int, default=400_000, help="appends per run, split across threads"
+    )
+    parser.add_argument("--threads", default="1,2,4,8,16")
+    parser.add_argument("--stripes", type=int, default=16)
+    args = parser.parse_args()
+    thread_counts = [int(count) for count in args.threads.split(",")]
+    max_turns = 50
+
+    print(f"{'threads':>7} {'global lock ops/s':>18} {'striped ops/s':>14}")
+    for threads in thread_counts:
+        baseline = _run(GlobalLockShortTerm(max_turns), threads, args.ops)
+        striped = _run(
+            StripedShortTermMemory(max_turns=max_turns, max_bytes=1 << 40, stripes=args.stripes),
+            threads,
+            args.ops,
+        )
+        print(f"{threads:>7} {baseline:>18,.0f} {striped:>14,.0f}")
+    print("no lost updates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Short-term memory footprint: ring-buffer ``ShortTermMemory`` vs the old dict-of-lists store.
+
+Usage: PYTHONPATH=src python benchmarks/bench_memory_footprint.py [--conversations N] [--turns T]
+
+Both stores get the same turns. Memory is measured with tracemalloc, and the read
+cost is the time to fetch every conversation's history once.
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from cody.memory import ShortTermMemory
+
+
+class LegacyShortTerm:
+    """The previous implementation: unbounded lists of dicts, copied on every read."""
+
+    def __init__(self) -> None:
+        self.short_term: dict[str, list[dict]] = {}
+
+    def append(self, conversation_id: str, role: str, content: str) -> None:
+        self.short_term.setdefault(conversation_id, []).append({"role": role, "content": content})
+
+    def view(self, conversation_id: str) -> list[dict]:
+        return list(self.short_term.get(conversation_id, []))
+
+
+def _fill(store, conversations: int, turns: int, contents: list[str]) -> None:
+    for turn in range(turns):
+        role = "user" if turn % 2 == 0 else "assistant"
+        for index in range(conversations):
+            store.append(f"conversation-{index}", role, contents[(index + turn) % len(contents)])
+
+
+def _measure(label: str, factory, conversations: int, turns: int, contents: list[str]) -> None:
+    gc.collect()
+    tracemalloc.start()
+    store = factory()
+    _fill(store, conversations, turns, contents)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for index in range(conversations):
+        for _ in store.view(f"conversation-{index}"):
+            pass
+    read = time.perf_counter() - start
+    print(
+        f"{label:<22} {current / 2**20:>10.1f} {peak / 2**20:>10.1f} "
+        f"{read * 1e9 / conversations:>12.0f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=8)
+    args = parser.parse_args()
+
+    # Message bodies are shared so the comparison isolates per-turn and per-conversation overhead.
+    contents = [f"message body {i} " * 4 for i in range(64)]
+    print(f"{args.conversations} conversations x {args.turns} turns")
+    print(f"{'store':<22} {'live MiB':>10} {'peak MiB':>10} {'read ns/conv':>12}")
+    _measure("legacy dict/list", LegacyShortTerm, args.conversations, args.turns, contents)
+    _measure(
+        "ring buffer",
+        lambda: ShortTermMemory(max_turns=args.turns, max_bytes=1 << 40),
+        args.conversations,
+        args.turns,
+        contents,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""BM25 top-k latency over long-term memory summaries.
+
+Usage: PYTHONPATH=src python benchmarks/bench_memory_retrieval.py [--summaries N]
+       [--queries Q] [--k K]
+
+Fills a temporary ``LongTermMemory`` with synthetic summaries drawn from a Zipf-like
+vocabulary. It then times ``search`` for two kinds of four-word queries: words taken
+from one stored summary ("related"), and words picked independently ("unrelated").
+"""
+
+import argparse
+import itertools
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from cody.memory import LongTermMemory
+
+VOCABULARY = [f"term{i}" for i in range(20_000)]
+CUMULATIVE_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS, k=words))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--summaries", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = LongTermMemory(path=Path(directory) / "memory.sqlite")
+        start = time.perf_counter()
+        batch = 10_000
+        for offset in range(0, args.summaries, batch):
+            store.save_many(
+                [
+                    {
+                        "topic": _text(rng, 2),
+                        "summary": _text(rng, 30),
+                        "conversation_id": f"c{offset + i}",
+                    }
+                    for i in range(min(batch, args.summaries - offset))
+                ]
+            )
+        print(f"indexed {args.summaries} summaries in {time.perf_counter() - start:.1f}s")
+
+        rows = [summary["summary"].split() for summary in store.recent(limit=args.queries)]
+        related = [" ".join(rng.sample(words, 4)) for words in rows]
+        # Mid-frequency words drawn independently, so no single summary is a clear match.
+        unrelated = [
+            " ".join(rng.choice(VOCABULARY[200:5000]) for _ in range(4))
+            for _ in range(args.queries)
+        ]
+        results = {
+            label: _time_queries(store, queries, args.k)
+            for label, queries in (("related", related), ("unrelated", unrelated))
+        }
+        store.close()
+
+    for label, samples in results.items():
+        samples.sort()
+        print(
+            f"top-{args.k} search ({label} terms): p50 {samples[len(samples) // 2] * 1e3:.2f} ms, "
+            f"p99 {samples[int(len(samples) * 0.99)] * 1e3:.2f} ms, "
+            f"mean {statistics.fmean(samples) * 1e3:.2f} ms"
+        )
+
+
+def _time_queries(store: LongTermMemory, queries: list[str], k: int) -> list[float]:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        store.search(query, k)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+if __name__ == "__main__":
+    main()
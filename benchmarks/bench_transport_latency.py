@@ -0,0 +1,116 @@
+"""Round-trip latency of the NDJSON protocol over loopback TCP vs a Unix domain socket.
+
+Usage: PYTHONPATH=src python benchmarks/bench_transport_latency.py [--requests N]
+
+Both threaded and asyncio servers are started in-process and answer ``ping``, so
+the numbers are transport plus protocol overhead with no model or sandbox work.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+from cody.async_tcp_server import AsyncTCPServer
+from cody.tcp_server import NDJSONRequestHandler, ThreadedTCPServer, ThreadedUnixServer
+
+PING = b'{"cmd":"ping","request_id":"b"}\n'
+
+
+class _NoRouter:
+    """``ping`` never touches the router; this keeps the servers from building a real one."""
+
+    def metrics(self) -> dict:
+        return {}
+
+
+def _measure(connect, requests: int) -> list[float]:
+    with connect() as sock:
+        reader = sock.makefile("rb")
+        for _ in range(100):  # warm up
+            sock.sendall(PING)
+            reader.readline()
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            sock.sendall(PING)
+            reader.readline()
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _tcp(port: int):
+    def connect() -> socket.socket:
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    return connect
+
+
+def _unix(path: str):
+    def connect() -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        return sock
+
+    return connect
+
+
+def _report(label: str, samples: list[float]) -> None:
+    samples.sort()
+    p50 = samples[len(samples) // 2] * 1e6
+    p99 = samples[int(len(samples) * 0.99)] * 1e6
+    print(f"{label:<22} {p50:>9.1f} {p99:>9.1f} {statistics.fmean(samples) * 1e6:>9.1f}")
+
+
+def _bench_threaded(directory: str, requests: int) -> None:
+    tcp = ThreadedTCPServer(("127.0.0.1", 0), NDJSONRequestHandler)
+    unix = ThreadedUnixServer(os.path.join(directory, "threaded.sock"), NDJSONRequestHandler)
+    for server in (tcp, unix):
+        server.router = _NoRouter()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        _report("threaded tcp", _measure(_tcp(tcp.server_address[1]), requests))
+        _report("threaded unix", _measure(_unix(unix.server_address), requests))
+    finally:
+        for server in (tcp, unix):
+            server.shutdown()
+            server.server_close()
+
+
+def _bench_async(directory: str, requests: int) -> None:
+    loop = asyncio.new_event_loop()
+    server = AsyncTCPServer(
+        router=_NoRouter(), port=0, unix_path=os.path.join(directory, "async.sock")
+    )
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        _report("asyncio tcp", _measure(_tcp(server.port), requests))
+        _report("asyncio unix", _measure(_unix(server.unix_path), requests))
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'server':<22} {'p50 us':>9} {'p99 us':>9} {'mean us':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        _bench_threaded(directory, args.requests)
+        _bench_async(directory, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 """FastAPI UI entrypoint for Cody."""
 
+import json
 import logging
+import socket
 import textwrap
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager
 
-from . import config, llm, sandbox, status
+from . import async_tcp_server, config, listeners, llm, sandbox, status, transport
 
 # Configure logging to see LLM routing details
 logging.basicConfig(
@@ -12,26 +17,47 @@ logging.basicConfig(
 )
 
 
+API_HOST = "0.0.0.0"
+API_PORT = 8000
+
+
 def _build_router() -> llm.LLMRouter:
-    return llm.LLMRouter(
-        intent_client=llm.OllamaClient(config.DEFAULT_SETTINGS.ollama_intent_url),
-        primary_client=llm.OllamaClient(config.DEFAULT_SETTINGS.ollama_primary_url),
-        fallback_client=llm.OllamaClient(config.DEFAULT_SETTINGS.ollama_fallback_url),
-    )
+    return llm.build_router(config.DEFAULT_SETTINGS)
 
 
 ROUTER = _build_router()
+# Chat endpoints await provider I/O on the event loop; state is shared with ROUTER.
+ASYNC_ROUTER = llm.AsyncLLMRouter.from_router(ROUTER)
 
 try:
     from fastapi import FastAPI
-    from fastapi.responses import HTMLResponse
+    from fastapi.responses import HTMLResponse, StreamingResponse
     from pydantic import BaseModel
 except ImportError:
     FastAPI = None
     HTMLResponse = None
+    StreamingResponse = None
     BaseModel = object
 
 
+def _encode_sse(event: dict, request_id: str) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps({'request_id': request_id, **event})}\n\n"
+
+
+def format_sse_events(events: Iterator[dict], request_id: str) -> Iterator[str]:
+    """Encode router stream events as Server-Sent Events tagged with the request id."""
+    for event in events:
+        yield _encode_sse(event, request_id)
+
+
+async def format_sse_events_async(
+    events: AsyncIterator[dict], request_id: str
+) -> AsyncIterator[str]:
+    """Async variant of ``format_sse_events`` for ``AsyncLLMRouter.route_chat_stream``."""
+    async for event in events:
+        yield _encode_sse(event, request_id)
+
+
 def render_chat_page() -> str:
     """Render a lightweight in-browser chat client for the /chat API."""
 
@@ -145,11 +171,46 @@ def render_chat_page() -> str:
 
 
 if FastAPI:
-    app = FastAPI(title="Cody API UI")
+    @asynccontextmanager
+    async def _lifespan(_: "FastAPI") -> AsyncIterator[None]:
+        """Start background workers in the serving process and stop them on shutdown."""
+        pool = sandbox.start_default_pool(config.DEFAULT_SETTINGS.sandbox_pool_size)
+        probe = ROUTER.start_health_probe(config.DEFAULT_SETTINGS.health_probe_interval_seconds)
+        ROUTER.start_memory_workers(config.DEFAULT_SETTINGS.long_term_compact_interval_seconds)
+        replayer = ROUTER.start_replay_worker(
+            config.DEFAULT_SETTINGS.pending_replay_interval_seconds
+        )
+        models = None
+        if config.DEFAULT_SETTINGS.model_preload:
+            models = ROUTER.start_model_manager(
+                config.DEFAULT_SETTINGS.model_touch_interval_seconds,
+                config.DEFAULT_SETTINGS.timeout_ceiling_seconds,
+            )
+        try:
+            yield
+        finally:
+            probe.stop()
+            replayer.stop()
+            if models is not None:
+                models.stop()
+            ROUTER.stop_memory_workers()
+            transport.close_async_pools()
+            if pool is not None:
+                pool.close()
+
+
+    app = FastAPI(title="Cody API UI", lifespan=_lifespan)
 
 
     class ChatRequest(BaseModel):
         message: str
+        conversation_id: str | None = None
+
+
+    class BatchRequest(BaseModel):
+        items: list
+        stream: bool = False
+        parallelism: int | None = None
 
 
     class RunRequest(BaseModel):
@@ -169,12 +230,72 @@ if FastAPI:
 
     @app.get("/status")
     def status_endpoint() -> dict:
-        return {"phase_1": status.get_phase_1_status(), "phase_2": status.get_phase_2_status(), "phase_3": status.get_phase_3_status()}
+        return {
+            "phase_1": status.get_phase_1_status(),
+            "phase_2": status.get_phase_2_status(),
+            "phase_3": status.get_phase_3_status(),
+            "sandbox_pool": sandbox.pool_stats(),
+            "sandbox_coalescing": sandbox.coalescing_stats(),
+            "http_pools": transport.pool_stats(),
+            "http_pools_async": transport.async_pool_stats(),
+            "router": ASYNC_ROUTER.metrics(),
+        }
 
 
     @app.post("/chat")
-    def chat(body: ChatRequest) -> dict:
-        return ROUTER.route_chat(body.message, recipient="api-http")
+    async def chat(body: ChatRequest) -> dict:
+        return await ASYNC_ROUTER.route_chat(
+            body.message, recipient="api-http", conversation_id=body.conversation_id or None
+        )
+
+
+    @app.post("/chat/stream")
+    async def chat_stream(body: ChatRequest) -> StreamingResponse:
+        """Stream reply tokens as Server-Sent Events, ending with a `final` event."""
+        request_id = uuid.uuid4().hex
+        events = ASYNC_ROUTER.route_chat_stream(
+            body.message,
+            request_id=request_id,
+            recipient="api-http",
+            conversation_id=body.conversation_id or None,
+        )
+        return StreamingResponse(
+            format_sse_events_async(events, request_id),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+
+    @app.get("/results/{request_id}")
+    def pending_result(request_id: str, token: str) -> dict:
+        """Answer to a chat that was stubbed during an outage, once the replay worker has it.
+
+        `token` is the `result_token` from the stub reply.
+        """
+        return {"request_id": request_id, **ASYNC_ROUTER.pending_result(request_id, token)}
+
+
+    @app.post("/batch", response_model=None)
+    async def run_batch(body: BatchRequest) -> dict | StreamingResponse:
+        """Run TCP-protocol commands (`chat`, `run`, ...) concurrently.
+
+        Returns every result in item order, or with `stream` set, NDJSON item frames
+        as they finish followed by a `final` summary.
+        """
+        request_id = uuid.uuid4().hex
+        payload = {"cmd": "batch", **body.model_dump(exclude_none=True)}
+        if not body.stream:
+            return await async_tcp_server.handle_command_async(
+                payload, ASYNC_ROUTER, request_id=request_id, recipient="api-http"
+            )
+
+        async def frames() -> AsyncIterator[str]:
+            async for frame in async_tcp_server.stream_batch_async(
+                payload, ASYNC_ROUTER, request_id, recipient="api-http"
+            ):
+                yield json.dumps(frame) + "\n"
+
+        return StreamingResponse(frames(), media_type="application/x-ndjson")
 
 
     @app.post("/run")
@@ -188,8 +309,13 @@ else:
     app = None
 
 
-def main() -> None:
-    """Start the FastAPI server using uvicorn."""
+def main(reuse_port: bool = False) -> None:
+    """Start the FastAPI server using uvicorn.
+
+    With ``reuse_port`` the listening socket is bound with SO_REUSEPORT so several
+    supervisor workers can serve the same port. ``CODY_API_UNIX_SOCKET`` adds a Unix
+    domain socket listener next to the TCP port for co-located clients.
+    """
     if app is None:
         print("FastAPI/uvicorn not installed. Install requirements and run: python -m cody.api_ui")
         return
@@ -200,7 +326,32 @@ def main() -> None:
         print("uvicorn not installed. Install uvicorn and rerun.")
         return
 
-    uvicorn.run("cody.api_ui:app", host="0.0.0.0", port=8000, reload=False)
+    settings = config.DEFAULT_SETTINGS
+    if not reuse_port and not settings.api_unix_socket_path:
+        uvicorn.run("cody.api_ui:app", host=API_HOST, port=API_PORT, reload=False)
+        return
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((API_HOST, API_PORT))
+    sockets = [sock]
+    owns_unix_path = False
+    if settings.api_unix_socket_path:
+        unix_sock, owns_unix_path = listeners.unix_listener(
+            settings.api_unix_socket_path, settings.unix_socket_mode
+        )
+        sockets.append(unix_sock)
+        print(f"Cody API listening on unix:{settings.api_unix_socket_path}")
+    server = uvicorn.Server(
+        uvicorn.Config("cody.api_ui:app", host=API_HOST, port=API_PORT, reload=False)
+    )
+    try:
+        server.run(sockets=sockets)
+    finally:
+        if owns_unix_path and settings.api_unix_socket_path:
+            listeners.remove_unix_socket(settings.api_unix_socket_path)
 
 
 if __name__ == "__main__":
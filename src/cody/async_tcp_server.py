@@ -0,0 +1,422 @@
+"""Asyncio NDJSON TCP server for Cody.
+
+Speaks the same wire protocol as ``tcp_server``, with one coroutine per connection.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import uuid
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+
+from . import batch, config, framing, listeners, llm, sandbox, tcp_server
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None  # type: ignore[assignment]
+
+
+async def handle_command_async(
+    payload: dict,
+    router: llm.AsyncLLMRouter,
+    request_id: str | None = None,
+    recipient: str = "unknown",
+) -> dict:
+    """Async ``tcp_server.handle_command``: chat is awaited, sandbox runs go to a worker thread."""
+    cmd = payload.get("cmd")
+    if cmd == "chat":
+        routed = await router.route_chat(
+            payload.get("message", ""),
+            request_id=request_id,
+            recipient=recipient,
+            conversation_id=tcp_server.chat_conversation_id(payload),
+        )
+        return {"ok": True, **routed}
+    if cmd == "run" and payload.get("language") == "python":
+        return await asyncio.to_thread(sandbox.run_python_in_docker, payload.get("code", ""))
+    if cmd == "batch":
+        error = batch.validate_batch(payload, config.DEFAULT_SETTINGS.batch_max_items)
+        if error is not None:
+            return error
+        results: list[dict] = [{}] * len(payload["items"])
+        async for index, result in _iter_batch(
+            payload, router, request_id or uuid.uuid4().hex, recipient
+        ):
+            results[index] = result
+        return batch.summarize(results)
+    if cmd == "ping":
+        return tcp_server.handle_command(payload)
+    # Status and get_result read provider health and the pending-result store (SQLite),
+    # so they run on a worker thread against the wrapped sync router.
+    response = await asyncio.to_thread(
+        tcp_server.handle_command,
+        payload,
+        router=router.router,
+        request_id=request_id,
+        recipient=recipient,
+    )
+    if "router" in response:
+        response["router"] = {**response["router"], "async_coalescing": router.flights.stats()}
+    return response
+
+
+async def handle_command_stream_async(
+    payload: dict,
+    router: llm.AsyncLLMRouter,
+    request_id: str | None = None,
+    recipient: str = "unknown",
+) -> AsyncIterator[dict]:
+    """Async ``tcp_server.handle_command_stream``."""
+    if payload.get("cmd") == "batch" and payload.get("stream"):
+        async for frame in stream_batch_async(
+            payload, router, request_id or uuid.uuid4().hex, recipient
+        ):
+            yield frame
+        return
+    if payload.get("cmd") != "chat" or not payload.get("stream"):
+        yield await handle_command_async(
+            payload, router, request_id=request_id, recipient=recipient
+        )
+        return
+
+    async for event in router.route_chat_stream(
+        payload.get("message", ""),
+        request_id=request_id,
+        recipient=recipient,
+        conversation_id=tcp_server.chat_conversation_id(payload),
+    ):
+        yield {"ok": True, "request_id": request_id, **event}
+
+
+class _Connection:
+    """Per-connection write serialization and in-flight command bookkeeping."""
+
+    __slots__ = ("writer", "slots", "tasks", "closed", "codec", "commands_seen", "_write_lock")
+
+    def __init__(self, writer: asyncio.StreamWriter, slots: asyncio.Semaphore) -> None:
+        self.writer = writer
+        self.slots = slots
+        self.tasks: set[asyncio.Task] = set()
+        self.closed = False
+        # Set once a ``hello`` switches the connection to binary frames.
+        self.codec: framing.FrameCodec | None = None
+        self.commands_seen = False
+        self._write_lock = asyncio.Lock()
+
+    async def send(self, body: dict) -> bool:
+        """Write one frame; returns False once the client has gone away."""
+        if self.closed:
+            return False
+        async with self._write_lock:
+            self.closed = not await AsyncTCPServer._send(self.writer, body, self.codec)
+        return not self.closed
+
+    async def handshake(self, payload: dict, request_id: str, max_frame_bytes: int) -> None:
+        """Answer ``hello`` in NDJSON, then switch this connection to binary frames."""
+        if self.commands_seen or self.codec is not None:
+            await self.send(
+                tcp_server.tag_frame({"ok": False, "error": "hello_must_be_first"}, request_id)
+            )
+            return
+        codec, response = framing.negotiate(payload, max_frame_bytes=max_frame_bytes)
+        async with self._write_lock:
+            self.closed = not await AsyncTCPServer._send(
+                self.writer, tcp_server.tag_frame(response, request_id), None
+            )
+            self.codec = codec
+
+
+async def _iter_batch(
+    payload: dict, router: llm.AsyncLLMRouter, request_id: str, recipient: str
+) -> AsyncIterator[tuple[int, dict]]:
+    items = payload["items"]
+
+    async def execute(item: dict, index: int) -> dict:
+        return await handle_command_async(
+            item,
+            router,
+            request_id=batch.item_request_id(item, request_id, index),
+            recipient=recipient,
+        )
+
+    async for index, result in batch.iter_batch_async(
+        items, execute, tcp_server.batch_parallelism(payload)
+    ):
+        yield index, batch.tag_result(items, index, request_id, result)
+
+
+async def stream_batch_async(
+    payload: dict, router: llm.AsyncLLMRouter, request_id: str, recipient: str
+) -> AsyncIterator[dict]:
+    """Item frames as each batch item finishes, then a final summary (``tcp_server`` framing)."""
+    error = batch.validate_batch(payload, config.DEFAULT_SETTINGS.batch_max_items)
+    if error is not None:
+        yield error
+        return
+    failed = 0
+    async for index, result in _iter_batch(payload, router, request_id, recipient):
+        failed += not result.get("ok")
+        yield {
+            "ok": True,
+            "request_id": request_id,
+            "type": "item",
+            "index": index,
+            "result": result,
+        }
+    yield {
+        "ok": True,
+        "request_id": request_id,
+        "type": "final",
+        "count": len(payload["items"]),
+        "failed": failed,
+    }
+
+
+@dataclass
+class AsyncTCPServer:
+    """NDJSON server where an idle connection costs a coroutine and a read buffer, not a thread.
+
+    One ``AsyncLLMRouter`` serves every connection. Connections beyond
+    ``max_connections`` get a ``server_busy`` error and are closed, and request lines
+    longer than ``max_line_bytes`` get ``line_too_long`` and close the connection.
+    Together these keep memory bounded. Each connection runs up to ``max_in_flight``
+    commands concurrently and writes replies, tagged with ``request_id``, as they finish.
+
+    With ``unix_path`` set the same handler also listens on a Unix domain socket
+    (file permissions ``unix_mode``); ``tcp_enabled=False`` serves only that socket.
+    """
+
+    router: llm.AsyncLLMRouter
+    host: str = "127.0.0.1"
+    port: int = 8888
+    max_connections: int = 10_000
+    max_line_bytes: int = 1024 * 1024
+    max_in_flight: int = 8
+    reuse_port: bool = False  # SO_REUSEPORT, for supervisor workers sharing one port
+    tcp_enabled: bool = True
+    unix_path: str | None = None
+    unix_mode: int = listeners.DEFAULT_MODE
+    logger: logging.Logger = field(default_factory=lambda: logging.getLogger("cody.tcp"))
+
+    def __post_init__(self) -> None:
+        self._servers: list[asyncio.Server] = []
+        self._owns_unix_path = False
+        self._open = 0
+        self._stats = {"accepted": 0, "rejected": 0, "peak": 0}
+
+    async def start(self) -> None:
+        backlog = min(self.max_connections, 4096)
+        if self.tcp_enabled:
+            server = await asyncio.start_server(
+                self._serve_connection,
+                self.host,
+                self.port,
+                limit=self.max_line_bytes,
+                backlog=backlog,
+                reuse_port=self.reuse_port or None,
+            )
+            self._servers.append(server)
+            # Port 0 binds an ephemeral port; report the real one.
+            self.port = server.sockets[0].getsockname()[1]
+        if self.unix_path:
+            sock, self._owns_unix_path = listeners.unix_listener(self.unix_path, self.unix_mode)
+            self._servers.append(
+                await asyncio.start_unix_server(
+                    self._serve_connection, sock=sock, limit=self.max_line_bytes, backlog=backlog
+                )
+            )
+
+    async def serve_forever(self) -> None:
+        if not self._servers:
+            await self.start()
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in self._servers))
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        servers, self._servers = self._servers, []
+        for server in servers:
+            server.close()
+        for server in servers:
+            await server.wait_closed()
+        if self._owns_unix_path and self.unix_path:
+            listeners.remove_unix_socket(self.unix_path)
+            self._owns_unix_path = False
+
+    def stats(self) -> dict:
+        return {**self._stats, "open": self._open, "max_connections": self.max_connections}
+
+    async def _serve_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        if self._open >= self.max_connections:
+            self._stats["rejected"] += 1
+            self.logger.warning("tcp.connection.rejected reason=server_busy open=%s", self._open)
+            await self._send(writer, {"ok": False, "error": "server_busy"})
+            await self._close(writer)
+            return
+
+        self._open += 1
+        self._stats["accepted"] += 1
+        self._stats["peak"] = max(self._stats["peak"], self._open)
+        peer = writer.get_extra_info("peername")
+        # Unix socket peers have no address; TCP peers are identified by their IP.
+        recipient = peer[0] if peer else "unix-client"
+        connection = _Connection(writer, asyncio.Semaphore(self.max_in_flight))
+        try:
+            while not connection.closed:
+                try:
+                    payload, error, done = await self._read_request(reader, connection, recipient)
+                except ConnectionError:
+                    break
+                if done:
+                    break
+                if error is not None:
+                    await connection.send(error)
+                    continue
+                if payload is None:
+                    continue
+
+                request_id = payload.get("request_id") or uuid.uuid4().hex
+                if payload.get("cmd") == "hello":
+                    await connection.handshake(payload, request_id, self.max_line_bytes)
+                    continue
+                connection.commands_seen = True
+                await connection.slots.acquire()
+                task = asyncio.create_task(
+                    self._run_command(connection, payload, request_id, recipient)
+                )
+                connection.tasks.add(task)
+                task.add_done_callback(connection.tasks.discard)
+            if connection.tasks:
+                # Finish in-flight commands for a client that half-closed after its last request.
+                await asyncio.gather(*connection.tasks, return_exceptions=True)
+        finally:
+            for task in connection.tasks:
+                task.cancel()
+            self._open -= 1
+            await self._close(writer)
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader, connection: "_Connection", recipient: str
+    ) -> tuple[dict | None, dict | None, bool]:
+        """Return ``(payload, error_response, end_of_stream)`` for the next NDJSON line or frame."""
+        if connection.codec is not None:
+            try:
+                payload = await connection.codec.read_frame_async(reader)
+            except framing.FramingError as exc:
+                # A bad frame leaves the byte stream unsynchronized; report it and hang up.
+                self.logger.info(
+                    "tcp.connection.closed recipient=%s reason=invalid_frame", recipient
+                )
+                await connection.send({"ok": False, "error": "invalid_frame", "message": str(exc)})
+                return None, None, True
+            if payload is None:
+                return None, None, True
+            if not isinstance(payload, dict):
+                return None, {"ok": False, "error": "invalid_message_type"}, False
+            return payload, None, False
+        try:
+            raw = await reader.readline()
+        except ValueError:
+            # The line exceeded the stream limit; the rest of it cannot be re-framed.
+            self.logger.info("tcp.connection.closed recipient=%s reason=line_too_long", recipient)
+            await connection.send({"ok": False, "error": "line_too_long"})
+            return None, None, True
+        if not raw:
+            return None, None, True
+        payload, error = tcp_server.parse_request_line(raw)
+        return payload, error, False
+
+    async def _run_command(
+        self, connection: "_Connection", payload: dict, request_id: str, recipient: str
+    ) -> None:
+        try:
+            async for frame in handle_command_stream_async(
+                payload, self.router, request_id=request_id, recipient=recipient
+            ):
+                if not await connection.send(tcp_server.tag_frame(frame, request_id)):
+                    return
+        except Exception as exc:  # one failing command must not take the connection down
+            await connection.send(
+                tcp_server.tag_frame(
+                    {"ok": False, "error": "internal_error", "message": str(exc)}, request_id
+                )
+            )
+        finally:
+            connection.slots.release()
+
+    @staticmethod
+    async def _send(
+        writer: asyncio.StreamWriter, body: dict, codec: framing.FrameCodec | None = None
+    ) -> bool:
+        """Write one frame; returns False once the client has gone away."""
+        try:
+            writer.write(codec.encode(body) if codec else (json.dumps(body) + "\n").encode("utf-8"))
+            await writer.drain()
+        except ConnectionError:
+            return False
+        return True
+
+    @staticmethod
+    async def _close(writer: asyncio.StreamWriter) -> None:
+        writer.close()
+        with contextlib.suppress(ConnectionError):
+            await writer.wait_closed()
+
+
+def _raise_open_file_limit(connections: int) -> None:
+    """Lift the soft RLIMIT_NOFILE so the connection cap, not the fd limit, is what binds."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = connections + 256  # headroom for pools, logs and the listening socket
+    if hard != resource.RLIM_INFINITY:
+        wanted = min(wanted, hard)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+def main(reuse_port: bool = False) -> None:
+    settings = config.DEFAULT_SETTINGS
+    if not settings.tcp_enabled and not settings.unix_socket_path:
+        print("Nothing to serve: enable TCP (CODY_TCP_ENABLED) or set CODY_UNIX_SOCKET")
+        return
+    _raise_open_file_limit(settings.tcp_max_connections)
+    sandbox.start_default_pool(settings.sandbox_pool_size)
+    router = llm.build_router(settings)
+    router.start_health_probe(settings.health_probe_interval_seconds)
+    router.start_memory_workers(settings.long_term_compact_interval_seconds)
+    router.start_replay_worker(settings.pending_replay_interval_seconds)
+    if settings.model_preload:
+        router.start_model_manager(
+            settings.model_touch_interval_seconds, settings.timeout_ceiling_seconds
+        )
+    server = AsyncTCPServer(
+        router=llm.AsyncLLMRouter.from_router(router),
+        host=settings.tcp_host,
+        port=settings.tcp_port,
+        max_connections=settings.tcp_max_connections,
+        max_line_bytes=settings.tcp_max_line_bytes,
+        max_in_flight=settings.tcp_max_in_flight,
+        reuse_port=reuse_port,
+        tcp_enabled=settings.tcp_enabled,
+        unix_path=settings.unix_socket_path,
+        unix_mode=settings.unix_socket_mode,
+    )
+    if settings.tcp_enabled:
+        print(f"Cody async TCP server listening on {settings.tcp_host}:{settings.tcp_port}")
+    if settings.unix_socket_path:
+        print(f"Cody async TCP server listening on unix:{settings.unix_socket_path}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Batch execution of protocol commands with bounded parallelism and per-item error isolation."""
+
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from concurrent import futures
+
+
+def validate_batch(payload: dict, max_items: int) -> dict | None:
+    """Return an error response if ``payload["items"]`` is not a usable batch, else None."""
+    items = payload.get("items")
+    if not isinstance(items, list) or not items:
+        return {"ok": False, "error": "invalid_batch", "message": "items must be a non-empty list"}
+    if len(items) > max_items:
+        return {"ok": False, "error": "batch_too_large", "max_items": max_items}
+    return None
+
+
+def item_request_id(item: object, request_id: str, index: int) -> str:
+    """Items keep their own ``request_id``; otherwise they get ``<batch id>.<index>``."""
+    if isinstance(item, dict) and item.get("request_id"):
+        return str(item["request_id"])
+    return f"{request_id}.{index}"
+
+
+def tag_result(items: list, index: int, request_id: str, result: dict) -> dict:
+    """Label one item's result with its position and request id."""
+    return {
+        "index": index,
+        "request_id": item_request_id(items[index], request_id, index),
+        **result,
+    }
+
+
+def summarize(results: list[dict]) -> dict:
+    """Response for a non-streamed batch: every result in item order plus a failure count."""
+    return {
+        "ok": True,
+        "results": results,
+        "failed": sum(1 for result in results if not result.get("ok")),
+    }
+
+
+def _check_item(item: object) -> dict | None:
+    if not isinstance(item, dict):
+        return {"ok": False, "error": "invalid_message_type"}
+    if item.get("cmd") == "batch":
+        return {"ok": False, "error": "nested_batch"}
+    return None
+
+
+def _failure(exc: Exception) -> dict:
+    return {"ok": False, "error": "internal_error", "message": str(exc)}
+
+
+def iter_batch(
+    items: list, execute: Callable[[dict, int], dict], max_parallelism: int
+) -> Iterator[tuple[int, dict]]:
+    """Run ``execute(item, index)`` on a thread pool and yield ``(index, result)`` as items finish.
+
+    An invalid item or one whose ``execute`` raises produces an error result; the
+    other items are unaffected.
+    """
+    with futures.ThreadPoolExecutor(
+        max_workers=max(1, min(max_parallelism, len(items))), thread_name_prefix="cody-batch"
+    ) as executor:
+        pending = {}
+        for index, item in enumerate(items):
+            error = _check_item(item)
+            if error is not None:
+                yield index, error
+                continue
+            pending[executor.submit(execute, item, index)] = index
+        for future in futures.as_completed(pending):
+            try:
+                result = future.result()
+            except Exception as exc:
+                result = _failure(exc)
+            yield pending[future], result
+
+
+def run_batch(
+    items: list, execute: Callable[[dict, int], dict], max_parallelism: int
+) -> list[dict]:
+    """Like ``iter_batch`` but returns the results in item order."""
+    results: list[dict] = [{}] * len(items)
+    for index, result in iter_batch(items, execute, max_parallelism):
+        results[index] = result
+    return results
+
+
+async def iter_batch_async(
+    items: list, execute: Callable[[dict, int], Awaitable[dict]], max_parallelism: int
+) -> AsyncIterator[tuple[int, dict]]:
+    """Async ``iter_batch``: at most ``max_parallelism`` coroutines run at once."""
+    slots = asyncio.Semaphore(max(1, max_parallelism))
+
+    async def run(item: object, index: int) -> tuple[int, dict]:
+        error = _check_item(item)
+        if error is not None or not isinstance(item, dict):  # _check_item rejects non-dicts
+            return index, error or {"ok": False, "error": "invalid_message_type"}
+        async with slots:
+            try:
+                return index, await execute(item, index)
+            except Exception as exc:
+                return index, _failure(exc)
+
+    tasks = [asyncio.ensure_future(run(item, index)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def run_batch_async(
+    items: list, execute: Callable[[dict, int], Awaitable[dict]], max_parallelism: int
+) -> list[dict]:
+    """Like ``iter_batch_async`` but returns the results in item order."""
+    results: list[dict] = [{}] * len(items)
+    async for index, result in iter_batch_async(items, execute, max_parallelism):
+        results[index] = result
+    return results
@@ -0,0 +1,181 @@
+"""Exact-match response cache for LLM replies with TTL, LRU byte budget and optional disk tier."""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+# Rough per-entry bookkeeping overhead so tiny replies still count against the budget.
+_ENTRY_OVERHEAD_BYTES = 128
+
+
+def normalize_message(message: str) -> str:
+    """Collapse whitespace so trivially different spellings of a prompt share an entry."""
+    return " ".join(message.split())
+
+
+def cache_key(model: str, system_prompt: str, message: str) -> str:
+    """Stable key over the model, the system prompt and the normalized message."""
+    material = json.dumps([model, system_prompt, normalize_message(message)], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ResponseCache:
+    """In-memory LRU bounded by ``max_bytes`` with per-entry TTL.
+
+    When ``path`` is set, entries are also written to a SQLite file so they survive
+    restarts; memory misses fall through to that tier and hits are promoted back.
+    """
+
+    max_bytes: int = 16 * 1024 * 1024
+    ttl_seconds: float = 3600.0
+    path: Path | None = None
+    max_disk_entries: int = 100_000
+    clock: Callable[[], float] = time.time
+    prune_every: int = 256
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        # key -> (reply, provider, expires_at, size); insertion order is LRU order.
+        self._entries: OrderedDict[str, tuple[str, str, float, int]] = OrderedDict()
+        self._disk_writes = 0
+        self._bytes = 0
+        self._db: sqlite3.Connection | None = None
+        self._stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+
+    def get(self, key: str) -> dict | None:
+        """Return ``{"reply", "provider"}`` for a live entry, or None."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                reply, provider, expires_at, _ = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return {"reply": reply, "provider": provider}
+                self._drop(key)
+                self._stats["expired"] += 1
+
+            row = self._disk_get(key, now)
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            reply, provider, expires_at = row
+            self._insert(key, reply, provider, expires_at)
+            self._stats["disk_hits"] += 1
+            return {"reply": reply, "provider": provider}
+
+    def put(self, key: str, reply: str, provider: str) -> None:
+        expires_at = self.clock() + self.ttl_seconds
+        with self._lock:
+            self._insert(key, reply, provider, expires_at)
+            self._stats["stores"] += 1
+            self._disk_put(key, reply, provider, expires_at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            db = self._connect()
+            if db is not None:
+                with db:
+                    db.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hit_rate = (
+                (self._stats["hits"] + self._stats["disk_hits"]) / lookups if lookups else 0.0
+            )
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": round(hit_rate, 4),
+                "disk": self.path is not None,
+            }
+
+    def _insert(self, key: str, reply: str, provider: str, expires_at: float) -> None:
+        size = len(reply.encode("utf-8")) + len(key) + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (reply, provider, expires_at, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._stats["evictions"] += 1
+
+    def _drop(self, key: str) -> None:
+        _, _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _connect(self) -> sqlite3.Connection | None:
+        if self.path is None:
+            return None
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, reply TEXT NOT NULL, provider TEXT NOT NULL, "
+                "expires_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires_at)"
+            )
+        return self._db
+
+    def _disk_get(self, key: str, now: float) -> tuple[str, str, float] | None:
+        db = self._connect()
+        if db is None:
+            return None
+        row: tuple[str, str, float] | None = db.execute(
+            "SELECT reply, provider, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+            (key, now),
+        ).fetchone()
+        return row
+
+    def _disk_put(self, key: str, reply: str, provider: str, expires_at: float) -> None:
+        db = self._connect()
+        if db is None:
+            return
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, reply, provider, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, reply, provider, expires_at),
+            )
+            self._disk_writes += 1
+            if self._disk_writes % self.prune_every:
+                return
+            db.execute("DELETE FROM responses WHERE expires_at <= ?", (self.clock(),))
+            db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
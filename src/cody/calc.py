@@ -0,0 +1,137 @@
+"""In-process arithmetic evaluator for the math fast path.
+
+Evaluates a restricted AST (numeric literals and arithmetic operators only) with
+caps on operand size, exponent size and evaluation steps. Anything outside that
+subset, or anything that would exceed a cap, is declined by returning None so the
+caller can fall back to the Docker sandbox.
+"""
+
+import ast
+import math
+import operator
+from collections.abc import Callable
+from dataclasses import dataclass
+
+Number = int | float
+
+_BINARY_OPS: dict[type[ast.operator], Callable[[float, float], float]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+_UNARY_OPS: dict[type[ast.unaryop], Callable[[float], float]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+@dataclass(frozen=True)
+class CalcLimits:
+    """Bounds that keep in-process evaluation cheap and predictable."""
+
+    max_source_length: int = 256
+    max_operand_bits: int = 256
+    max_result_bits: int = 4096
+    max_exponent: int = 1024
+    max_steps: int = 128
+
+
+class _DeclinedError(Exception):
+    """Raised internally when an expression falls outside the safe subset."""
+
+
+class _Evaluator:
+    def __init__(self, limits: CalcLimits) -> None:
+        self.limits = limits
+        self.steps = 0
+
+    def visit(self, node: ast.AST) -> Number:
+        self.steps += 1
+        if self.steps > self.limits.max_steps:
+            raise _DeclinedError("step limit")
+
+        if isinstance(node, ast.Constant):
+            value = node.value
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise _DeclinedError("non-numeric literal")
+            return self._check(value, self.limits.max_operand_bits)
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            return _UNARY_OPS[type(node.op)](self.visit(node.operand))
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            left = self.visit(node.left)
+            right = self.visit(node.right)
+            if isinstance(node.op, ast.Pow):
+                self._check_power(left, right)
+            elif isinstance(node.op, ast.Mult) and isinstance(left, int) and isinstance(right, int):
+                if left.bit_length() + right.bit_length() > self.limits.max_result_bits:
+                    raise _DeclinedError("product too large")
+            try:
+                result = _BINARY_OPS[type(node.op)](left, right)
+            except (ZeroDivisionError, OverflowError) as exc:
+                raise _DeclinedError(type(exc).__name__) from exc
+            return self._check(result, self.limits.max_result_bits)
+
+        raise _DeclinedError(f"unsupported node {type(node).__name__}")
+
+    def _check_power(self, base: Number, exponent: Number) -> None:
+        if not isinstance(exponent, int) or abs(exponent) > self.limits.max_exponent:
+            raise _DeclinedError("exponent too large")
+        bits = self.limits.max_result_bits
+        if isinstance(base, int) and base.bit_length() * abs(exponent) > bits:
+            raise _DeclinedError("power too large")
+
+    def _check(self, value: Number, max_bits: int) -> Number:
+        if isinstance(value, complex):
+            raise _DeclinedError("complex result")
+        if isinstance(value, float) and not math.isfinite(value):
+            raise _DeclinedError("non-finite result")
+        if isinstance(value, int) and value.bit_length() > max_bits:
+            raise _DeclinedError("integer too large")
+        return value
+
+
+def evaluate(expression: str, limits: CalcLimits | None = None) -> Number | None:
+    """Evaluate an arithmetic expression, or return None if it must be declined."""
+    active_limits = limits or CalcLimits()
+    if len(expression) > active_limits.max_source_length:
+        return None
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except (SyntaxError, ValueError):
+        return None
+    return _evaluate_node(tree.body, active_limits)
+
+
+def evaluate_print_call(code: str, limits: CalcLimits | None = None) -> Number | None:
+    """Evaluate code of the form ``print(<expression>)`` built by the intent resolver."""
+    active_limits = limits or CalcLimits()
+    if len(code) > active_limits.max_source_length:
+        return None
+    try:
+        tree = ast.parse(code.strip(), mode="eval")
+    except (SyntaxError, ValueError):
+        return None
+    call = tree.body
+    if (
+        not isinstance(call, ast.Call)
+        or not isinstance(call.func, ast.Name)
+        or call.func.id != "print"
+        or len(call.args) != 1
+        or call.keywords
+    ):
+        return None
+    return _evaluate_node(call.args[0], active_limits)
+
+
+def _evaluate_node(node: ast.AST, limits: CalcLimits) -> Number | None:
+    try:
+        return _Evaluator(limits).visit(node)
+    except _DeclinedError:
+        return None
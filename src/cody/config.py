@@ -1,6 +1,6 @@
 """Configuration values for Cody."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
 
 
@@ -9,11 +9,115 @@ def _get_env_url(key: str, default: str) -> str:
     return os.environ.get(key, default)
 
 
+def _get_env_bool(key: str, default: bool) -> bool:
+    """Get a boolean setting from environment (1/true/yes/on) or use default."""
+    raw = os.environ.get(key)
+    if raw is None or not raw.strip():
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _get_env_float(key: str, default: float | None) -> float | None:
+    """Get a float setting from environment or use default."""
+    raw = os.environ.get(key)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def _get_env_octal(key: str, default: int) -> int:
+    """Get an octal setting (e.g. file permissions like ``660``) from environment or use default."""
+    raw = os.environ.get(key)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        return int(raw.strip(), 8)
+    except ValueError:
+        return default
+
+
+def _get_env_int(key: str, default: int) -> int:
+    """Get an integer setting from environment or use default."""
+    raw = os.environ.get(key)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def _get_env_keep_alive(key: str, default: str) -> str | int | None:
+    """Get an Ollama keep_alive value: a duration like ``30m``, seconds, or empty to omit it."""
+    raw = os.environ.get(key, default).strip()
+    if not raw:
+        return None
+    try:
+        return int(raw)  # Ollama reads bare numbers as seconds (-1 keeps the model loaded)
+    except ValueError:
+        return raw
+
+
+def _get_env_int_map(key: str) -> dict[str, int]:
+    """Get ``name=int`` pairs separated by commas (e.g. ``llama3:8b=8192,qwen3:0.6b=4096``).
+
+    Malformed pairs are skipped. Names may contain ``:``, so the separator is ``=``.
+    """
+    parsed = {}
+    for pair in os.environ.get(key, "").split(","):
+        name, sep, value = pair.strip().rpartition("=")
+        if not sep or not name.strip():
+            continue
+        try:
+            parsed[name.strip()] = int(value)
+        except ValueError:
+            continue
+    return parsed
+
+
 @dataclass(frozen=True)
 class Settings:
     tcp_host: str = "0.0.0.0"
     tcp_port: int = 8888
-    long_term_memory_path: str = "data/long_term_memory.json"
+    # Asyncio TCP server (cody-tcp-async): connection cap and longest accepted request line
+    tcp_max_connections: int = 10_000
+    tcp_max_line_bytes: int = 1024 * 1024
+    # Commands one TCP connection may have running at once before reads pause (backpressure)
+    tcp_max_in_flight: int = 8
+    # Unix domain socket for co-located clients (same NDJSON protocol), alongside or instead of TCP.
+    # The socket file gets unix_socket_mode permissions; the API can listen on its own socket too.
+    tcp_enabled: bool = True
+    unix_socket_path: str | None = None
+    unix_socket_mode: int = 0o660
+    api_unix_socket_path: str | None = None
+    # Long-term summaries: SQLite (WAL) log; the old data/long_term_memory.json is imported once.
+    # Compaction keeps the newest versions per (topic, conversation) key.
+    long_term_memory_path: str = "data/long_term_memory.sqlite"
+    long_term_keep_versions: int = 5
+    long_term_compact_interval_seconds: float = 300.0
+    # Inject the top-k BM25-ranked long-term summaries into chat prompts (0 disables),
+    # using at most memory_token_budget estimated tokens
+    memory_top_k: int = 0
+    memory_token_budget: int = 512
+    # Short-term memory: newest turns kept per conversation and the byte budget across all
+    # conversations (least recently used conversations are evicted beyond it)
+    short_term_max_turns: int = 50
+    short_term_max_bytes: int = 64 * 1024 * 1024
+    # Independently locked shards of short-term memory; each gets an equal share of the byte budget
+    short_term_stripes: int = 16
+    # Conversations whose short-term history passes summarize_after_tokens estimated tokens
+    # (0 disables) get their older turns summarized by the fallback model in the background,
+    # keeping the newest summary_keep_turns turns verbatim
+    summarize_after_tokens: int = 0
+    summary_keep_turns: int = 4
+    # Composed prompts must fit each model's context window (model_context_tokens, else
+    # context_tokens) less reply_tokens kept for the answer; the oldest history is dropped first
+    context_tokens: int = 4096
+    model_context_tokens: dict[str, int] = field(default_factory=dict)
+    reply_tokens: int = 1024
 
     # All point to local Ollama server (configurable via environment variables)
     ollama_intent_url: str = None  # type: ignore
@@ -23,10 +127,106 @@ class Settings:
     intent_model: str = "qwen3:0.6b"           # Fast, small
     primary_model: str = "qwen3-coder:480b-cloud"  # Cloud, powerful
     fallback_model: str = "deepseek-coder:6.7b"    # Local backup
+    # Batch command / POST /batch: most items per request and most items running at once
+    batch_max_items: int = 100
+    batch_max_parallelism: int = 8
+    # Supervisor: worker processes (0 = one per CPU)
+    workers: int = 0
+    # Messages stubbed while no provider answered: SQLite queue shared by every worker, capped per
+    # recipient and by age; a replay worker answers them and keeps replies for the same age.
+    pending_queue_path: str = "data/pending_messages.sqlite"
+    pending_max_per_recipient: int = 100
+    pending_max_age_seconds: float = 24 * 3600.0
+    pending_replay_interval_seconds: float = 5.0
+    # Warm sandbox containers kept ready for `run` and math intents (0 disables the pool)
+    sandbox_pool_size: int = 2
+    # Ollama request timeouts: ollama_timeout_seconds until a model has enough latency samples,
+    # then its timeout_percentile latency plus timeout_margin (a fraction), within floor and ceiling
+    ollama_timeout_seconds: float = 30.0
+    timeout_percentile: float = 0.99
+    timeout_margin: float = 0.5
+    timeout_floor_seconds: float = 1.0
+    timeout_ceiling_seconds: float = 120.0
+    # Keep local models loaded: every request sends model_keep_alive (a duration like "30m",
+    # seconds, or None to use Ollama's default), and with model_preload the servers load the
+    # models at startup and touch them every model_touch_interval_seconds
+    model_keep_alive: str | int | None = "30m"
+    model_preload: bool = True
+    model_touch_interval_seconds: float = 240.0
+    # Provider circuit breakers: consecutive failures before opening, and seconds until a retry
+    breaker_failure_threshold: int = 3
+    breaker_reset_seconds: float = 30.0
+    health_probe_interval_seconds: float = 5.0
+    # Hedged requests: fire the fallback if the primary is slower than a fixed budget
+    # or, when hedge_after_seconds is None, slower than its rolling p90 latency; at most
+    # hedge_max_concurrency hedged requests at once, the rest route sequentially
+    hedge_enabled: bool = False
+    hedge_after_seconds: float | None = None
+    hedge_max_concurrency: int = 8
+    # Exact-match response cache: in-memory LRU byte budget (0 disables), TTL, optional SQLite tier
+    response_cache_max_bytes: int = 16 * 1024 * 1024
+    response_cache_ttl_seconds: float = 3600.0
+    response_cache_path: str | None = None
+    # Semantic cache (requires numpy): reuse replies for paraphrases above a cosine threshold
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_capacity: int = 10_000
+    semantic_cache_path: str | None = None
+    semantic_cache_embedding_model: str = "nomic-embed-text"  # a dedicated embedding model
 
 
 DEFAULT_SETTINGS = Settings(
     ollama_intent_url=_get_env_url("CODY_OLLAMA_INTENT_URL", "http://127.0.0.1:11434"),
     ollama_primary_url=_get_env_url("CODY_OLLAMA_PRIMARY_URL", "http://127.0.0.1:11434"),
     ollama_fallback_url=_get_env_url("CODY_OLLAMA_FALLBACK_URL", "http://127.0.0.1:11434"),
+    tcp_max_connections=_get_env_int("CODY_TCP_MAX_CONNECTIONS", 10_000),
+    tcp_max_line_bytes=_get_env_int("CODY_TCP_MAX_LINE_BYTES", 1024 * 1024),
+    tcp_max_in_flight=max(1, _get_env_int("CODY_TCP_MAX_IN_FLIGHT", 8)),
+    tcp_enabled=_get_env_bool("CODY_TCP_ENABLED", True),
+    unix_socket_path=os.environ.get("CODY_UNIX_SOCKET") or None,
+    unix_socket_mode=_get_env_octal("CODY_UNIX_SOCKET_MODE", 0o660),
+    api_unix_socket_path=os.environ.get("CODY_API_UNIX_SOCKET") or None,
+    long_term_memory_path=os.environ.get("CODY_LONG_TERM_PATH") or "data/long_term_memory.sqlite",
+    long_term_keep_versions=max(1, _get_env_int("CODY_LONG_TERM_KEEP_VERSIONS", 5)),
+    long_term_compact_interval_seconds=_get_env_float("CODY_LONG_TERM_COMPACT_SECONDS", 300.0)
+    or 300.0,
+    memory_top_k=max(0, _get_env_int("CODY_MEMORY_TOP_K", 0)),
+    memory_token_budget=_get_env_int("CODY_MEMORY_TOKEN_BUDGET", 512),
+    short_term_max_turns=max(1, _get_env_int("CODY_SHORT_TERM_MAX_TURNS", 50)),
+    short_term_max_bytes=_get_env_int("CODY_SHORT_TERM_MAX_BYTES", 64 * 1024 * 1024),
+    short_term_stripes=max(1, _get_env_int("CODY_SHORT_TERM_STRIPES", 16)),
+    summarize_after_tokens=max(0, _get_env_int("CODY_SUMMARIZE_AFTER_TOKENS", 0)),
+    summary_keep_turns=max(0, _get_env_int("CODY_SUMMARY_KEEP_TURNS", 4)),
+    context_tokens=max(1, _get_env_int("CODY_CONTEXT_TOKENS", 4096)),
+    model_context_tokens=_get_env_int_map("CODY_MODEL_CONTEXT_TOKENS"),
+    reply_tokens=max(0, _get_env_int("CODY_REPLY_TOKENS", 1024)),
+    batch_max_items=_get_env_int("CODY_BATCH_MAX_ITEMS", 100),
+    batch_max_parallelism=max(1, _get_env_int("CODY_BATCH_PARALLELISM", 8)),
+    workers=_get_env_int("CODY_WORKERS", 0),
+    pending_queue_path=os.environ.get("CODY_PENDING_PATH") or "data/pending_messages.sqlite",
+    pending_max_per_recipient=max(1, _get_env_int("CODY_PENDING_MAX_PER_RECIPIENT", 100)),
+    pending_max_age_seconds=_get_env_float("CODY_PENDING_MAX_AGE_SECONDS", 24 * 3600.0)
+    or 24 * 3600.0,
+    pending_replay_interval_seconds=_get_env_float("CODY_PENDING_REPLAY_SECONDS", 5.0) or 5.0,
+    sandbox_pool_size=_get_env_int("CODY_SANDBOX_POOL_SIZE", 2),
+    model_keep_alive=_get_env_keep_alive("CODY_MODEL_KEEP_ALIVE", "30m"),
+    model_preload=_get_env_bool("CODY_MODEL_PRELOAD", True),
+    model_touch_interval_seconds=_get_env_float("CODY_MODEL_TOUCH_SECONDS", 240.0) or 240.0,
+    ollama_timeout_seconds=_get_env_float("CODY_OLLAMA_TIMEOUT_SECONDS", 30.0) or 30.0,
+    timeout_percentile=min(1.0, _get_env_float("CODY_TIMEOUT_PERCENTILE", 0.99) or 0.99),
+    timeout_margin=max(0.0, _get_env_float("CODY_TIMEOUT_MARGIN", 0.5) or 0.0),
+    timeout_floor_seconds=_get_env_float("CODY_TIMEOUT_FLOOR_SECONDS", 1.0) or 1.0,
+    timeout_ceiling_seconds=_get_env_float("CODY_TIMEOUT_CEILING_SECONDS", 120.0) or 120.0,
+    hedge_enabled=_get_env_bool("CODY_HEDGE_ENABLED", False),
+    hedge_after_seconds=_get_env_float("CODY_HEDGE_AFTER_SECONDS", None),
+    hedge_max_concurrency=max(1, _get_env_int("CODY_HEDGE_MAX_CONCURRENCY", 8)),
+    response_cache_max_bytes=_get_env_int("CODY_CACHE_MAX_BYTES", 16 * 1024 * 1024),
+    response_cache_ttl_seconds=_get_env_float("CODY_CACHE_TTL_SECONDS", 3600.0) or 0.0,
+    response_cache_path=os.environ.get("CODY_CACHE_PATH") or None,
+    semantic_cache_enabled=_get_env_bool("CODY_SEMANTIC_CACHE", False),
+    semantic_cache_threshold=_get_env_float("CODY_SEMANTIC_CACHE_THRESHOLD", 0.92) or 0.92,
+    semantic_cache_path=os.environ.get("CODY_SEMANTIC_CACHE_PATH") or None,
+    semantic_cache_embedding_model=(
+        os.environ.get("CODY_SEMANTIC_CACHE_EMBEDDING_MODEL") or "nomic-embed-text"
+    ),
 )
@@ -0,0 +1,185 @@
+"""Opt-in binary framing for the TCP protocol: length-prefixed MessagePack/JSON with compression.
+
+Connections start in NDJSON. A client may send ``{"cmd": "hello", "encoding": ...,
+"compression": ...}`` as its first command. The server answers with one NDJSON line
+naming the chosen codec, and from then on both directions use binary frames:
+
+    4-byte big-endian payload length | 1 flag byte (bit 0 = compressed) | payload
+
+MessagePack (``msgpack``) and zstd (``zstandard``) are optional dependencies; JSON
+and deflate are always available. Small payloads are sent uncompressed because the
+compression overhead would outweigh the savings.
+"""
+
+import asyncio
+import io
+import json
+import struct
+import zlib
+from collections.abc import Callable
+from dataclasses import dataclass
+from types import ModuleType
+from typing import BinaryIO
+
+msgpack: ModuleType | None
+try:
+    import msgpack  # type: ignore[import-untyped, no-redef]
+except ImportError:
+    msgpack = None
+
+zstandard: ModuleType | None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+HEADER = struct.Struct("!IB")
+FLAG_COMPRESSED = 0x01
+
+
+class FramingError(ValueError):
+    """A frame is malformed, oversized or undecodable; the stream cannot be re-synchronized."""
+
+
+def available_encodings() -> list[str]:
+    return ["msgpack", "json"] if msgpack is not None else ["json"]
+
+
+def available_compressions() -> list[str]:
+    return (["zstd"] if zstandard is not None else []) + ["deflate", "none"]
+
+
+def _json_encode(obj: object) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _json_decode(raw: bytes) -> object:
+    return json.loads(raw)
+
+
+def _codec_functions(encoding: str) -> tuple[Callable[[object], bytes], Callable[[bytes], object]]:
+    if encoding == "msgpack" and msgpack is not None:
+        packer = msgpack
+        return (
+            lambda obj: packer.packb(obj, use_bin_type=True),
+            lambda raw: packer.unpackb(raw, raw=False),
+        )
+    return _json_encode, _json_decode
+
+
+@dataclass
+class FrameCodec:
+    """Encodes and decodes one connection's binary frames."""
+
+    encoding: str = "json"
+    compression: str = "none"
+    min_compress_bytes: int = 512
+    max_frame_bytes: int = 1024 * 1024
+    level: int = 3
+
+    def __post_init__(self) -> None:
+        if self.encoding not in available_encodings():
+            raise ValueError(f"encoding {self.encoding!r} is not available")
+        if self.compression not in available_compressions():
+            raise ValueError(f"compression {self.compression!r} is not available")
+        self._dumps, self._loads = _codec_functions(self.encoding)
+        if self.compression == "zstd" and zstandard is not None:
+            self._compress = zstandard.ZstdCompressor(level=self.level).compress
+            self._decompressor = zstandard.ZstdDecompressor()
+        else:
+            self._compress = lambda data: zlib.compress(data, self.level)
+
+    def encode(self, obj: object) -> bytes:
+        """Return a complete frame (header + payload) for ``obj``."""
+        payload = self._dumps(obj)
+        flags = 0
+        if self.compression != "none" and len(payload) >= self.min_compress_bytes:
+            compressed = self._compress(payload)
+            if len(compressed) < len(payload):
+                payload, flags = compressed, FLAG_COMPRESSED
+        return HEADER.pack(len(payload), flags) + payload
+
+    def decode(self, flags: int, payload: bytes) -> object:
+        try:
+            if flags & FLAG_COMPRESSED:
+                payload = self._decompress(payload)
+            return self._loads(payload)
+        except FramingError:
+            raise
+        except Exception as exc:  # zlib.error, zstd errors, msgpack/json errors
+            raise FramingError(f"undecodable frame: {exc}") from exc
+
+    def read_frame(self, stream: BinaryIO | io.BufferedIOBase) -> object | None:
+        """Read one frame from a blocking binary stream; None at a clean end of stream."""
+        header = stream.read(HEADER.size)
+        if not header:
+            return None
+        if len(header) < HEADER.size:
+            raise FramingError("truncated frame header")
+        length, flags = self._check_header(header)
+        payload = stream.read(length)
+        if len(payload) < length:
+            raise FramingError("truncated frame payload")
+        return self.decode(flags, payload)
+
+    async def read_frame_async(self, reader: asyncio.StreamReader) -> object | None:
+        """Async ``read_frame``."""
+        try:
+            header = await reader.readexactly(HEADER.size)
+        except asyncio.IncompleteReadError as exc:
+            if not exc.partial:
+                return None
+            raise FramingError("truncated frame header") from exc
+        length, flags = self._check_header(header)
+        try:
+            payload = await reader.readexactly(length)
+        except asyncio.IncompleteReadError as exc:
+            raise FramingError("truncated frame payload") from exc
+        return self.decode(flags, payload)
+
+    def describe(self) -> dict:
+        return {"encoding": self.encoding, "compression": self.compression}
+
+    def _check_header(self, header: bytes) -> tuple[int, int]:
+        length, flags = HEADER.unpack(header)
+        if length > self.max_frame_bytes:
+            raise FramingError(f"frame of {length} bytes exceeds {self.max_frame_bytes}")
+        return length, flags
+
+    def _decompress(self, payload: bytes) -> bytes:
+        if self.compression == "zstd" and zstandard is not None:
+            declared = zstandard.frame_content_size(payload)
+            if declared > self.max_frame_bytes:
+                raise FramingError(f"decompressed frame exceeds {self.max_frame_bytes} bytes")
+            data: bytes = self._decompressor.decompress(
+                payload, max_output_size=self.max_frame_bytes
+            )
+        else:
+            decompressor = zlib.decompressobj()
+            data = decompressor.decompress(payload, self.max_frame_bytes)
+            if decompressor.unconsumed_tail:
+                raise FramingError(f"decompressed frame exceeds {self.max_frame_bytes} bytes")
+        return data
+
+
+def _choose(requested: object, available: list[str], default: str) -> str | None:
+    """Pick the first requested option we support; ``requested`` may be a string or a list."""
+    if requested is None:
+        return default
+    options = [requested] if isinstance(requested, str) else requested
+    if not isinstance(options, list):
+        return None
+    return next((option for option in options if option in available), None)
+
+
+def negotiate(payload: dict, max_frame_bytes: int = 1024 * 1024) -> tuple[FrameCodec | None, dict]:
+    """Handle a ``hello`` command: return ``(codec, response)``; codec is None if refused."""
+    offered = {"encodings": available_encodings(), "compressions": available_compressions()}
+    encoding = _choose(payload.get("encoding"), offered["encodings"], "json")
+    if encoding is None:
+        return None, {"ok": False, "error": "unsupported_encoding", **offered}
+    compression = _choose(payload.get("compression"), offered["compressions"], "none")
+    if compression is None:
+        return None, {"ok": False, "error": "unsupported_compression", **offered}
+    codec = FrameCodec(encoding=encoding, compression=compression, max_frame_bytes=max_frame_bytes)
+    return codec, {"ok": True, "framing": "binary", **codec.describe()}
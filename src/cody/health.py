@@ -0,0 +1,316 @@
+"""Provider health: circuit breakers, latency tracking, adaptive timeouts and a recovery probe."""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one provider.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and callers
+    skip the provider. Once ``reset_timeout`` has passed a single trial request is
+    let through (half-open); its outcome closes or re-opens the circuit. A health
+    probe may also close it early via ``reset``.
+    """
+
+    name: str
+    failure_threshold: int = 3
+    reset_timeout: float = 30.0
+    clock: Callable[[], float] = time.monotonic
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._stats = {"successes": 0, "failures": 0, "trips": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Return True if a call may be attempted now."""
+        with self._lock:
+            if self._state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._stats["successes"] += 1
+            self._close()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or (
+                self._state == CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._state = OPEN
+                self._opened_at = self.clock()
+                self._trial_in_flight = False
+                self._stats["trips"] += 1
+
+    def reset(self) -> None:
+        """Close the circuit, e.g. after a successful out-of-band health probe."""
+        with self._lock:
+            self._close()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = 0.0
+            if self._state == OPEN:
+                retry_in = max(0.0, self.reset_timeout - (self.clock() - self._opened_at))
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "retry_in_seconds": round(retry_in, 3),
+                **self._stats,
+            }
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self._failures = 0
+        self._trial_in_flight = False
+
+
+@dataclass
+class LatencyWindow:
+    """Rolling window of recent successful call latencies (seconds)."""
+
+    size: int = 256
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._samples: deque[float] = deque(maxlen=self.size)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, q: float) -> float | None:
+        """Nearest-rank percentile for ``q`` in [0, 1], or None without samples."""
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        rank = min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))
+        return ordered[rank]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": len(self),
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+        }
+
+
+@dataclass
+class LatencyHistogram:
+    """Rolling latency histogram with logarithmic buckets (HDR-style).
+
+    Bucket ``i`` holds samples up to ``min_seconds * growth**i``, so percentiles are
+    accurate to within ``growth`` (5%) at any scale, from a 50 ms intent call to a
+    minute-long cloud generation. Recording is O(1). Counts cover the current and the
+    previous ``window_seconds`` interval, so samples age out after one to two
+    intervals. An EWMA of the latency is kept alongside as a quick trend.
+    """
+
+    min_seconds: float = 0.001
+    growth: float = 1.05
+    buckets: int = 320  # up to about an hour
+    window_seconds: float = 300.0
+    ewma_alpha: float = 0.2
+    clock: Callable[[], float] = time.monotonic
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._current = [0] * self.buckets
+        self._previous = [0] * self.buckets
+        self._started = self.clock()
+        self._ewma: float | None = None
+
+    def record(self, seconds: float) -> None:
+        if seconds <= self.min_seconds:
+            index = 0
+        else:
+            index = min(
+                self.buckets - 1, math.ceil(math.log(seconds / self.min_seconds, self.growth))
+            )
+        with self._lock:
+            self._rotate()
+            self._current[index] += 1
+            if self._ewma is None:
+                self._ewma = seconds
+            else:
+                self._ewma += self.ewma_alpha * (seconds - self._ewma)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._rotate()
+            return sum(self._current) + sum(self._previous)
+
+    def percentile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the nearest-rank ``q`` percentile, or None."""
+        with self._lock:
+            self._rotate()
+            counts = [a + b for a, b in zip(self._current, self._previous, strict=True)]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = min(total, max(1, round(q * total)))
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return self.min_seconds * self.growth**index
+        return None  # unreachable
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            ewma = self._ewma
+        return {
+            "count": len(self),
+            "ewma": ewma,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+        }
+
+    def _rotate(self) -> None:
+        elapsed = self.clock() - self._started
+        if elapsed < self.window_seconds:
+            return
+        # An idle gap of two or more windows leaves nothing recent enough to keep.
+        self._previous = self._current if elapsed < 2 * self.window_seconds else [0] * self.buckets
+        self._current = [0] * self.buckets
+        self._started = self.clock()
+
+
+@dataclass
+class AdaptiveTimeout:
+    """Per-model request timeouts derived from rolling latency histograms.
+
+    A (model, operation) key's timeout is its ``percentile`` latency plus
+    ``margin`` (a fraction of it), kept between ``floor`` and ``ceiling``. Until a key
+    has ``min_samples`` samples, ``default`` applies. Callers also record calls that
+    time out, at the time they waited. When more than ``1 - percentile`` of calls time
+    out, the timeout therefore grows by the margin each time, up to the ceiling, instead
+    of staying stuck at a value the provider has outgrown.
+    """
+
+    default: float = 30.0
+    percentile: float = 0.99
+    margin: float = 0.5
+    floor: float = 1.0
+    ceiling: float = 120.0
+    min_samples: int = 20
+    window_seconds: float = 300.0
+    clock: Callable[[], float] = time.monotonic
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple[str, str], LatencyHistogram] = {}
+
+    def timeout(self, model: str, operation: str) -> float:
+        histogram = self._histogram(model, operation)
+        if len(histogram) < self.min_samples:
+            return self.default
+        observed = histogram.percentile(self.percentile) or self.default
+        return min(self.ceiling, max(self.floor, observed * (1 + self.margin)))
+
+    def record(self, model: str, operation: str, seconds: float) -> None:
+        self._histogram(model, operation).record(seconds)
+
+    def snapshot(self) -> dict:
+        """``{model: {operation: histogram snapshot plus the current timeout}}``."""
+        with self._lock:
+            keys = sorted(self._histograms)
+        models: dict[str, dict] = {}
+        for model, operation in keys:
+            models.setdefault(model, {})[operation] = {
+                **self._histogram(model, operation).snapshot(),
+                "timeout": self.timeout(model, operation),
+            }
+        return models
+
+    def _histogram(self, model: str, operation: str) -> LatencyHistogram:
+        with self._lock:
+            histogram = self._histograms.get((model, operation))
+            if histogram is None:
+                histogram = LatencyHistogram(window_seconds=self.window_seconds, clock=self.clock)
+                self._histograms[(model, operation)] = histogram
+            return histogram
+
+
+@dataclass
+class HealthProbe:
+    """Background thread that probes providers whose circuit is not closed.
+
+    ``targets`` maps each breaker to a zero-argument probe returning True when the
+    provider is reachable again.
+    """
+
+    targets: list[tuple[CircuitBreaker, Callable[[], bool]]]
+    interval: float = 5.0
+    logger: logging.Logger = field(default_factory=lambda: logging.getLogger("cody.health"))
+
+    def __post_init__(self) -> None:
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="cody-health-probe", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def probe_once(self) -> None:
+        """Probe every non-closed breaker once and close those that recovered."""
+        for breaker, probe in self.targets:
+            if breaker.state == CLOSED:
+                continue
+            try:
+                healthy = probe()
+            except Exception:  # a failing probe just means "still down"
+                healthy = False
+            self.logger.info("health.probe provider=%s healthy=%s", breaker.name, healthy)
+            if healthy:
+                breaker.reset()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.probe_once()
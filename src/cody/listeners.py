@@ -0,0 +1,85 @@
+"""Unix domain socket listeners shared by the TCP servers, the API and the supervisor.
+
+Co-located clients can skip the loopback TCP stack by connecting to a Unix socket.
+The socket file is created with ``mode`` permissions (owner and group by default),
+and a stale file left behind by a crashed server is replaced. A live socket or a
+regular file at the path is never removed.
+
+Several worker processes cannot each bind the same path, so the supervisor binds
+it once with ``prebind_unix_socket`` before forking. Workers then pick up that
+inherited socket from ``unix_listener`` instead of binding their own.
+"""
+
+import contextlib
+import errno
+import os
+import socket
+import stat
+
+DEFAULT_MODE = 0o660
+
+_PREBOUND: dict[str, socket.socket] = {}
+
+
+def bind_unix_socket(path: str, mode: int = DEFAULT_MODE) -> socket.socket:
+    """Bind a stream socket at ``path`` with ``mode`` permissions; the caller calls listen()."""
+    _remove_stale(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # The umask keeps the file from ever being wider than ``mode``; chmod then sets it exactly.
+    previous_umask = os.umask(0o777 & ~mode)
+    try:
+        sock.bind(path)
+    except OSError:
+        sock.close()
+        raise
+    finally:
+        os.umask(previous_umask)
+    os.chmod(path, mode)
+    return sock
+
+
+def prebind_unix_socket(path: str, mode: int = DEFAULT_MODE) -> socket.socket:
+    """Bind ``path`` in this process so processes forked afterwards share the listener."""
+    sock = bind_unix_socket(path, mode)
+    sock.listen(socket.SOMAXCONN)
+    _PREBOUND[path] = sock
+    return sock
+
+
+def unix_listener(path: str, mode: int = DEFAULT_MODE) -> tuple[socket.socket, bool]:
+    """Return ``(socket, owned)``: a pre-bound socket if one exists, else a fresh binding.
+
+    Only the owner should call ``remove_unix_socket`` when it shuts down.
+    """
+    prebound = _PREBOUND.get(path)
+    if prebound is not None:
+        return prebound.dup(), False
+    return bind_unix_socket(path, mode), True
+
+
+def remove_unix_socket(path: str) -> None:
+    """Delete the socket file at ``path`` if it is still a socket."""
+    with contextlib.suppress(FileNotFoundError):
+        if stat.S_ISSOCK(os.lstat(path).st_mode):
+            os.unlink(path)
+
+
+def _remove_stale(path: str) -> None:
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, "refusing to replace a non-socket file", path)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        remove_unix_socket(path)  # nobody is listening; left over from a crash
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, "another server is listening on this socket", path)
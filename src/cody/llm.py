@@ -1,13 +1,32 @@
 """LLM plumbing for Ollama-backed routing with resilient fallbacks and tool execution."""
 
-from dataclasses import dataclass, field
+import asyncio
+from collections import Counter
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from concurrent import futures
+from dataclasses import asdict, dataclass, field
+import functools
+import http.client
 import json
 import logging
+from pathlib import Path
+import queue
 import re
+import sqlite3
+import threading
+import time
 import uuid
-from urllib import error, request
+from urllib.parse import urlsplit
 
-from . import sandbox
+from . import cache, calc, config, health, pending, prompt, sandbox, transport
+from .prompt import estimate_tokens
+from .singleflight import AsyncSingleFlight, SingleFlight
+from . import memory as conversation_memory
+from . import semantic_cache as semantic
+
+
+class StreamTruncatedError(Exception):
+    """A chat stream broke off after yielding text but before Ollama's final chunk."""
 
 
 @dataclass
@@ -17,13 +36,30 @@ class ToolExecutor:
     logger: logging.Logger = field(default_factory=lambda: logging.getLogger("cody.llm.tools"))
 
     def execute_python(self, code: str, request_id: str) -> dict:
-        """Execute Python code in the sandbox."""
+        """Execute Python code, answering plain arithmetic in-process and the rest in the sandbox.
+
+        The result carries an ``engine`` field: ``inprocess`` or ``docker``.
+        """
         self.logger.info(
             "tool.execute.start request_id=%s tool=python code_length=%s",
             request_id,
             len(code),
         )
-        result = sandbox.run_python_in_docker(code)
+        value = calc.evaluate_print_call(code)
+        if value is not None:
+            self.logger.info(
+                "tool.execute.success request_id=%s tool=python engine=inprocess exit_code=0",
+                request_id,
+            )
+            return {
+                "ok": True,
+                "stdout": f"{value}\n",
+                "stderr": "",
+                "exit_code": 0,
+                "engine": "inprocess",
+            }
+
+        result = {**sandbox.run_python_in_docker(code), "engine": "docker"}
         if result.get("ok"):
             self.logger.info(
                 "tool.execute.success request_id=%s tool=python exit_code=%s",
@@ -51,29 +87,699 @@ def extract_code_block(text: str) -> str | None:
 
 @dataclass
 class OllamaClient:
+    """Blocking Ollama client over the shared keep-alive pool.
+
+    Request timeouts adapt per model and operation (``generate``, ``stream`` to the
+    first chunk, ``embed``) from the latencies this client observes; ``timeout`` is
+    used until enough samples exist. See ``health.AdaptiveTimeout``. With
+    ``keep_alive`` set (e.g. ``"30m"``), every request asks Ollama to keep the model
+    loaded that long after it.
+    """
+
     endpoint: str | None
-    timeout: float = 30.0  # Increased timeout for larger models
+    timeout: float = 30.0  # until a model has enough latency samples
+    max_connections: int = 8
+    idle_timeout: float = 30.0
+    timeouts: health.AdaptiveTimeout = None  # type: ignore[assignment]  # built from ``timeout``
+    keep_alive: str | int | None = None
+
+    def __post_init__(self) -> None:
+        if self.timeouts is None:
+            self.timeouts = health.AdaptiveTimeout(default=self.timeout)
 
     def chat(self, message: str, model: str) -> str | None:
+        data = self._post_json(
+            "/api/generate",
+            {"model": model, "prompt": message, "stream": False, **self._keep_alive()},
+        )
+        if data is None:
+            return None
+        return data.get("response")
+
+    def chat_stream(self, message: str, model: str) -> Iterator[str]:
+        """Yield response fragments as Ollama emits its NDJSON chunks.
+
+        Yields nothing if the endpoint is unreachable or errors before the first chunk.
+        A stream that fails after yielding text raises ``StreamTruncatedError`` once the
+        text it got is out, so a partial reply is never taken for a whole one.
+        """
+        if not self.endpoint:
+            return
+
+        payload = json.dumps(
+            {"model": model, "prompt": message, "stream": True, **self._keep_alive()}
+        ).encode()
+        timeout = self.timeouts.timeout(model, "stream")
+        started = time.monotonic()
+        first_chunk = True
+        streamed = done = False
+        try:
+            with self._pool().stream(
+                "POST",
+                self._path("/api/generate"),
+                body=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=timeout,
+            ) as response:
+                if response.status != 200:
+                    response.read()
+                    return
+                for raw_line in response:
+                    if first_chunk:
+                        first_chunk = False
+                        self.timeouts.record(model, "stream", time.monotonic() - started)
+                    line = raw_line.strip()
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    delta = chunk.get("response")
+                    if delta:
+                        streamed = True
+                        yield delta
+                    if chunk.get("done"):
+                        done = True
+                        break
+                # Drain the chunked terminator so the connection can be reused.
+                response.read()
+        except TimeoutError:
+            if first_chunk:
+                self.timeouts.record(model, "stream", time.monotonic() - started)
+        except (OSError, http.client.HTTPException, json.JSONDecodeError, UnicodeDecodeError):
+            pass
+        if streamed and not done:
+            raise StreamTruncatedError(f"{model} stream ended before its final chunk")
+
+    def embed(self, text: str, model: str) -> list[float] | None:
+        """Return the embedding for ``text`` from Ollama's /api/embed, or None on failure."""
+        data = self._post_json("/api/embed", {"model": model, "input": text, **self._keep_alive()})
+        if data is None:
+            return None
+        embeddings = data.get("embeddings")
+        if not embeddings or not isinstance(embeddings[0], list):
+            return None
+        return embeddings[0]
+
+    def ping(self, timeout: float = 2.0) -> bool:
+        """Cheap check that the server answers; says nothing about whether a model can run."""
+        if not self.endpoint:
+            return False
+        try:
+            status_code, _ = self._pool().request(
+                "GET", self._path("/api/version"), timeout=timeout
+            )
+        except (OSError, http.client.HTTPException):
+            return False
+        return status_code == 200
+
+    def probe(self, model: str, timeout: float | None = None) -> bool:
+        """Generate one token with ``model``; True if it answered.
+
+        Used by the health probe: unlike ``ping``, it fails while the server is up
+        but the model cannot run (not pulled, out of memory, over a cloud quota).
+        Latency is tracked as the ``probe`` operation.
+        """
+        data = self._post_json(
+            "/api/generate",
+            {
+                "model": model,
+                "prompt": "ping",
+                "stream": False,
+                "options": {"num_predict": 1},
+                **self._keep_alive(),
+            },
+            operation="probe",
+            timeout=timeout,
+        )
+        return data is not None and "response" in data
+
+    def pool_stats(self) -> dict:
+        """Connection reuse metrics for this client's (shared) keep-alive pool."""
+        if not self.endpoint:
+            return {}
+        return self._pool().stats()
+
+    def latency_stats(self) -> dict:
+        """Latency histograms and current timeouts, per model and operation."""
+        return self.timeouts.snapshot()
+
+    def load(self, model: str, timeout: float | None = None) -> bool:
+        """Load ``model`` (or restart its keep-alive timer if it is loaded); True on success.
+
+        A generate request without a prompt only loads the model. Load times are
+        tracked as the ``load`` operation, apart from generation latency.
+        """
+        return (
+            self._post_json(
+                "/api/generate",
+                {"model": model, **self._keep_alive()},
+                operation="load",
+                timeout=timeout or self.timeout,
+            )
+            is not None
+        )
+
+    def running_models(self, timeout: float = 2.0) -> set[str] | None:
+        """Names of the models Ollama has loaded (``/api/ps``), or None if unreachable."""
         if not self.endpoint:
             return None
+        try:
+            status_code, raw = self._pool().request("GET", self._path("/api/ps"), timeout=timeout)
+            if status_code != 200:
+                return None
+            models = json.loads(raw.decode("utf-8")).get("models") or []
+        except (OSError, http.client.HTTPException, json.JSONDecodeError, UnicodeDecodeError):
+            return None
+        return {
+            name for entry in models for name in (entry.get("name"), entry.get("model")) if name
+        }
+
+    def _keep_alive(self) -> dict:
+        return {} if self.keep_alive is None else {"keep_alive": self.keep_alive}
 
-        payload = json.dumps({"model": model, "prompt": message, "stream": False}).encode()
-        req = request.Request(
-            self.endpoint.rstrip("/") + "/api/generate",
-            data=payload,
-            headers={"Content-Type": "application/json"},
-            method="POST",
+    def _pool(self) -> transport.ConnectionPool:
+        return transport.get_pool(
+            self.endpoint or "",
+            max_connections=self.max_connections,
+            idle_timeout=self.idle_timeout,
         )
+
+    def _path(self, api_path: str) -> str:
+        return urlsplit(self.endpoint or "").path.rstrip("/") + api_path
+
+    def _post_json(
+        self,
+        api_path: str,
+        body: dict,
+        operation: str | None = None,
+        timeout: float | None = None,
+    ) -> dict | None:
+        """POST ``body``; latency is recorded under ``operation`` (default: the API name)."""
+        if not self.endpoint:
+            return None
+
+        payload = json.dumps(body).encode()
+        model, operation = body["model"], operation or api_path.rsplit("/", 1)[-1]
+        started = time.monotonic()
         try:
-            with request.urlopen(req, timeout=self.timeout) as resp:
-                raw = resp.read().decode("utf-8")
-            data = json.loads(raw)
-            return data.get("response")
-        except (error.URLError, TimeoutError, json.JSONDecodeError):
+            status_code, raw = self._pool().request(
+                "POST",
+                self._path(api_path),
+                body=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=timeout or self.timeouts.timeout(model, operation),
+            )
+            if status_code != 200:
+                return None
+            self.timeouts.record(model, operation, time.monotonic() - started)
+            data: dict = json.loads(raw.decode("utf-8"))
+            return data
+        except TimeoutError:
+            self.timeouts.record(model, operation, time.monotonic() - started)
+            return None
+        except (OSError, http.client.HTTPException, json.JSONDecodeError, UnicodeDecodeError):
             return None
 
 
+# Failures an async Ollama call treats as "provider unavailable".
+# JSON and Unicode decoding errors are ValueErrors.
+_ASYNC_CALL_ERRORS = (OSError, EOFError, ValueError)
+
+
+@dataclass
+class AsyncOllamaClient:
+    """Non-blocking ``OllamaClient`` with the same methods as coroutines.
+
+    Requests go through ``transport.AsyncConnectionPool``, so a waiting chat holds a
+    socket and a coroutine but no thread.
+    """
+
+    endpoint: str | None
+    timeout: float = 30.0
+    max_connections: int = 8
+    idle_timeout: float = 30.0
+    timeouts: health.AdaptiveTimeout = None  # type: ignore[assignment]  # built from ``timeout``
+    keep_alive: str | int | None = None
+
+    def __post_init__(self) -> None:
+        if self.timeouts is None:
+            self.timeouts = health.AdaptiveTimeout(default=self.timeout)
+
+    @classmethod
+    def from_client(cls, client: OllamaClient) -> "AsyncOllamaClient":
+        """Async client for the same endpoint, sharing ``client``'s latency histograms."""
+        return cls(
+            endpoint=client.endpoint,
+            timeout=client.timeout,
+            max_connections=client.max_connections,
+            idle_timeout=client.idle_timeout,
+            timeouts=client.timeouts,
+            keep_alive=client.keep_alive,
+        )
+
+    async def chat(self, message: str, model: str) -> str | None:
+        data = await self._post_json(
+            "/api/generate",
+            {"model": model, "prompt": message, "stream": False, **self._keep_alive()},
+        )
+        if data is None:
+            return None
+        return data.get("response")
+
+    async def chat_stream(self, message: str, model: str) -> AsyncIterator[str]:
+        """Async counterpart of ``OllamaClient.chat_stream``."""
+        if not self.endpoint:
+            return
+
+        payload = json.dumps(
+            {"model": model, "prompt": message, "stream": True, **self._keep_alive()}
+        ).encode()
+        timeout = self.timeouts.timeout(model, "stream")
+        started = time.monotonic()
+        first_chunk = True
+        streamed = done = False
+        try:
+            async with self._pool().stream(
+                "POST",
+                self._path("/api/generate"),
+                body=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=timeout,
+            ) as response:
+                if response.status != 200:
+                    await response.read()
+                    return
+                async for raw_line in response.iter_lines():
+                    if first_chunk:
+                        first_chunk = False
+                        self.timeouts.record(model, "stream", time.monotonic() - started)
+                    line = raw_line.strip()
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    delta = chunk.get("response")
+                    if delta:
+                        streamed = True
+                        yield delta
+                    if chunk.get("done"):
+                        done = True
+                        break
+                await response.read()
+        except TimeoutError:
+            if first_chunk:
+                self.timeouts.record(model, "stream", time.monotonic() - started)
+        except _ASYNC_CALL_ERRORS:
+            pass
+        if streamed and not done:
+            raise StreamTruncatedError(f"{model} stream ended before its final chunk")
+
+    async def embed(self, text: str, model: str) -> list[float] | None:
+        data = await self._post_json(
+            "/api/embed", {"model": model, "input": text, **self._keep_alive()}
+        )
+        if data is None:
+            return None
+        embeddings = data.get("embeddings")
+        if not embeddings or not isinstance(embeddings[0], list):
+            return None
+        return embeddings[0]
+
+    async def ping(self, timeout: float = 2.0) -> bool:
+        if not self.endpoint:
+            return False
+        try:
+            status_code, _ = await self._pool().request(
+                "GET", self._path("/api/version"), timeout=timeout
+            )
+        except _ASYNC_CALL_ERRORS:
+            return False
+        return status_code == 200
+
+    def pool_stats(self) -> dict:
+        if not self.endpoint:
+            return {}
+        return self._pool().stats()
+
+    def latency_stats(self) -> dict:
+        return self.timeouts.snapshot()
+
+    def _keep_alive(self) -> dict:
+        return {} if self.keep_alive is None else {"keep_alive": self.keep_alive}
+
+    def _pool(self) -> transport.AsyncConnectionPool:
+        return transport.get_async_pool(
+            self.endpoint or "",
+            max_connections=self.max_connections,
+            idle_timeout=self.idle_timeout,
+        )
+
+    def _path(self, api_path: str) -> str:
+        return urlsplit(self.endpoint or "").path.rstrip("/") + api_path
+
+    async def _post_json(self, api_path: str, body: dict) -> dict | None:
+        if not self.endpoint:
+            return None
+
+        payload = json.dumps(body).encode()
+        model, operation = body["model"], api_path.rsplit("/", 1)[-1]
+        started = time.monotonic()
+        try:
+            status_code, raw = await self._pool().request(
+                "POST",
+                self._path(api_path),
+                body=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeouts.timeout(model, operation),
+            )
+            if status_code != 200:
+                return None
+            self.timeouts.record(model, operation, time.monotonic() - started)
+            data: dict = json.loads(raw.decode("utf-8"))
+            return data
+        except TimeoutError:
+            self.timeouts.record(model, operation, time.monotonic() - started)
+            return None
+        except _ASYNC_CALL_ERRORS:
+            return None
+
+
+SUMMARY_TOPIC = "conversation"
+
+
+@dataclass
+class ConversationSummarizer:
+    """Folds the older turns of long conversations into long-term summaries, off the request path.
+
+    ``observe`` runs after each recorded turn. It only estimates the history's tokens
+    and, past ``max_tokens``, queues the conversation without waiting. A daemon
+    thread then has ``summarize`` (the local fallback model) rewrite the previous
+    summary plus all but the newest ``keep_turns`` turns, saves the result with
+    ``MemoryStore.save_long_term_summary`` and trims those turns from the buffer.
+    When the queue is full the conversation is skipped and queued again on its next turn.
+    """
+
+    memory: conversation_memory.MemoryStore
+    summarize: Callable[[str], str | None]
+    max_tokens: int = 2048
+    keep_turns: int = 4
+    queue_size: int = 256
+    logger: logging.Logger = field(default_factory=lambda: logging.getLogger("cody.llm"))
+
+    def __post_init__(self) -> None:
+        self._queue: queue.Queue[str | None] = queue.Queue(maxsize=self.queue_size)
+        self._queued: set[str] = set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stats: Counter[str] = Counter()
+
+    def observe(self, conversation_id: str, force: bool = False) -> bool:
+        """Queue ``conversation_id`` for summarization if its history is over budget.
+
+        ``force`` skips the token check; the router sets it when a prompt had to
+        drop turns that did not fit the model's context.
+        """
+        turns = self.memory.get_short_term_turns(conversation_id)
+        if len(turns) <= self.keep_turns:
+            return False
+        if not force and sum(estimate_tokens(turn.content) for turn in turns) <= self.max_tokens:
+            return False
+        with self._lock:
+            if conversation_id in self._queued:
+                return False
+            try:
+                self._queue.put_nowait(conversation_id)
+            except queue.Full:
+                self._stats["dropped"] += 1
+                return False
+            self._queued.add(conversation_id)
+            self._stats["queued"] += 1
+        return True
+
+    def compact(self, conversation_id: str) -> int | None:
+        """Summarize and trim one conversation now; returns the saved summary id, if any."""
+        turns = self.memory.get_short_term_turns(conversation_id)
+        older = turns[: max(len(turns) - self.keep_turns, 0)]
+        if not older:
+            return None
+        previous = self.memory.load_long_term_summary(
+            topic=SUMMARY_TOPIC, conversation_id=conversation_id
+        )
+        summary = self.summarize(summary_prompt(previous.get("summary"), older))
+        if not summary or not summary.strip():
+            self._stats["failed"] += 1
+            self.logger.warning(
+                "llm.summarizer.unavailable conversation_id=%s turns=%s",
+                conversation_id,
+                len(older),
+            )
+            return None
+        summary_id = self.memory.save_long_term_summary(
+            {"topic": SUMMARY_TOPIC, "summary": summary.strip(), "conversation_id": conversation_id}
+        )
+        dropped = self.memory.drop_short_term(conversation_id, older)
+        self._stats["summarized"] += 1
+        self._stats["trimmed_turns"] += dropped
+        self.logger.info(
+            "llm.summarizer.compacted conversation_id=%s trimmed_turns=%s summary_id=%s",
+            conversation_id,
+            dropped,
+            summary_id,
+        )
+        return summary_id
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="cody-summarizer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "max_tokens": self.max_tokens,
+            "pending": self._queue.qsize(),
+            **{
+                key: self._stats[key]
+                for key in ("queued", "dropped", "summarized", "trimmed_turns", "failed")
+            },
+        }
+
+    def _run(self) -> None:
+        while (conversation_id := self._queue.get()) is not None:
+            try:
+                self.compact(conversation_id)
+            except Exception:  # keep the worker alive; the next turn queues the conversation again
+                self._stats["failed"] += 1
+                self.logger.exception("llm.summarizer.failed conversation_id=%s", conversation_id)
+            finally:
+                with self._lock:
+                    self._queued.discard(conversation_id)
+
+
+def summary_prompt(previous: str | None, turns: list[conversation_memory.Turn]) -> str:
+    """Prompt asking the model to fold ``turns`` into the ``previous`` summary."""
+    transcript = "\n".join(f"{turn.role.capitalize()}: {turn.content}" for turn in turns)
+    earlier = f"Summary so far:\n{previous}\n\n" if previous else ""
+    return (
+        "Summarize this conversation for your own later reference. Keep facts, decisions, "
+        "names, code identifiers and open questions; drop pleasantries. "
+        "Reply with the summary only.\n\n"
+        f"{earlier}New turns:\n{transcript}"
+    )
+
+
+@dataclass
+class PendingReplayer:
+    """Background worker that answers messages stubbed during a provider outage.
+
+    Every ``interval`` seconds, unless every provider's circuit is open, it claims a
+    round of queued messages (the oldest of each recipient), sends each one through
+    the router's provider chain on its own, and stores the reply under the original
+    request id. A failed call gives the message back and ends the round, since the
+    providers are likely still down.
+    """
+
+    router: "LLMRouter"
+    interval: float = 5.0
+    batch_size: int = 8
+    lease_seconds: float = 120.0
+    logger: logging.Logger = field(default_factory=lambda: logging.getLogger("cody.llm"))
+
+    def __post_init__(self) -> None:
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="cody-pending-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def replay_once(self) -> int:
+        """Answer one round of queued messages; returns how many were answered."""
+        router = self.router
+        if all(breaker.state == health.OPEN for breaker in router.breakers.values()):
+            return 0
+        claimed = router.pending_messages.claim(self.batch_size, self.lease_seconds)
+        answered = 0
+        for index, entry in enumerate(claimed):
+            system_prompt, _ = router._resolve_intent(entry.message, request_id=entry.request_id)
+            composed = router._compose_message(entry.message, None, system_prompt, entry.request_id)
+            reply, provider, _ = router._call_providers(composed, system_prompt, entry.request_id)
+            if not (reply and provider):
+                for unanswered in claimed[index:]:
+                    router.pending_messages.release(unanswered)
+                break
+            router.pending_messages.complete(entry, reply, provider)
+            answered += 1
+            self.logger.info(
+                "llm.pending.replayed request_id=%s recipient=%s provider=%s attempts=%s",
+                entry.request_id,
+                entry.recipient,
+                provider,
+                entry.attempts + 1,
+            )
+        return answered
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                while self.replay_once() == self.batch_size and not self._stopped.is_set():
+                    pass  # a full round: more may be waiting
+            except Exception:  # keep replaying; claimed messages come back when their lease ends
+                self.logger.exception("llm.pending.replay_failed")
+
+
+@dataclass
+class _ModelState:
+    model: str
+    endpoint: str | None
+    warm: bool = False
+    loads: int = 0
+    cold_loads: int = 0
+    failures: int = 0
+    last_load_seconds: float | None = None
+
+
+@dataclass
+class ModelManager:
+    """Keeps local Ollama models loaded, so a failover never waits on a cold load.
+
+    ``targets`` are (client, model) pairs. ``start`` preloads them on a background
+    thread, then every ``interval`` seconds touches each model with a load request.
+    That restarts its ``keep_alive`` timer, or reloads it if Ollama evicted it anyway,
+    which ``/api/ps`` reveals and ``stats`` counts as a cold load. ``interval`` should
+    stay below the clients' keep-alive duration.
+    """
+
+    targets: list[tuple[OllamaClient, str]]
+    interval: float = 240.0
+    load_timeout: float = 120.0
+    logger: logging.Logger = field(default_factory=lambda: logging.getLogger("cody.llm"))
+
+    def __post_init__(self) -> None:
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._state = {
+            (client.endpoint, model): _ModelState(model, client.endpoint)
+            for client, model in self.targets
+        }
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="cody-model-manager", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.load_timeout + 1)
+            self._thread = None
+
+    def refresh(self) -> dict[str, bool]:
+        """Load or touch every model once; returns ``{model: warm}``."""
+        resident: dict[str | None, set[str] | None] = {}
+        for client, model in self.targets:
+            if client.endpoint not in resident:
+                resident[client.endpoint] = client.running_models()
+            running = resident[client.endpoint]
+            started = time.monotonic()
+            loaded = client.load(model, timeout=self.load_timeout)
+            elapsed = time.monotonic() - started
+            # Unknown residency (an older Ollama without /api/ps) is not counted as cold.
+            cold = loaded and running is not None and model not in running
+            with self._lock:
+                state = self._state[(client.endpoint, model)]
+                state.warm = loaded
+                if loaded:
+                    state.loads += 1
+                    state.cold_loads += int(cold)
+                    state.last_load_seconds = round(elapsed, 3)
+                else:
+                    state.failures += 1
+            if cold or not loaded:
+                self.logger.info(
+                    "llm.models.load model=%s endpoint=%s loaded=%s cold=%s seconds=%.2f",
+                    model,
+                    client.endpoint,
+                    loaded,
+                    cold,
+                    elapsed,
+                )
+        with self._lock:
+            return {state.model: state.warm for state in self._state.values()}
+
+    def warm_models(self) -> list[str]:
+        with self._lock:
+            return [state.model for state in self._state.values() if state.warm]
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = [asdict(state) for state in self._state.values()]
+        return {"enabled": True, "interval_seconds": self.interval, "models": models}
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception:  # keep touching; the next round retries
+                self.logger.exception("llm.models.refresh_failed")
+            if self._stopped.wait(self.interval):
+                return
+
+
+@dataclass
+class _Chat:
+    """One chat request on its way through the routing stages both routers share."""
+
+    message: str
+    trace_id: str
+    recipient: str
+    conversation_id: str | None
+    system_prompt: str = ""
+    composed: str = ""  # the message with history and notes, as sent to providers
+    flight_key: str = ""  # identical prompts share one provider call
+    cache_key: str | None = None
+    embedding: list[float] | None = None
+    result: dict | None = None  # set once answered without (or after) a provider call
+
+
 @dataclass
 class LLMRouter:
     intent_client: OllamaClient
@@ -84,8 +790,168 @@ class LLMRouter:
     intent_model: str = "qwen3:0.6b"
     primary_model: str = "qwen3-coder:480b-cloud"
     fallback_model: str = "deepseek-coder:6.7b"
-    pending_messages: list[str] = field(default_factory=list)
+    # Messages stubbed while no provider answered, answered later by a PendingReplayer.
+    # In memory by default; build_router gives it a SQLite file shared by supervisor workers.
+    pending_messages: pending.PendingQueue = field(default_factory=pending.PendingQueue)
     logger: logging.Logger = field(default_factory=lambda: logging.getLogger("cody.llm"))
+    breaker_failure_threshold: int = 3
+    breaker_reset_timeout: float = 30.0
+    breakers: dict[str, health.CircuitBreaker] = field(default_factory=dict)
+    latency: dict[str, health.LatencyWindow] = field(default_factory=dict)
+    # Hedging: race the fallback against a primary that is slower than the budget.
+    hedge_enabled: bool = False
+    # Fixed hedge budget; None uses the primary's rolling percentile.
+    hedge_after_seconds: float | None = None
+    hedge_percentile: float = 0.9
+    hedge_min_samples: int = 20
+    hedge_default_seconds: float = 5.0
+    hedge_max_concurrency: int = 8  # hedged requests in flight at once; others route sequentially
+    response_cache: cache.ResponseCache | None = None
+    semantic_cache: semantic.SemanticCache | None = None
+    embedding_model: str = "nomic-embed-text"  # chat models' embeddings match paraphrases poorly
+    # Identical prompts in flight at the same time share one provider call.
+    flights: SingleFlight = field(default_factory=SingleFlight)
+    # Long-term memory retrieval: prepend the top-k BM25 hits for the message,
+    # within a token budget.
+    memory: conversation_memory.MemoryStore | None = None
+    memory_top_k: int = 0
+    memory_token_budget: int = 512
+    # Chats that pass a conversation_id keep their turns in memory's short-term buffers;
+    # past summarize_after_tokens (0 disables) the older turns are summarized in the background.
+    summarize_after_tokens: int = 0
+    summary_keep_turns: int = 4
+    # Per-model context budgets for composed prompts; the oldest history is dropped first.
+    prompt_builder: prompt.PromptBuilder = field(default_factory=prompt.PromptBuilder)
+
+    def __post_init__(self) -> None:
+        for provider, _, _ in self._provider_chain():
+            self.breakers.setdefault(
+                provider,
+                health.CircuitBreaker(
+                    name=provider,
+                    failure_threshold=self.breaker_failure_threshold,
+                    reset_timeout=self.breaker_reset_timeout,
+                ),
+            )
+            self.latency.setdefault(provider, health.LatencyWindow())
+        self._hedge_lock = threading.Lock()
+        self._hedge_slots = threading.BoundedSemaphore(self.hedge_max_concurrency)
+        self._hedge_executor: futures.ThreadPoolExecutor | None = None
+        self._hedge_stats: Counter[str] = Counter()
+        self._hedge_queued_seconds = 0.0
+        self.model_manager: ModelManager | None = None
+        self.summarizer: ConversationSummarizer | None = None
+        if self.memory is not None and self.summarize_after_tokens > 0:
+            self.summarizer = ConversationSummarizer(
+                memory=self.memory,
+                summarize=self._summarize,
+                max_tokens=self.summarize_after_tokens,
+                keep_turns=self.summary_keep_turns,
+                logger=self.logger,
+            )
+
+    def start_memory_workers(self, compact_interval: float = 300.0) -> None:
+        """Start the summarizer and long-term compactor threads, when memory is configured."""
+        if self.memory is None:
+            return
+        self.memory.long_term.start_compactor(compact_interval)
+        if self.summarizer is not None:
+            self.summarizer.start()
+
+    def stop_memory_workers(self) -> None:
+        if self.memory is None:
+            return
+        if self.summarizer is not None:
+            self.summarizer.stop()
+        self.memory.long_term.stop_compactor()
+
+    def start_replay_worker(self, interval: float = 5.0) -> PendingReplayer:
+        """Start a background worker that answers stubbed messages once a provider recovers."""
+        replayer = PendingReplayer(router=self, interval=interval, logger=self.logger)
+        replayer.start()
+        return replayer
+
+    def start_model_manager(
+        self, interval: float = 240.0, load_timeout: float = 120.0
+    ) -> ModelManager:
+        """Preload the local models and keep them resident; see ``ModelManager``.
+
+        Cloud models (``-cloud`` tags) run on Ollama's servers and are not loaded locally.
+        """
+        targets = [(self.intent_client, self.intent_model)]
+        if self.semantic_cache is not None:
+            targets.append((self.intent_client, self.embedding_model))
+        targets.extend((client, model) for _, client, model in reversed(self._provider_chain()))
+        unique: dict[tuple[str | None, str], tuple[OllamaClient, str]] = {}
+        for client, model in targets:
+            if not model.endswith("-cloud"):
+                unique.setdefault((client.endpoint, model), (client, model))
+        self.model_manager = ModelManager(
+            targets=list(unique.values()),
+            interval=interval,
+            load_timeout=load_timeout,
+            logger=self.logger,
+        )
+        self.model_manager.start()
+        return self.model_manager
+
+    def start_health_probe(self, interval: float = 5.0) -> health.HealthProbe:
+        """Start a background probe that closes provider circuits once their model answers again."""
+        probe = health.HealthProbe(
+            targets=[
+                (self.breakers[provider], functools.partial(client.probe, model))
+                for provider, client, model in self._provider_chain()
+            ],
+            interval=interval,
+        )
+        probe.start()
+        return probe
+
+    def provider_health(self) -> dict:
+        """Circuit breaker state per provider."""
+        return {provider: breaker.snapshot() for provider, breaker in self.breakers.items()}
+
+    def metrics(self) -> dict:
+        """Operational metrics for /status and the TCP status commands."""
+        return {
+            "cache": self.response_cache.stats() if self.response_cache else {"enabled": False},
+            "semantic_cache": (
+                self.semantic_cache.stats() if self.semantic_cache else {"enabled": False}
+            ),
+            "providers": self.provider_health(),
+            "latency": {provider: window.snapshot() for provider, window in self.latency.items()},
+            "timeouts": self.client_latency(),
+            "models": self.model_manager.stats() if self.model_manager else {"enabled": False},
+            "hedging": {
+                "enabled": self.hedge_enabled,
+                "budget_seconds": self.hedge_budget(),
+                "max_concurrency": self.hedge_max_concurrency,
+                "fired": self._hedge_stats["fired"],
+                "skipped_busy": self._hedge_stats["skipped_busy"],
+                "won_by_primary": self._hedge_stats["won_by_ollama-cloud"],
+                "won_by_fallback": self._hedge_stats["won_by_ollama-local"],
+                "queued_seconds": round(self._hedge_queued_seconds, 6),
+            },
+            "coalescing": self.flights.stats(),
+            "memory": self.memory.stats() if self.memory else {"enabled": False},
+            "summarizer": self.summarizer.stats() if self.summarizer else {"enabled": False},
+            "pending": self.pending_messages.stats(),
+            "prompt": {
+                "budget_tokens": self.prompt_builder.budget(self._prompt_model()),
+                **self.prompt_builder.stats(),
+            },
+        }
+
+    def client_latency(self) -> dict:
+        """Each client's latency histograms and adaptive timeouts, per model and operation."""
+        clients = {"intent": self.intent_client}
+        clients.update({provider: client for provider, client, _ in self._provider_chain()})
+        # Test doubles and custom clients may not track latency.
+        return {
+            label: client.latency_stats()
+            for label, client in clients.items()
+            if hasattr(client, "latency_stats")
+        }
 
     def _resolve_intent(self, message: str, request_id: str) -> tuple[str, bool]:
         """Use keyword matching to detect simple computation requests.
@@ -140,6 +1006,7 @@ class LLMRouter:
             return {
                 "reply": f"Result:\n```\n{output}\n```",
                 "provider": "local-tool",
+                "engine": result.get("engine", "docker"),
                 "executed_code": code,
                 "exit_code": result.get("exit_code"),
             }
@@ -148,123 +1015,1014 @@ class LLMRouter:
             return {
                 "reply": f"Error executing code:\n```\n{error_msg}\n```",
                 "provider": "local-tool-error",
+                "engine": result.get("engine", "docker"),
                 "executed_code": code,
             }
 
-    def _compose_message(self, message: str) -> str:
-        if not self.pending_messages:
-            return message
+    def _compose_message(
+        self, message: str, conversation_id: str | None, system_prompt: str, request_id: str
+    ) -> str:
+        """Memory notes, conversation history and ``message``, within the prompt budget.
+
+        The budget is that of the chain model with the smallest context, so the prompt
+        fits whichever provider answers. When history turns had to be dropped, the
+        conversation is queued for summarization.
+        """
+        model = self._prompt_model()
+        composed = self.prompt_builder.build(
+            model,
+            system_prompt,
+            message,
+            history=self._conversation_history(conversation_id),
+            notes=self._memory_notes(message),
+        )
+        self.logger.info(
+            "llm.prompt.composed request_id=%s model=%s tokens=%s budget=%s "
+            "dropped_turns=%s dropped_notes=%s truncated=%s",
+            request_id,
+            model,
+            composed.tokens,
+            composed.budget,
+            composed.dropped_turns,
+            composed.dropped_notes,
+            composed.truncated,
+        )
+        if composed.dropped_turns and conversation_id and self.summarizer is not None:
+            self.summarizer.observe(conversation_id, force=True)
+        return composed.message
+
+    def _prompt_model(self) -> str:
+        return min(
+            (model for _, _, model in self._provider_chain()), key=self.prompt_builder.budget
+        )
+
+    def _conversation_history(self, conversation_id: str | None) -> list[str]:
+        """The conversation's running summary plus the turns still in short-term memory."""
+        if self.memory is None or not conversation_id:
+            return []
+        lines = []
+        try:
+            summary = self.memory.load_long_term_summary(
+                topic=SUMMARY_TOPIC, conversation_id=conversation_id
+            )
+        except sqlite3.Error as exc:
+            self.logger.warning(
+                "llm.memory.summary_failed conversation_id=%s error=%s", conversation_id, exc
+            )
+            summary = {}
+        if summary:
+            lines.append(f"(Summary of earlier turns) {summary['summary']}")
+        turns = self.memory.get_short_term_turns(conversation_id)
+        lines.extend(f"{turn.role.capitalize()}: {turn.content}" for turn in turns)
+        return lines
 
-        queued_messages = "\n".join(f"- {queued}" for queued in self.pending_messages)
+    def _record_turns(self, conversation_id: str | None, message: str, result: dict) -> None:
+        """Remember an answered exchange; stub replies are not answers and are skipped."""
+        if self.memory is None or not conversation_id or result.get("provider") == "stub":
+            return
+        self.memory.append_short_term(conversation_id, "user", message)
+        self.memory.append_short_term(conversation_id, "assistant", result.get("reply", ""))
+        if self.summarizer is not None:
+            self.summarizer.observe(conversation_id)
+
+    def _summarize(self, prompt: str) -> str | None:
+        """Summaries use the local fallback model, through its circuit breaker."""
+        provider = "ollama-local"
+        if not self.breakers[provider].allow_request():
+            return None
+        request_id = f"summary-{uuid.uuid4().hex}"
+        return self._call_provider(
+            provider, self.fallback_client, self.fallback_model, prompt, request_id=request_id
+        )
+
+    def _queue_for_replay(
+        self, message: str, request_id: str, recipient: str, conversation_id: str | None
+    ) -> dict:
+        """Queue a message no provider answered and build the stub reply.
+
+        The queue is partitioned by conversation when the client sent one, else by
+        recipient. The stub carries the ``result_token`` needed to fetch the replay.
+        """
+        result_token = pending.new_result_token()
+        queued = self.pending_messages.append(
+            message,
+            request_id=request_id,
+            recipient=conversation_id or recipient,
+            result_token=result_token,
+        )
+        self._log_response_sent(request_id, recipient, "stub")
+        return {
+            "reply": f"[stub] Cody saved your message while providers are unavailable: {message}",
+            "provider": "stub",
+            "queued": True,
+            "queued_messages": queued,
+            "request_id": request_id,
+            "result_token": result_token,
+        }
+
+    def pending_result(self, request_id: str, result_token: str) -> dict:
+        """Replayed answer for a stubbed ``request_id``: ``done``, ``queued`` or ``unknown``."""
+        return self.pending_messages.result(request_id, result_token)
+
+    def _memory_notes(self, message: str) -> list[str]:
+        """Best-ranked long-term summaries for ``message`` that fit in ``memory_token_budget``.
+
+        Conversation summaries are private to their conversation, which gets its
+        own through the history, so they are never offered as notes.
+        """
+        if self.memory is None or self.memory_top_k <= 0:
+            return []
+        try:
+            hits = self.memory.search_long_term(
+                message, self.memory_top_k, exclude_topics=(SUMMARY_TOPIC,)
+            )
+        except sqlite3.Error as exc:  # retrieval is best-effort; answer without it
+            self.logger.warning("llm.memory.search_failed error=%s", exc)
+            return []
+        lines, used = [], 0
+        for summary, _score in hits:
+            line = f"- {summary['topic']}: {summary['summary']}"
+            tokens = estimate_tokens(line)
+            if used + tokens > self.memory_token_budget:
+                continue  # a shorter, lower-ranked note may still fit
+            lines.append(line)
+            used += tokens
+        return lines
+
+    def _provider_chain(self) -> tuple[tuple[str, OllamaClient, str], ...]:
+        """Providers in fallback order as (provider label, client, model)."""
         return (
-            "System note: these user messages were queued while no LLM provider was available. "
-            "Please process them as oldest-to-newest context before answering the latest request.\n\n"
-            f"Queued messages:\n{queued_messages}\n\n"
-            f"Latest user message:\n{message}"
+            ("ollama-cloud", self.primary_client, self.primary_model),
+            ("ollama-local", self.fallback_client, self.fallback_model),
         )
 
-    def _route_to_provider(
-        self, message: str, system_prompt: str, request_id: str
-    ) -> tuple[str | None, str | None]:
-        """Send message with system prompt to primary/fallback providers."""
-        full_message = f"{system_prompt}\n\nUser: {message}"
+    def _call_provider(
+        self, provider: str, client: OllamaClient, model: str, full_message: str, request_id: str
+    ) -> str | None:
+        """Make one provider call, recording breaker outcome and latency."""
+        started = self._call_started(provider, model, request_id)
+        reply = client.chat(full_message, model=model)
+        return self._call_finished(provider, model, request_id, reply, started)
 
+    def _call_started(
+        self, provider: str, model: str, request_id: str, stream: bool = False
+    ) -> float:
         self.logger.info(
-            "llm.call.start request_id=%s provider=%s model=%s",
+            "llm.call.start request_id=%s provider=%s model=%s%s",
             request_id,
-            "ollama-cloud",
-            self.primary_model,
+            provider,
+            model,
+            " stream=true" if stream else "",
         )
-        primary_reply = self.primary_client.chat(full_message, model=self.primary_model)
-        if primary_reply:
+        return time.monotonic()
+
+    def _call_finished(
+        self, provider: str, model: str, request_id: str, reply: str | None, started: float
+    ) -> str | None:
+        """Record a finished call with the breaker and latency window; returns the reply or None."""
+        breaker = self.breakers[provider]
+        if reply:
+            breaker.record_success()
+            self.latency[provider].record(time.monotonic() - started)
             self.logger.info(
                 "llm.call.success request_id=%s provider=%s model=%s",
                 request_id,
-                "ollama-cloud",
-                self.primary_model,
+                provider,
+                model,
             )
-            return primary_reply, "ollama-cloud"
+            return reply
+        breaker.record_failure()
         self.logger.info(
             "llm.call.unavailable request_id=%s provider=%s model=%s",
             request_id,
-            "ollama-cloud",
-            self.primary_model,
+            provider,
+            model,
+        )
+        return None
+
+    def _route_to_provider(
+        self, message: str, system_prompt: str, request_id: str
+    ) -> tuple[str | None, str | None]:
+        """Send message with system prompt to primary/fallback providers."""
+        full_message = f"{system_prompt}\n\nUser: {message}"
+
+        for provider, client, model in self._provider_chain():
+            if not self.breakers[provider].allow_request():
+                self._log_circuit_open(request_id, provider, model)
+                continue
+            reply = self._call_provider(provider, client, model, full_message, request_id)
+            if reply:
+                return reply, provider
+
+        return None, None
+
+    def hedge_budget(self) -> float:
+        """Seconds to wait on the primary before hedging to the fallback."""
+        if self.hedge_after_seconds is not None:
+            return self.hedge_after_seconds
+        window = self.latency["ollama-cloud"]
+        observed = window.percentile(self.hedge_percentile)
+        if observed is None or len(window) < self.hedge_min_samples:
+            return self.hedge_default_seconds
+        return observed
+
+    def _route_hedged(
+        self, message: str, system_prompt: str, request_id: str
+    ) -> tuple[str | None, str | None, bool]:
+        """Race the fallback against a slow primary; returns (reply, provider, hedged).
+
+        The primary gets ``hedge_budget()`` seconds on its own. If it has not answered
+        by then, the same prompt is sent to the fallback and the first non-empty reply
+        wins; the loser keeps running in the background and its result is ignored.
+
+        A hedged request holds one of ``hedge_max_concurrency`` slots until both of
+        its calls have returned, losers included, and the pool has two threads per
+        slot, so calls never queue behind other requests' losers. When every slot is
+        taken the request is routed sequentially instead.
+        """
+        (primary, primary_client, primary_model), (fallback, fallback_client, fallback_model) = (
+            self._provider_chain()
         )
+        if not self.breakers[primary].allow_request():
+            self._log_circuit_open(request_id, primary, primary_model)
+            reply, provider = self._route_to_provider(message, system_prompt, request_id)
+            return reply, provider, False
+        if not self._take_hedge_slot(request_id):
+            reply, provider = self._route_to_provider(message, system_prompt, request_id)
+            return reply, provider, False
 
+        full_message = f"{system_prompt}\n\nUser: {message}"
+        executor = self._hedge_pool()
+        in_flight: dict[futures.Future, str] = {}
+        primary_started = threading.Event()
+        fallback_started = False
+
+        def call_primary() -> str | None:
+            primary_started.set()
+            return self._call_provider(
+                primary, primary_client, primary_model, full_message, request_id
+            )
+
+        def start_fallback() -> None:
+            nonlocal fallback_started
+            fallback_started = True
+            if not self.breakers[fallback].allow_request():
+                self._log_circuit_open(request_id, fallback, fallback_model)
+                return
+            in_flight[
+                executor.submit(
+                    self._call_provider,
+                    fallback,
+                    fallback_client,
+                    fallback_model,
+                    full_message,
+                    request_id,
+                )
+            ] = fallback
+
+        hedged = False
+        try:
+            submitted = time.monotonic()
+            in_flight[executor.submit(call_primary)] = primary
+            # The budget runs from the call's start; any wait for a thread is counted apart.
+            primary_started.wait()
+            self._hedge_queued(time.monotonic() - submitted)
+            budget = self.hedge_budget()
+            done, _ = futures.wait(in_flight, timeout=budget)
+            if not done:
+                hedged = True
+                self._hedge_fired(request_id, budget)
+                start_fallback()
+
+            pending = set(in_flight)
+            while pending:
+                done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    reply = future.result()
+                    if reply:
+                        provider = in_flight[future]
+                        if hedged:
+                            self._hedge_won(request_id, provider)
+                        return reply, provider, hedged
+                if not pending and not fallback_started:
+                    # The primary failed before the budget expired: plain sequential fallback.
+                    start_fallback()
+                    pending = {future for future in in_flight if not future.done()}
+        finally:
+            self._release_hedge_slot_when_done(list(in_flight))
+
+        return None, None, hedged
+
+    def _take_hedge_slot(self, request_id: str) -> bool:
+        if self._hedge_slots.acquire(blocking=False):
+            return True
+        with self._hedge_lock:
+            self._hedge_stats["skipped_busy"] += 1
+        self.logger.info(
+            "llm.hedge.skipped request_id=%s reason=busy",
+            request_id,
+        )
+        return False
+
+    def _release_hedge_slot_when_done(
+        self, calls: Sequence[futures.Future | asyncio.Future]
+    ) -> None:
+        """Give the slot back once every call in ``calls`` (futures or tasks) has finished."""
+        remaining = len(calls)
+        if not remaining:
+            self._hedge_slots.release()
+            return
+        lock = threading.Lock()
+
+        def finished(_call: object) -> None:
+            nonlocal remaining
+            with lock:
+                remaining -= 1
+                last = remaining == 0
+            if last:
+                self._hedge_slots.release()
+
+        for call in calls:
+            call.add_done_callback(finished)
+
+    def _hedge_queued(self, seconds: float) -> None:
+        with self._hedge_lock:
+            self._hedge_queued_seconds += seconds
+
+    def _hedge_fired(self, request_id: str, budget: float) -> None:
+        with self._hedge_lock:
+            self._hedge_stats["fired"] += 1
+        self.logger.info(
+            "llm.hedge.fired request_id=%s budget_seconds=%.3f",
+            request_id,
+            budget,
+        )
+
+    def _hedge_won(self, request_id: str, provider: str) -> None:
+        with self._hedge_lock:
+            self._hedge_stats[f"won_by_{provider}"] += 1
         self.logger.info(
-            "llm.call.start request_id=%s provider=%s model=%s",
+            "llm.hedge.winner request_id=%s provider=%s",
             request_id,
-            "ollama-local",
-            self.fallback_model,
+            provider,
         )
-        fallback_reply = self.fallback_client.chat(full_message, model=self.fallback_model)
-        if fallback_reply:
+
+    def _hedge_pool(self) -> futures.ThreadPoolExecutor:
+        with self._hedge_lock:
+            if self._hedge_executor is None:
+                # A hedged request runs at most two calls at once, so no call ever queues.
+                self._hedge_executor = futures.ThreadPoolExecutor(
+                    max_workers=2 * self.hedge_max_concurrency, thread_name_prefix="cody-hedge"
+                )
+            return self._hedge_executor
+
+    def _stream_from_provider(
+        self, message: str, system_prompt: str, request_id: str
+    ) -> Iterator[tuple[str, str]]:
+        """Stream (provider, delta) pairs.
+
+        Falls back only if a provider fails before its first token.
+        """
+        full_message = f"{system_prompt}\n\nUser: {message}"
+
+        for provider, client, model in self._provider_chain():
+            if not self.breakers[provider].allow_request():
+                self._log_circuit_open(request_id, provider, model)
+                continue
+            self._call_started(provider, model, request_id, stream=True)
+            streamed = False
+            try:
+                for delta in client.chat_stream(full_message, model=model):
+                    if not streamed:
+                        streamed = True
+                        self._first_token(provider, model, request_id)
+                    yield provider, delta
+            except StreamTruncatedError:
+                self._stream_truncated(provider, model, request_id)
+                raise
+            if self._stream_finished(provider, model, request_id, streamed):
+                return
+
+    def _first_token(self, provider: str, model: str, request_id: str) -> None:
+        self.breakers[provider].record_success()
+        self.logger.info(
+            "llm.call.first_token request_id=%s provider=%s model=%s",
+            request_id,
+            provider,
+            model,
+        )
+
+    def _stream_truncated(self, provider: str, model: str, request_id: str) -> None:
+        """A stream that breaks off mid-reply counts against its provider like a failed call."""
+        self.breakers[provider].record_failure()
+        self.logger.warning(
+            "llm.call.truncated request_id=%s provider=%s model=%s",
+            request_id,
+            provider,
+            model,
+        )
+
+    def _stream_finished(self, provider: str, model: str, request_id: str, streamed: bool) -> bool:
+        """Log a finished stream and return ``streamed``.
+
+        A stream that produced nothing counts as a failure.
+        """
+        if streamed:
             self.logger.info(
                 "llm.call.success request_id=%s provider=%s model=%s",
                 request_id,
-                "ollama-local",
-                self.fallback_model,
+                provider,
+                model,
             )
-            return fallback_reply, "ollama-local"
+            return True
+        self.breakers[provider].record_failure()
         self.logger.info(
             "llm.call.unavailable request_id=%s provider=%s model=%s",
             request_id,
-            "ollama-local",
-            self.fallback_model,
+            provider,
+            model,
         )
+        return False
 
-        return None, None
+    def _log_response_sent(self, request_id: str, recipient: str, provider: str) -> None:
+        self.logger.info(
+            "llm.response.sent request_id=%s recipient=%s provider=%s",
+            request_id,
+            recipient,
+            provider,
+        )
+
+    def _log_circuit_open(self, request_id: str, provider: str, model: str) -> None:
+        self.logger.info(
+            "llm.call.skipped request_id=%s provider=%s model=%s reason=circuit_open",
+            request_id,
+            provider,
+            model,
+        )
+
+    def _cache_lookup(
+        self, system_prompt: str, composed_message: str, request_id: str
+    ) -> tuple[str | None, dict | None]:
+        """Return (cache key, cached response)."""
+        if self.response_cache is None:
+            return None, None
+        key = cache.cache_key(self.primary_model, system_prompt, composed_message)
+        hit = self.response_cache.get(key)
+        if hit is None:
+            return key, None
+        self.logger.info(
+            "llm.cache.hit request_id=%s cached_provider=%s",
+            request_id,
+            hit["provider"],
+        )
+        return key, {"reply": hit["reply"], "provider": "cache", "cached_provider": hit["provider"]}
+
+    def _semantic_lookup(self, chat: _Chat) -> None:
+        """Embed the message on the intent client and look it up in the semantic cache."""
+        if self.semantic_cache is None or chat.result is not None:
+            return
+        self._semantic_hit(
+            chat, self.intent_client.embed(chat.composed, model=self.embedding_model)
+        )
+
+    def _semantic_hit(self, chat: _Chat, embedding: list[float] | None) -> None:
+        """Answer ``chat`` from the semantic cache if ``embedding`` matches a paraphrase.
+
+        The embedding is kept on ``chat`` so the provider's reply can be stored under it.
+        """
+        chat.embedding = embedding
+        if embedding is None or self.semantic_cache is None:
+            return
+        hit = self.semantic_cache.lookup(self._semantic_namespace(chat.system_prompt), embedding)
+        if hit is None:
+            return
+        self.logger.info(
+            "llm.semantic_cache.hit request_id=%s cached_provider=%s similarity=%s",
+            chat.trace_id,
+            hit["provider"],
+            hit["similarity"],
+        )
+        chat.result = {
+            "reply": hit["reply"],
+            "provider": "semantic-cache",
+            "cached_provider": hit["provider"],
+            "similarity": hit["similarity"],
+        }
+
+    def _semantic_namespace(self, system_prompt: str) -> str:
+        return f"{self.primary_model}\n{system_prompt}"
+
+    def _remember_reply(
+        self,
+        cache_key: str | None,
+        embedding: list[float] | None,
+        system_prompt: str,
+        reply: str,
+        provider: str,
+    ) -> None:
+        """Cache a provider's reply; only the primary's, as both caches key on its model."""
+        if provider != self._provider_chain()[0][0]:
+            return
+        if cache_key is not None and self.response_cache is not None:
+            self.response_cache.put(cache_key, reply, provider)
+        if embedding is not None and self.semantic_cache is not None:
+            self.semantic_cache.insert(
+                self._semantic_namespace(system_prompt), embedding, reply, provider
+            )
+
+    def _begin_chat(
+        self,
+        message: str,
+        request_id: str | None,
+        recipient: str,
+        conversation_id: str | None,
+        mode: str = "",
+    ) -> _Chat:
+        """Everything before the provider call; shared with ``AsyncLLMRouter``.
 
-    def route_chat(self, message: str, request_id: str | None = None, recipient: str = "unknown") -> dict:
-        """Route a chat message through intent resolver to tools or LLM."""
-        trace_id = request_id or uuid.uuid4().hex
+        Resolves the intent, answers tool intents, composes the prompt and checks the
+        exact-match cache, setting ``chat.result`` when no provider is needed. It
+        blocks (sandbox runs, SQLite reads), so the async router runs it in a thread.
+        """
+        chat = _Chat(message, request_id or uuid.uuid4().hex, recipient, conversation_id)
         self.logger.info(
-            "llm.request.received request_id=%s recipient=%s queued_messages=%s",
-            trace_id,
+            "llm.request.received request_id=%s recipient=%s%s",
+            chat.trace_id,
             recipient,
-            len(self.pending_messages),
+            mode,
         )
 
         # Stage 1: Resolve intent with tiny model
-        intent_result, can_handle_with_tools = self._resolve_intent(message, request_id=trace_id)
+        chat.system_prompt, can_handle_with_tools = self._resolve_intent(
+            message, request_id=chat.trace_id
+        )
 
         # Stage 1b: If intent resolver detected a tool opportunity, execute directly
         if can_handle_with_tools:
             self.logger.info(
                 "llm.intent.tool_executing request_id=%s",
-                trace_id,
+                chat.trace_id,
             )
-            return self._execute_tool_and_respond(intent_result, trace_id)
+            chat.result = self._execute_tool_and_respond(chat.system_prompt, chat.trace_id)
+            return chat
 
-        # Stage 2: Send to primary/fallback with system prompt
-        composed_message = self._compose_message(message)
-        reply, provider = self._route_to_provider(
-            composed_message, intent_result, request_id=trace_id
+        # Stage 2: Compose the prompt for primary/fallback and check the cache
+        chat.composed = self._compose_message(
+            message, conversation_id, chat.system_prompt, chat.trace_id
+        )
+        chat.flight_key = cache.cache_key(self.primary_model, chat.system_prompt, chat.composed)
+        chat.cache_key, chat.result = self._cache_lookup(
+            chat.system_prompt, chat.composed, chat.trace_id
         )
+        return chat
 
-        if reply and provider:
-            self.pending_messages.clear()
-            self.logger.info(
-                "llm.response.sent request_id=%s recipient=%s provider=%s queued_messages=%s",
-                trace_id,
-                recipient,
-                provider,
-                len(self.pending_messages),
+    def _finish_chat(
+        self,
+        chat: _Chat,
+        reply: str | None = None,
+        provider: str | None = None,
+        extra_fields: dict | None = None,
+        shared: bool = False,
+        truncated: bool = False,
+    ) -> dict:
+        """Everything after the provider call; shared with ``AsyncLLMRouter``. Returns the response.
+
+        Caches a fresh reply (unless it was ``shared`` by a coalesced call, whose
+        leader caches it) or, when no provider answered, queues the message for
+        replay. The exchange is then recorded in conversation memory. Blocks on SQLite.
+        A ``truncated`` stream's partial reply is returned flagged, but is neither
+        cached nor recorded.
+        """
+        if truncated:
+            self._log_response_sent(chat.trace_id, chat.recipient, provider or "none")
+            return {
+                "reply": reply,
+                "provider": provider,
+                "truncated": True,
+                "error": "stream_truncated",
+            }
+        if chat.result is None:
+            extra_fields = extra_fields or {}
+            if shared:
+                self.logger.info(
+                    "llm.request.coalesced request_id=%s provider=%s",
+                    chat.trace_id,
+                    provider or "none",
+                )
+                extra_fields = {**extra_fields, "coalesced": True}
+            if not (reply and provider):
+                # All providers failed - queue message for replay and return stub
+                return self._queue_for_replay(
+                    chat.message, chat.trace_id, chat.recipient, chat.conversation_id
+                )
+            if not shared:
+                self._remember_reply(
+                    chat.cache_key, chat.embedding, chat.system_prompt, reply, provider
+                )
+            chat.result = {"reply": reply, "provider": provider, **extra_fields}
+        self._log_response_sent(chat.trace_id, chat.recipient, chat.result["provider"])
+        self._record_turns(chat.conversation_id, chat.message, chat.result)
+        return chat.result
+
+    def route_chat(
+        self,
+        message: str,
+        request_id: str | None = None,
+        recipient: str = "unknown",
+        conversation_id: str | None = None,
+    ) -> dict:
+        """Route a chat message through intent resolver to tools or LLM.
+
+        With a ``conversation_id`` the prompt carries the conversation's history, and
+        the answered exchange is added to it.
+        """
+        chat = self._begin_chat(message, request_id, recipient, conversation_id)
+        self._semantic_lookup(chat)
+        if chat.result is not None:
+            return self._finish_chat(chat)
+        (reply, provider, extra_fields), shared = self.flights.do(
+            chat.flight_key,
+            lambda: self._call_providers(chat.composed, chat.system_prompt, chat.trace_id),
+        )
+        return self._finish_chat(chat, reply, provider, extra_fields, shared)
+
+    def _call_providers(
+        self, composed_message: str, system_prompt: str, request_id: str
+    ) -> tuple[str | None, str | None, dict]:
+        """Run the provider stage once: hedged when enabled, otherwise primary then fallback."""
+        if self.hedge_enabled:
+            reply, provider, hedged = self._route_hedged(
+                composed_message, system_prompt, request_id=request_id
             )
-            return {"reply": reply, "provider": provider}
+            return reply, provider, {"hedged": hedged}
+        reply, provider = self._route_to_provider(
+            composed_message, system_prompt, request_id=request_id
+        )
+        return reply, provider, {}
 
-        # All providers failed - queue message and return stub
-        self.pending_messages.append(message)
-        self.logger.info(
-            "llm.response.sent request_id=%s recipient=%s provider=%s queued_messages=%s",
-            trace_id,
-            recipient,
-            "stub",
-            len(self.pending_messages),
+    def route_chat_stream(
+        self,
+        message: str,
+        request_id: str | None = None,
+        recipient: str = "unknown",
+        conversation_id: str | None = None,
+    ) -> Iterator[dict]:
+        """Streaming variant of ``route_chat``.
+
+        Yields ``{"type": "delta", "delta": ...}`` events as tokens arrive, then one
+        ``{"type": "final", ...}`` event carrying the same fields ``route_chat`` returns.
+        Tool answers and stub replies produce only the final event. If the provider
+        breaks off mid-reply, the final event has ``"truncated": True`` and
+        ``"error": "stream_truncated"``.
+        """
+        chat = self._begin_chat(
+            message, request_id, recipient, conversation_id, mode=" stream=true"
         )
-        return {
-            "reply": f"[stub] Cody saved your message while providers are unavailable: {message}",
-            "provider": "stub",
-            "queued": True,
-            "queued_messages": len(self.pending_messages),
+        self._semantic_lookup(chat)
+        if chat.result is not None:
+            yield {"type": "final", **self._finish_chat(chat)}
+            return
+        parts: list[str] = []
+        provider = None
+        truncated = False
+        try:
+            for chunk_provider, delta in self._stream_from_provider(
+                chat.composed, chat.system_prompt, request_id=chat.trace_id
+            ):
+                provider = chunk_provider
+                parts.append(delta)
+                yield {"type": "delta", "delta": delta}
+        except StreamTruncatedError:
+            truncated = True
+        yield {
+            "type": "final",
+            **self._finish_chat(chat, "".join(parts), provider, truncated=truncated),
         }
+
+
+@dataclass
+class AsyncLLMRouter:
+    """asyncio front end for an ``LLMRouter``.
+
+    The routing itself is the wrapped router's: ``_begin_chat`` and ``_finish_chat``
+    run in a worker thread, since they may block on the sandbox or SQLite, and the
+    call bookkeeping, caches, breakers, latency windows, hedge counters and pending
+    queue are shared, so sync and async callers see one router. Only provider I/O
+    differs: it goes through ``AsyncOllamaClient`` and never parks a thread.
+    """
+
+    router: LLMRouter
+    intent_client: AsyncOllamaClient
+    primary_client: AsyncOllamaClient
+    fallback_client: AsyncOllamaClient
+    flights: AsyncSingleFlight = field(default_factory=AsyncSingleFlight)
+
+    @classmethod
+    def from_router(cls, router: LLMRouter) -> "AsyncLLMRouter":
+        """Wrap ``router`` with async clients pointed at the same endpoints."""
+        return cls(
+            router=router,
+            intent_client=AsyncOllamaClient.from_client(router.intent_client),
+            primary_client=AsyncOllamaClient.from_client(router.primary_client),
+            fallback_client=AsyncOllamaClient.from_client(router.fallback_client),
+        )
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self.router.logger
+
+    def metrics(self) -> dict:
+        return {**self.router.metrics(), "async_coalescing": self.flights.stats()}
+
+    def pending_result(self, request_id: str, result_token: str) -> dict:
+        return self.router.pending_result(request_id, result_token)
+
+    async def route_chat(
+        self,
+        message: str,
+        request_id: str | None = None,
+        recipient: str = "unknown",
+        conversation_id: str | None = None,
+    ) -> dict:
+        """Async ``LLMRouter.route_chat``; returns the same response fields."""
+        router = self.router
+        chat = await asyncio.to_thread(
+            router._begin_chat, message, request_id, recipient, conversation_id, " async=true"
+        )
+        await self._semantic_lookup(chat)
+        if chat.result is not None:
+            return await asyncio.to_thread(router._finish_chat, chat)
+        (reply, provider, extra_fields), shared = await self.flights.do(
+            chat.flight_key,
+            lambda: self._call_providers(chat.composed, chat.system_prompt, chat.trace_id),
+        )
+        return await asyncio.to_thread(
+            router._finish_chat, chat, reply, provider, extra_fields, shared
+        )
+
+    async def route_chat_stream(
+        self,
+        message: str,
+        request_id: str | None = None,
+        recipient: str = "unknown",
+        conversation_id: str | None = None,
+    ) -> AsyncIterator[dict]:
+        """Async ``LLMRouter.route_chat_stream``; yields the same delta and final events."""
+        router = self.router
+        chat = await asyncio.to_thread(
+            router._begin_chat,
+            message,
+            request_id,
+            recipient,
+            conversation_id,
+            " stream=true async=true",
+        )
+        await self._semantic_lookup(chat)
+        if chat.result is not None:
+            yield {"type": "final", **await asyncio.to_thread(router._finish_chat, chat)}
+            return
+        parts: list[str] = []
+        provider = None
+        truncated = False
+        try:
+            async for chunk_provider, delta in self._stream_from_provider(
+                chat.composed, chat.system_prompt, request_id=chat.trace_id
+            ):
+                provider = chunk_provider
+                parts.append(delta)
+                yield {"type": "delta", "delta": delta}
+        except StreamTruncatedError:
+            truncated = True
+        final = await asyncio.to_thread(
+            router._finish_chat, chat, "".join(parts), provider, truncated=truncated
+        )
+        yield {"type": "final", **final}
+
+    def _provider_chain(self) -> tuple[tuple[str, AsyncOllamaClient, str], ...]:
+        """Same labels as ``LLMRouter._provider_chain`` so breakers and latency are shared."""
+        return (
+            ("ollama-cloud", self.primary_client, self.router.primary_model),
+            ("ollama-local", self.fallback_client, self.router.fallback_model),
+        )
+
+    async def _semantic_lookup(self, chat: _Chat) -> None:
+        router = self.router
+        if router.semantic_cache is None or chat.result is not None:
+            return
+        embedding = await self.intent_client.embed(chat.composed, model=router.embedding_model)
+        router._semantic_hit(chat, embedding)
+
+    async def _call_provider(
+        self,
+        provider: str,
+        client: AsyncOllamaClient,
+        model: str,
+        full_message: str,
+        request_id: str,
+    ) -> str | None:
+        started = self.router._call_started(provider, model, request_id)
+        reply = await client.chat(full_message, model=model)
+        return self.router._call_finished(provider, model, request_id, reply, started)
+
+    async def _call_providers(
+        self, composed_message: str, system_prompt: str, request_id: str
+    ) -> tuple[str | None, str | None, dict]:
+        if self.router.hedge_enabled:
+            reply, provider, hedged = await self._route_hedged(
+                composed_message, system_prompt, request_id=request_id
+            )
+            return reply, provider, {"hedged": hedged}
+        reply, provider = await self._route_to_provider(
+            composed_message, system_prompt, request_id=request_id
+        )
+        return reply, provider, {}
+
+    async def _route_to_provider(
+        self, message: str, system_prompt: str, request_id: str
+    ) -> tuple[str | None, str | None]:
+        full_message = f"{system_prompt}\n\nUser: {message}"
+
+        for provider, client, model in self._provider_chain():
+            if not self.router.breakers[provider].allow_request():
+                self.router._log_circuit_open(request_id, provider, model)
+                continue
+            reply = await self._call_provider(provider, client, model, full_message, request_id)
+            if reply:
+                return reply, provider
+
+        return None, None
+
+    async def _route_hedged(
+        self, message: str, system_prompt: str, request_id: str
+    ) -> tuple[str | None, str | None, bool]:
+        """Async ``LLMRouter._route_hedged``; the losing call is cancelled, not left running."""
+        router = self.router
+        (primary, primary_client, primary_model), (fallback, fallback_client, fallback_model) = (
+            self._provider_chain()
+        )
+        if not router.breakers[primary].allow_request():
+            router._log_circuit_open(request_id, primary, primary_model)
+            reply, provider = await self._route_to_provider(message, system_prompt, request_id)
+            return reply, provider, False
+        if not router._take_hedge_slot(request_id):
+            reply, provider = await self._route_to_provider(message, system_prompt, request_id)
+            return reply, provider, False
+
+        full_message = f"{system_prompt}\n\nUser: {message}"
+        in_flight: dict[asyncio.Future, str] = {}
+        fallback_started = False
+
+        def start_fallback() -> None:
+            nonlocal fallback_started
+            fallback_started = True
+            if not router.breakers[fallback].allow_request():
+                router._log_circuit_open(request_id, fallback, fallback_model)
+                return
+            in_flight[
+                asyncio.ensure_future(
+                    self._call_provider(
+                        fallback, fallback_client, fallback_model, full_message, request_id
+                    )
+                )
+            ] = fallback
+
+        hedged = False
+        try:
+            budget = router.hedge_budget()
+            in_flight[
+                asyncio.ensure_future(
+                    self._call_provider(
+                        primary, primary_client, primary_model, full_message, request_id
+                    )
+                )
+            ] = primary
+            done, _ = await asyncio.wait(in_flight, timeout=budget)
+            if not done:
+                hedged = True
+                router._hedge_fired(request_id, budget)
+                start_fallback()
+
+            pending = set(in_flight)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    reply = task.result()
+                    if reply:
+                        provider = in_flight[task]
+                        if hedged:
+                            router._hedge_won(request_id, provider)
+                        return reply, provider, hedged
+                if not pending and not fallback_started:
+                    start_fallback()
+                    pending = {task for task in in_flight if not task.done()}
+        finally:
+            for task in in_flight:
+                task.cancel()
+            router._release_hedge_slot_when_done(list(in_flight))
+
+        return None, None, hedged
+
+    async def _stream_from_provider(
+        self, message: str, system_prompt: str, request_id: str
+    ) -> AsyncIterator[tuple[str, str]]:
+        router = self.router
+        full_message = f"{system_prompt}\n\nUser: {message}"
+
+        for provider, client, model in self._provider_chain():
+            if not router.breakers[provider].allow_request():
+                router._log_circuit_open(request_id, provider, model)
+                continue
+            router._call_started(provider, model, request_id, stream=True)
+            streamed = False
+            try:
+                async for delta in client.chat_stream(full_message, model=model):
+                    if not streamed:
+                        streamed = True
+                        router._first_token(provider, model, request_id)
+                    yield provider, delta
+            except StreamTruncatedError:
+                router._stream_truncated(provider, model, request_id)
+                raise
+            if router._stream_finished(provider, model, request_id, streamed):
+                return
+
+
+def build_router(settings: config.Settings = config.DEFAULT_SETTINGS) -> LLMRouter:
+    """Build a router wired to the Ollama endpoints and models in ``settings``."""
+    return LLMRouter(
+        intent_client=_build_client(settings.ollama_intent_url, settings),
+        primary_client=_build_client(settings.ollama_primary_url, settings),
+        fallback_client=_build_client(settings.ollama_fallback_url, settings),
+        intent_model=settings.intent_model,
+        primary_model=settings.primary_model,
+        fallback_model=settings.fallback_model,
+        breaker_failure_threshold=settings.breaker_failure_threshold,
+        breaker_reset_timeout=settings.breaker_reset_seconds,
+        hedge_enabled=settings.hedge_enabled,
+        hedge_after_seconds=settings.hedge_after_seconds,
+        hedge_max_concurrency=settings.hedge_max_concurrency,
+        response_cache=_build_response_cache(settings),
+        semantic_cache=_build_semantic_cache(settings),
+        embedding_model=settings.semantic_cache_embedding_model,
+        memory=(
+            conversation_memory.build_memory_store(settings)
+            if settings.memory_top_k > 0 or settings.summarize_after_tokens > 0
+            else None
+        ),
+        memory_top_k=settings.memory_top_k,
+        memory_token_budget=settings.memory_token_budget,
+        summarize_after_tokens=settings.summarize_after_tokens,
+        summary_keep_turns=settings.summary_keep_turns,
+        prompt_builder=prompt.PromptBuilder(
+            context_tokens=settings.model_context_tokens,
+            default_context_tokens=settings.context_tokens,
+            reply_tokens=settings.reply_tokens,
+        ),
+        pending_messages=pending.PendingQueue(
+            path=Path(settings.pending_queue_path),
+            max_per_recipient=settings.pending_max_per_recipient,
+            max_age_seconds=settings.pending_max_age_seconds,
+            result_ttl_seconds=settings.pending_max_age_seconds,
+        ),
+    )
+
+
+def _build_client(endpoint: str, settings: config.Settings) -> OllamaClient:
+    return OllamaClient(
+        endpoint,
+        timeout=settings.ollama_timeout_seconds,
+        keep_alive=settings.model_keep_alive,
+        timeouts=health.AdaptiveTimeout(
+            default=settings.ollama_timeout_seconds,
+            percentile=settings.timeout_percentile,
+            margin=settings.timeout_margin,
+            floor=settings.timeout_floor_seconds,
+            ceiling=settings.timeout_ceiling_seconds,
+        ),
+    )
+
+
+def _build_response_cache(settings: config.Settings) -> cache.ResponseCache | None:
+    if settings.response_cache_max_bytes <= 0:
+        return None
+    return cache.ResponseCache(
+        max_bytes=settings.response_cache_max_bytes,
+        ttl_seconds=settings.response_cache_ttl_seconds,
+        path=Path(settings.response_cache_path) if settings.response_cache_path else None,
+    )
+
+
+def _build_semantic_cache(settings: config.Settings) -> semantic.SemanticCache | None:
+    if not settings.semantic_cache_enabled:
+        return None
+    if not semantic.is_available():
+        logging.getLogger("cody.llm").warning(
+            "llm.semantic_cache.disabled reason=numpy_not_installed"
+        )
+        return None
+    return semantic.SemanticCache(
+        capacity=settings.semantic_cache_capacity,
+        threshold=settings.semantic_cache_threshold,
+        ttl_seconds=settings.response_cache_ttl_seconds,
+        path=Path(settings.semantic_cache_path) if settings.semantic_cache_path else None,
+    )
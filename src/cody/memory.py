@@ -1,35 +1,749 @@
 """Memory storage for short-term and long-term conversation context."""
 
+from collections import OrderedDict
+from collections.abc import Iterator, Sequence
 from dataclasses import dataclass, field
+import itertools
 import json
+import logging
+import os
 from pathlib import Path
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import overload
+
+from . import config
+
+# Rough bookkeeping cost of a Turn object plus its ring slot, and of one conversation
+# (ring, dict entry, id), so many tiny entries still count against the budget.
+_TURN_OVERHEAD_BYTES = 64
+_CONVERSATION_OVERHEAD_BYTES = 256
+
+# Words too common to help ranking; dropping them keeps BM25 queries from matching every row.
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i in is it me my of on or so "
+    "that the this to was what when where which who why will with you your".split()
+)
+_MAX_QUERY_TERMS = 32
+
+
+def search_terms(text: str) -> list[str]:
+    """Distinct lower-cased words of ``text`` worth searching for, in order of appearance.
+
+    Words are split as the FTS ``unicode61`` tokenizer splits them, so on ``_`` too:
+    ``parse_config`` is searched as ``parse`` and ``config``.
+    """
+    words = re.findall(r"[^\W_]+", text.lower())
+    terms = dict.fromkeys(word for word in words if word not in _STOPWORDS)
+    return list(terms)[:_MAX_QUERY_TERMS]
+
+
+class Turn:
+    """One short-term memory entry. ``__slots__`` keeps it at two references, no dict."""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str) -> None:
+        self.role = sys.intern(role)  # a handful of distinct roles, shared by every turn
+        self.content = content
+
+    def as_dict(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Turn):
+            return NotImplemented
+        return self.role == other.role and self.content == other.content
+
+    def __repr__(self) -> str:
+        return f"Turn(role={self.role!r}, content={self.content!r})"
+
+
+class _Ring:
+    """Fixed-capacity ring buffer of turns; the list grows on demand up to the capacity."""
+
+    __slots__ = ("turns", "start", "size", "appended", "nbytes")
+
+    def __init__(self) -> None:
+        self.turns: list[Turn | None] = []
+        self.start = 0
+        self.size = 0
+        self.appended = 0  # turns ever appended; appended - size is the oldest live turn's position
+        self.nbytes = _CONVERSATION_OVERHEAD_BYTES
+
+    def append(self, turn: Turn, capacity: int) -> Turn | None:
+        """Add ``turn``; returns the oldest turn if it had to be overwritten."""
+        self.appended += 1
+        if self.size < len(self.turns):
+            self.turns[(self.start + self.size) % len(self.turns)] = turn
+            self.size += 1
+            return None
+        if len(self.turns) < capacity:
+            if self.start:
+                self.turns = self.turns[self.start :] + self.turns[: self.start]
+                self.start = 0
+            self.turns.append(turn)
+            self.size += 1
+            return None
+        evicted = self.turns[self.start]
+        self.turns[self.start] = turn
+        self.start = (self.start + 1) % len(self.turns)
+        return evicted
+
+    def pop_oldest(self) -> Turn:
+        turn = self._live(self.start)
+        self.turns[self.start] = None
+        self.start = (self.start + 1) % len(self.turns)
+        self.size -= 1
+        return turn
+
+    def at(self, position: int) -> Turn:
+        """Turn at absolute ``position`` (as counted by ``appended``); must still be live."""
+        return self._live((self.start + position - (self.appended - self.size)) % len(self.turns))
+
+    def _live(self, index: int) -> Turn:
+        turn = self.turns[index]
+        if turn is None:
+            raise RuntimeError("short-term ring slot is empty")
+        return turn
+
+
+class HistoryView(Sequence):
+    """Read-only view of a conversation's turns at the time it was taken; nothing is copied.
+
+    Later appends do not show up in the view. If turns the view covers are evicted
+    afterwards, reading them raises RuntimeError, much like iterating a dict that
+    changed size. Iteration checks this once, when it starts. Views are only
+    safe where nothing else appends meanwhile, so the thread-safe
+    ``StripedShortTermMemory`` hands out copies instead.
+    """
+
+    __slots__ = ("_ring", "_first", "_len")
+
+    def __init__(self, ring: _Ring | None) -> None:
+        self._ring = ring
+        self._len = ring.size if ring is not None else 0
+        self._first = ring.appended - ring.size if ring is not None else 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    @overload
+    def __getitem__(self, index: int) -> Turn: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Turn]: ...
+
+    def __getitem__(self, index: int | slice) -> Turn | list[Turn]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._len))]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("history index out of range")
+        position = self._first + index
+        if self._ring is None or position < self._ring.appended - self._ring.size:
+            raise RuntimeError("short-term history was evicted while a view was held")
+        return self._ring.at(position)
+
+    def __iter__(self) -> Iterator[Turn]:
+        ring = self._ring
+        if ring is None or not self._len:
+            return iter(())
+        if self._first < ring.appended - ring.size:
+            raise RuntimeError("short-term history was evicted while a view was held")
+        # Walk the ring's list in place (at most two slices), without a per-turn Python call.
+        # Live slots are never None; filter(None, ...) only narrows the type, in C.
+        length = len(ring.turns)
+        first = (ring.start + self._first - (ring.appended - ring.size)) % length
+        end = first + self._len
+        if end <= length:
+            return filter(None, itertools.islice(ring.turns, first, end))
+        return filter(
+            None,
+            itertools.chain(
+                itertools.islice(ring.turns, first, None),
+                itertools.islice(ring.turns, end - length),
+            ),
+        )
+
+    def as_dicts(self) -> list[dict]:
+        """``[{"role", "content"}, ...]`` for callers that need plain data (Ollama messages)."""
+        return [turn.as_dict() for turn in self]
+
+
+@dataclass
+class ShortTermMemory:
+    """Per-conversation ring buffers of at most ``max_turns`` turns under one byte budget.
+
+    When the total passes ``max_bytes``, the least recently used conversations are
+    evicted whole; a single conversation larger than the budget loses its oldest turns.
+    Not thread-safe on its own; ``StripedShortTermMemory`` adds the locking.
+    """
+
+    max_turns: int = 50
+    max_bytes: int = 64 * 1024 * 1024
+
+    def __post_init__(self) -> None:
+        # conversation id -> ring; insertion order is LRU order.
+        self._conversations: OrderedDict[str, _Ring] = OrderedDict()
+        self._bytes = 0
+        self._stats = {"appends": 0, "evicted_turns": 0, "evicted_conversations": 0}
+
+    def append(self, conversation_id: str, role: str, content: str) -> None:
+        ring = self._conversations.get(conversation_id)
+        if ring is None:
+            ring = self._conversations[conversation_id] = _Ring()
+            self._bytes += ring.nbytes
+        else:
+            self._conversations.move_to_end(conversation_id)
+        size = _turn_size(content)
+        evicted = ring.append(Turn(role, content), self.max_turns)
+        ring.nbytes += size
+        self._bytes += size
+        if evicted is not None:
+            self._forget(ring, evicted)
+            self._stats["evicted_turns"] += 1
+        self._stats["appends"] += 1
+        self._enforce_budget(ring)
+
+    def view(self, conversation_id: str) -> HistoryView:
+        ring = self._conversations.get(conversation_id)
+        if ring is not None:
+            self._conversations.move_to_end(conversation_id)
+        return HistoryView(ring)
+
+    def trim(self, conversation_id: str, keep: int) -> list[Turn]:
+        """Drop all but the newest ``keep`` turns of a conversation and return the dropped ones."""
+        ring = self._conversations.get(conversation_id)
+        dropped: list[Turn] = []
+        while ring is not None and ring.size > max(keep, 0):
+            turn = ring.pop_oldest()
+            self._forget(ring, turn)
+            dropped.append(turn)
+        return dropped
+
+    def discard(self, conversation_id: str) -> None:
+        ring = self._conversations.pop(conversation_id, None)
+        if ring is not None:
+            self._bytes -= ring.nbytes
+
+    def __contains__(self, conversation_id: object) -> bool:
+        return conversation_id in self._conversations
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "conversations": len(self._conversations),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _forget(self, ring: _Ring, turn: Turn) -> None:
+        size = _turn_size(turn.content)
+        ring.nbytes -= size
+        self._bytes -= size
+
+    def _enforce_budget(self, current: _Ring) -> None:
+        while self._bytes > self.max_bytes and len(self._conversations) > 1:
+            oldest_id = next(iter(self._conversations))
+            if self._conversations[oldest_id] is current:
+                break
+            self.discard(oldest_id)
+            self._stats["evicted_conversations"] += 1
+        while self._bytes > self.max_bytes and current.size > 1:
+            self._forget(current, current.pop_oldest())
+            self._stats["evicted_turns"] += 1
+
+
+def _turn_size(content: str) -> int:
+    return sys.getsizeof(content) + _TURN_OVERHEAD_BYTES
+
+
+@dataclass
+class StripedShortTermMemory:
+    """Thread-safe short-term memory: ``stripes`` independently locked ``ShortTermMemory`` shards.
+
+    A conversation always hashes to the same stripe, so handlers working on
+    different conversations rarely wait for each other and no lock covers the
+    whole store. Each stripe gets ``max_bytes / stripes`` and its own LRU order,
+    so eviction picks the least recently used conversation of the full stripe
+    rather than of the whole store.
+    """
+
+    max_turns: int = 50
+    max_bytes: int = 64 * 1024 * 1024
+    stripes: int = 16
+
+    def __post_init__(self) -> None:
+        count = max(self.stripes, 1)
+        self._stripes = [
+            (threading.Lock(), ShortTermMemory(self.max_turns, max(self.max_bytes // count, 1)))
+            for _ in range(count)
+        ]
+
+    def append(self, conversation_id: str, role: str, content: str) -> None:
+        lock, memory = self._stripe(conversation_id)
+        with lock:
+            memory.append(conversation_id, role, content)
+
+    def turns(self, conversation_id: str) -> list[Turn]:
+        """A copy of a conversation's turns, oldest first, safe to use without the lock.
+
+        There is deliberately no ``view``: a ``HistoryView`` reads the ring on every
+        access, which would race with appends made under the stripe lock.
+        """
+        lock, memory = self._stripe(conversation_id)
+        with lock:
+            return list(memory.view(conversation_id))
+
+    def trim(self, conversation_id: str, keep: int) -> list[Turn]:
+        lock, memory = self._stripe(conversation_id)
+        with lock:
+            return memory.trim(conversation_id, keep)
+
+    def drop(self, conversation_id: str, turns: list[Turn]) -> int:
+        """Drop those of ``turns`` still buffered; they are always the oldest. Returns how many."""
+        dropping = {id(turn) for turn in turns}
+        lock, memory = self._stripe(conversation_id)
+        with lock:
+            view = memory.view(conversation_id)
+            present = sum(1 for turn in view if id(turn) in dropping)
+            return len(memory.trim(conversation_id, len(view) - present))
+
+    def discard(self, conversation_id: str) -> None:
+        lock, memory = self._stripe(conversation_id)
+        with lock:
+            memory.discard(conversation_id)
+
+    def __contains__(self, conversation_id: object) -> bool:
+        lock, memory = self._stripe(conversation_id)
+        with lock:
+            return conversation_id in memory
+
+    def __len__(self) -> int:
+        return sum(len(memory) for _, memory in self._stripes)
+
+    def stats(self) -> dict:
+        totals: dict[str, int] = {}
+        for lock, memory in self._stripes:
+            with lock:
+                stripe = memory.stats()
+            for key in (
+                "appends",
+                "evicted_turns",
+                "evicted_conversations",
+                "conversations",
+                "bytes",
+            ):
+                totals[key] = totals.get(key, 0) + stripe[key]
+        return {**totals, "max_bytes": self.max_bytes, "stripes": len(self._stripes)}
+
+    def _stripe(self, conversation_id: object) -> tuple[threading.Lock, ShortTermMemory]:
+        return self._stripes[hash(conversation_id) % len(self._stripes)]
+
+
+@dataclass
+class LongTermMemory:
+    """Append-only SQLite (WAL) log of summaries, indexed by topic and conversation.
+
+    Each save is one INSERT in its own transaction, so a write costs the same no
+    matter how many summaries exist and a crash never leaves a half-written file.
+    Lookups go through indexes. The database is opened on first use. When
+    ``legacy_path`` points at the old single-summary JSON file, its summary is
+    imported once. ``compact`` keeps the newest ``keep_versions`` summaries per
+    (topic, conversation) key and checkpoints the WAL. It only revisits keys written
+    since the last pass, and ``start_compactor`` runs it on a background thread.
+
+    ``search`` ranks summaries with BM25 over ``topic`` and ``summary`` using an
+    SQLite FTS5 inverted index stored in the same file. Triggers keep the index in
+    step with every insert and compaction delete, in the same transaction. When
+    SQLite lacks FTS5, ``search`` returns nothing.
+    """
+
+    path: Path
+    legacy_path: Path | None = None
+    keep_versions: int = 5
+    search_candidates: int = 2_000  # most summaries a search ranks; see ``search``
+    logger: logging.Logger = field(default_factory=lambda: logging.getLogger("cody.memory"))
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self._pid = 0
+        self._dirty: set[tuple[str, str]] = set()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._search_enabled = False
+        self._stats = {"saves": 0, "compactions": 0, "compacted": 0, "searches": 0}
+
+    def save(self, summary: dict) -> int:
+        """Append ``summary`` and return its id."""
+        return self.save_many([summary])[0]
+
+    def save_many(self, summaries: list[dict]) -> list[int]:
+        """Append several summaries in one transaction and return their ids."""
+        now = time.time()
+        ids = []
+        with self._lock:
+            db = self._connect()
+            with db:
+                for summary in summaries:
+                    topic = summary["topic"]
+                    conversation_id = str(summary.get("conversation_id") or "")
+                    cursor = db.execute(
+                        "INSERT INTO summaries "
+                        "(topic, conversation_id, summary, payload, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (topic, conversation_id, summary["summary"], json.dumps(summary), now),
+                    )
+                    if cursor.lastrowid is None:  # only unset when no row was inserted
+                        raise sqlite3.IntegrityError("summary was not stored")
+                    ids.append(cursor.lastrowid)
+                    self._dirty.add((topic, conversation_id))
+            self._stats["saves"] += len(ids)
+        return ids
+
+    def search(
+        self, query: str, k: int = 5, exclude_topics: Sequence[str] = ()
+    ) -> list[tuple[dict, float]]:
+        """Top ``k`` summaries for ``query`` by BM25 (topic words count double), best first.
+
+        Summaries whose topic is in ``exclude_topics`` are never returned.
+
+        Scoring every summary that shares a common word with the query would cost
+        time proportional to that word's frequency. So, max-score style, the query
+        keeps its rarest terms up to ``search_candidates`` matching summaries and
+        drops the commonest ones, whose BM25 weight is lowest anyway. This keeps
+        lookups in the low milliseconds at millions of summaries.
+        """
+        terms = search_terms(query)
+        if not terms or k <= 0:
+            return []
+        with self._lock:
+            db = self._connect()
+            if not self._search_enabled:
+                return []
+            # One lookup per term: fts5vocab only uses its index for ``term = ?``, not ``IN``.
+            frequencies = [
+                row
+                for term in terms
+                for row in db.execute(
+                    "SELECT term, doc FROM summaries_terms WHERE term = ?", (term,)
+                )
+            ]
+            selected: list[str] = []
+            candidates = 0
+            for term, doc_count in sorted(frequencies, key=lambda row: row[1]):
+                if selected and candidates + doc_count > self.search_candidates:
+                    break
+                selected.append(f'"{term}"')
+                candidates += doc_count
+            rows = (
+                self._bm25(db, " OR ".join(selected), k, tuple(exclude_topics)) if selected else []
+            )
+            self._stats["searches"] += 1
+        return [(json.loads(payload), score) for _, payload, score in rows]
+
+    @staticmethod
+    def _bm25(
+        db: sqlite3.Connection, match: str, k: int, exclude_topics: tuple[str, ...] = ()
+    ) -> list[tuple[int, str, float]]:
+        # bm25() is lower-is-better; report it negated so higher scores are better.
+        excluded = (
+            f" AND s.topic NOT IN ({', '.join('?' * len(exclude_topics))})"
+            if exclude_topics
+            else ""
+        )
+        return db.execute(
+            "SELECT s.id, s.payload, -bm25(summaries_fts, 2.0, 1.0) AS score "
+            "FROM summaries_fts JOIN summaries s ON s.id = summaries_fts.rowid "
+            f"WHERE summaries_fts MATCH ?{excluded} ORDER BY bm25(summaries_fts, 2.0, 1.0) LIMIT ?",
+            (match, *exclude_topics, k),
+        ).fetchall()
+
+    def latest(self, topic: str | None = None, conversation_id: str | None = None) -> dict:
+        """Newest summary matching the filters, or ``{}``."""
+        found = self.recent(topic=topic, conversation_id=conversation_id, limit=1)
+        return found[0] if found else {}
+
+    def recent(
+        self, topic: str | None = None, conversation_id: str | None = None, limit: int = 20
+    ) -> list[dict]:
+        """Newest-first summaries, optionally filtered by topic and/or conversation."""
+        clauses, params = [], []
+        if topic is not None:
+            clauses.append("topic = ?")
+            params.append(topic)
+        if conversation_id is not None:
+            clauses.append("conversation_id = ?")
+            params.append(conversation_id)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT payload FROM summaries {where}ORDER BY id DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def get(self, summary_ids: list[int]) -> dict[int, dict]:
+        """Summaries by id; ids that no longer exist are left out."""
+        if not summary_ids:
+            return {}
+        placeholders = ",".join("?" * len(summary_ids))
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT id, payload FROM summaries WHERE id IN ({placeholders})", list(summary_ids)
+            ).fetchall()
+        return {summary_id: json.loads(payload) for summary_id, payload in rows}
+
+    def __len__(self) -> int:
+        with self._lock:
+            count: int = self._connect().execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        return count
+
+    def compact(self) -> list[int]:
+        """Drop superseded versions of recently written keys; returns the deleted ids."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            if not dirty:
+                return []
+            db = self._connect()
+            deleted: list[int] = []
+            with db:
+                for topic, conversation_id in dirty:
+                    rows = db.execute(
+                        "SELECT id FROM summaries WHERE topic = ? AND conversation_id = ? "
+                        "ORDER BY id DESC LIMIT -1 OFFSET ?",
+                        (topic, conversation_id, self.keep_versions),
+                    ).fetchall()
+                    deleted.extend(row_id for (row_id,) in rows)
+                db.executemany(
+                    "DELETE FROM summaries WHERE id = ?", [(row_id,) for row_id in deleted]
+                )
+            db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._stats["compactions"] += 1
+            self._stats["compacted"] += len(deleted)
+        if deleted:
+            self.logger.info("memory.compact keys=%s deleted=%s", len(dirty), len(deleted))
+        return deleted
+
+    def start_compactor(self, interval: float = 300.0) -> None:
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run_compactor, args=(interval,), name="cody-memory-compactor", daemon=True
+        )
+        self._thread.start()
+
+    def stop_compactor(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {**self._stats, "pending_keys": len(self._dirty), "search": self._search_enabled}
+
+    def close(self) -> None:
+        self.stop_compactor()
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _run_compactor(self, interval: float) -> None:
+        while not self._stopped.wait(interval):
+            try:
+                self.compact()
+            except sqlite3.Error as exc:  # try again next interval
+                self.logger.warning("memory.compact.failed error=%s", exc)
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection inherited across fork() must not be used; each worker opens its own.
+        if self._db is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, "
+                "conversation_id TEXT NOT NULL, summary TEXT NOT NULL, payload TEXT NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS summaries_topic "
+                "ON summaries (topic, conversation_id, id)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS summaries_conversation "
+                "ON summaries (conversation_id, id)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._pid = os.getpid()
+            self._search_enabled = self._create_search_index(self._db)
+            self._import_legacy(self._db)
+        return self._db
+
+    def _create_search_index(self, db: sqlite3.Connection) -> bool:
+        try:
+            with db:
+                db.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5("
+                    "topic, summary, content='summaries', content_rowid='id', "
+                    "tokenize='unicode61 remove_diacritics 0')"
+                )
+                # Per-term document counts, so searches can skip their commonest words.
+                db.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS summaries_terms "
+                    "USING fts5vocab(summaries_fts, 'row')"
+                )
+                db.execute(
+                    "CREATE TRIGGER IF NOT EXISTS summaries_fts_insert "
+                    "AFTER INSERT ON summaries BEGIN "
+                    "INSERT INTO summaries_fts (rowid, topic, summary) "
+                    "VALUES (new.id, new.topic, new.summary); END"
+                )
+                db.execute(
+                    "CREATE TRIGGER IF NOT EXISTS summaries_fts_delete "
+                    "AFTER DELETE ON summaries BEGIN "
+                    "INSERT INTO summaries_fts (summaries_fts, rowid, topic, summary) "
+                    "VALUES ('delete', old.id, old.topic, old.summary); END"
+                )
+                if not db.execute("SELECT 1 FROM meta WHERE key = 'search_index'").fetchone():
+                    # Index summaries written before the search index existed.
+                    db.execute("INSERT INTO summaries_fts (summaries_fts) VALUES ('rebuild')")
+                    db.execute("INSERT INTO meta (key, value) VALUES ('search_index', 'fts5')")
+        except sqlite3.OperationalError as exc:  # SQLite built without FTS5
+            self.logger.warning("memory.search.disabled error=%s", exc)
+            return False
+        return True
+
+    def _import_legacy(self, db: sqlite3.Connection) -> None:
+        if self.legacy_path is None or not self.legacy_path.exists():
+            return
+        if db.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return
+        try:
+            summary = json.loads(self.legacy_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            self.logger.warning(
+                "memory.legacy_import.failed path=%s error=%s", self.legacy_path, exc
+            )
+            return
+        with db:
+            if MemoryStore.is_valid_summary(summary):
+                db.execute(
+                    "INSERT INTO summaries (topic, conversation_id, summary, payload, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        summary["topic"],
+                        str(summary.get("conversation_id") or ""),
+                        summary["summary"],
+                        json.dumps(summary),
+                        self.legacy_path.stat().st_mtime,
+                    ),
+                )
+            db.execute(
+                "INSERT INTO meta (key, value) VALUES ('legacy_imported', ?)",
+                (str(self.legacy_path),),
+            )
+        self.logger.info("memory.legacy_import path=%s", self.legacy_path)
 
 
 @dataclass
 class MemoryStore:
+    """Short-term ring buffers plus the long-term summary log.
+
+    ``long_term_path`` is the SQLite file. A ``.json`` path (the old single-summary
+    format) is still accepted. The database then lives next to it with a
+    ``.sqlite`` suffix, and the JSON summary is imported on first use.
+
+    Short-term buffers are a ``StripedShortTermMemory``, so request handler threads
+    and the background summarizer can share them safely.
+    """
+
     long_term_path: Path
-    short_term: dict[str, list[dict]] = field(default_factory=dict)
+    short_term: StripedShortTermMemory = field(default_factory=StripedShortTermMemory)
+    keep_versions: int = 5
+
+    def __post_init__(self) -> None:
+        path = Path(self.long_term_path)
+        legacy = path if path.suffix == ".json" else path.with_suffix(".json")
+        self.long_term = LongTermMemory(
+            path=path.with_suffix(".sqlite") if path.suffix == ".json" else path,
+            legacy_path=legacy,
+            keep_versions=self.keep_versions,
+        )
 
     def append_short_term(self, conversation_id: str, role: str, content: str) -> None:
-        history = self.short_term.setdefault(conversation_id, [])
-        history.append({"role": role, "content": content})
+        self.short_term.append(conversation_id, role, content)
 
     def get_short_term(self, conversation_id: str) -> list[dict]:
-        return list(self.short_term.get(conversation_id, []))
+        """A conversation's turns as ``{"role", "content"}`` dicts, oldest first."""
+        return [turn.as_dict() for turn in self.short_term.turns(conversation_id)]
+
+    def get_short_term_turns(self, conversation_id: str) -> list[Turn]:
+        """A conversation's ``Turn`` objects, oldest first, copied under its stripe lock.
+
+        Unlike ``get_short_term`` nothing is converted, and the list can be handed
+        back to ``drop_short_term``.
+        """
+        return self.short_term.turns(conversation_id)
+
+    def drop_short_term(self, conversation_id: str, turns: list[Turn]) -> int:
+        return self.short_term.drop(conversation_id, turns)
 
-    def save_long_term_summary(self, summary: dict) -> None:
+    def save_long_term_summary(self, summary: dict) -> int:
+        """Save a summary (``topic``, ``summary``, optional ``conversation_id``); returns its id."""
         if not self.is_valid_summary(summary):
             raise ValueError("summary must include non-empty 'topic' and 'summary' fields")
-        self.long_term_path.parent.mkdir(parents=True, exist_ok=True)
-        self.long_term_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        return self.long_term.save(summary)
 
-    def load_long_term_summary(self) -> dict:
-        if not self.long_term_path.exists():
-            return {}
-        return json.loads(self.long_term_path.read_text(encoding="utf-8"))
+    def load_long_term_summary(
+        self, topic: str | None = None, conversation_id: str | None = None
+    ) -> dict:
+        """Newest summary, optionally for one topic and/or conversation; ``{}`` if none."""
+        return self.long_term.latest(topic=topic, conversation_id=conversation_id)
+
+    def list_long_term_summaries(
+        self, topic: str | None = None, conversation_id: str | None = None, limit: int = 20
+    ) -> list[dict]:
+        return self.long_term.recent(topic=topic, conversation_id=conversation_id, limit=limit)
+
+    def search_long_term(
+        self, query: str, k: int = 5, exclude_topics: Sequence[str] = ()
+    ) -> list[tuple[dict, float]]:
+        """Top ``k`` long-term summaries for ``query`` by BM25, skipping ``exclude_topics``."""
+        return self.long_term.search(query, k, exclude_topics)
+
+    def stats(self) -> dict:
+        return {"short_term": self.short_term.stats(), "long_term": self.long_term.stats()}
 
     @staticmethod
     def is_valid_summary(summary: dict) -> bool:
         topic = summary.get("topic") if isinstance(summary, dict) else None
         content = summary.get("summary") if isinstance(summary, dict) else None
         return isinstance(topic, str) and bool(topic.strip()) and isinstance(content, str) and bool(content.strip())
+
+
+def build_memory_store(settings: config.Settings = config.DEFAULT_SETTINGS) -> MemoryStore:
+    """Build a store using the memory paths and short-term limits in ``settings``."""
+    return MemoryStore(
+        long_term_path=Path(settings.long_term_memory_path),
+        short_term=StripedShortTermMemory(
+            max_turns=settings.short_term_max_turns,
+            max_bytes=settings.short_term_max_bytes,
+            stripes=settings.short_term_stripes,
+        ),
+        keep_versions=settings.long_term_keep_versions,
+    )
@@ -0,0 +1,245 @@
+"""Durable per-recipient queue of chat messages saved while no provider answered."""
+
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+_CREATE_MESSAGES = (
+    "CREATE TABLE IF NOT EXISTS pending_messages ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, request_id TEXT NOT NULL, "
+    "recipient TEXT NOT NULL, message TEXT NOT NULL, created_at REAL NOT NULL, "
+    "attempts INTEGER NOT NULL DEFAULT 0, claimed_until REAL NOT NULL DEFAULT 0, "
+    "result_token TEXT NOT NULL DEFAULT '')"
+)
+_CREATE_RESULTS = (
+    "CREATE TABLE IF NOT EXISTS pending_results ("
+    "result_token TEXT PRIMARY KEY, request_id TEXT NOT NULL, recipient TEXT NOT NULL, "
+    "reply TEXT NOT NULL, provider TEXT NOT NULL, completed_at REAL NOT NULL)"
+)
+
+
+def new_result_token() -> str:
+    """An unguessable token that, with the request id, is needed to fetch a replayed reply."""
+    return secrets.token_urlsafe(16)
+
+
+@dataclass(frozen=True)
+class PendingMessage:
+    id: int
+    request_id: str
+    recipient: str
+    message: str
+    attempts: int
+    result_token: str = ""
+
+
+@dataclass
+class PendingQueue:
+    """Append-only SQLite (WAL) queue of stubbed chat messages, partitioned by recipient.
+
+    A message is appended under its ``request_id`` when every provider fails. Each
+    recipient keeps at most ``max_per_recipient`` messages (the oldest are dropped
+    first), and messages older than ``max_age_seconds`` expire unanswered. The
+    replay worker ``claim``s messages oldest first, one per recipient per round so
+    a busy recipient cannot starve the others. A claim is a lease, which keeps
+    several worker processes from answering the same message. ``complete`` stores
+    the reply in the same transaction that removes the message, and clients fetch
+    it with ``result`` for ``result_ttl_seconds``.
+
+    Request ids come from clients, so two clients may pick the same one. Each
+    message is therefore also given a server-issued ``result_token``, returned in
+    the stub reply; results are stored under it and ``result`` needs both.
+
+    Without a ``path`` the queue lives in an in-memory database and is lost on exit.
+    """
+
+    path: Path | None = None
+    max_per_recipient: int = 100
+    max_age_seconds: float = 24 * 3600.0
+    result_ttl_seconds: float = 24 * 3600.0
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self._pid = 0
+        self._stats = {"queued": 0, "dropped": 0, "expired": 0, "replayed": 0}
+
+    def append(self, message: str, request_id: str, recipient: str, result_token: str = "") -> int:
+        """Queue ``message``; returns how many messages ``recipient`` now has queued.
+
+        Without a ``result_token`` the reply is replayed but cannot be fetched.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute(
+                    "INSERT INTO pending_messages "
+                    "(request_id, recipient, message, created_at, result_token) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (request_id, recipient, message, now, result_token),
+                )
+                # Beyond the cap, the recipient's oldest messages go first.
+                dropped = db.execute(
+                    "DELETE FROM pending_messages WHERE recipient = ? AND id NOT IN "
+                    "(SELECT id FROM pending_messages WHERE recipient = ? "
+                    "ORDER BY id DESC LIMIT ?)",
+                    (recipient, recipient, self.max_per_recipient),
+                ).rowcount
+                count: int = db.execute(
+                    "SELECT COUNT(*) FROM pending_messages WHERE recipient = ?", (recipient,)
+                ).fetchone()[0]
+            self._stats["queued"] += 1
+            self._stats["dropped"] += dropped
+        return count
+
+    def claim(self, limit: int = 8, lease_seconds: float = 60.0) -> list[PendingMessage]:
+        """Lease up to ``limit`` unclaimed messages, the oldest of each recipient first."""
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute("BEGIN IMMEDIATE")  # one claimer at a time across processes
+                self._expire(db, now)
+                rows = db.execute(
+                    "SELECT id, request_id, recipient, message, attempts, result_token "
+                    "FROM pending_messages WHERE id IN ("
+                    "SELECT MIN(id) FROM pending_messages WHERE claimed_until < ? "
+                    "GROUP BY recipient) ORDER BY id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                db.executemany(
+                    "UPDATE pending_messages SET claimed_until = ? WHERE id = ?",
+                    [(now + lease_seconds, row[0]) for row in rows],
+                )
+        return [PendingMessage(*row) for row in rows]
+
+    def complete(self, entry: PendingMessage, reply: str, provider: str) -> None:
+        """Store the reply under ``entry``'s result token and remove the message."""
+        with self._lock:
+            db = self._connect()
+            with db:
+                if entry.result_token:
+                    db.execute(
+                        "INSERT OR REPLACE INTO pending_results "
+                        "(result_token, request_id, recipient, reply, provider, completed_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            entry.result_token,
+                            entry.request_id,
+                            entry.recipient,
+                            reply,
+                            provider,
+                            time.time(),
+                        ),
+                    )
+                db.execute("DELETE FROM pending_messages WHERE id = ?", (entry.id,))
+            self._stats["replayed"] += 1
+
+    def release(self, entry: PendingMessage) -> None:
+        """Give a claimed message back, so the next round retries it."""
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute(
+                    "UPDATE pending_messages SET claimed_until = 0, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    (entry.id,),
+                )
+
+    def result(self, request_id: str, result_token: str) -> dict:
+        """Status of a queued request: ``done`` (with ``reply`` and ``provider``), ``queued``
+        or ``unknown``. A wrong token reads as ``unknown``, so other clients' request ids
+        are not revealed.
+        """
+        if not result_token:
+            return {"status": "unknown"}
+        with self._lock:
+            db = self._connect()
+            row = db.execute(
+                "SELECT reply, provider, completed_at FROM pending_results "
+                "WHERE result_token = ? AND request_id = ? AND completed_at >= ?",
+                (result_token, request_id, time.time() - self.result_ttl_seconds),
+            ).fetchone()
+            if row is not None:
+                return {
+                    "status": "done",
+                    "reply": row[0],
+                    "provider": row[1],
+                    "completed_at": row[2],
+                }
+            queued = db.execute(
+                "SELECT 1 FROM pending_messages "
+                "WHERE result_token = ? AND request_id = ? AND created_at >= ?",
+                (result_token, request_id, time.time() - self.max_age_seconds),
+            ).fetchone()
+        return {"status": "queued"} if queued else {"status": "unknown"}
+
+    def messages(self, recipient: str) -> list[str]:
+        """Messages queued for ``recipient``, oldest first."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT message FROM pending_messages WHERE recipient = ? ORDER BY id", (recipient,)
+            ).fetchall()
+        return [message for (message,) in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            db = self._connect()
+            count: int = db.execute("SELECT COUNT(*) FROM pending_messages").fetchone()[0]
+        return count
+
+    def stats(self) -> dict:
+        if self.path is not None and self._db is None and not self.path.exists():
+            return {**self._stats, "pending": 0, "recipients": 0, "durable": True}
+        with self._lock:
+            db = self._connect()
+            (queued,) = db.execute("SELECT COUNT(*) FROM pending_messages").fetchone()
+            (recipients,) = db.execute(
+                "SELECT COUNT(DISTINCT recipient) FROM pending_messages"
+            ).fetchone()
+            return {
+                **self._stats,
+                "pending": queued,
+                "recipients": recipients,
+                "durable": self.path is not None,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _expire(self, db: sqlite3.Connection, now: float) -> None:
+        expired = db.execute(
+            "DELETE FROM pending_messages WHERE created_at < ?", (now - self.max_age_seconds,)
+        ).rowcount
+        db.execute(
+            "DELETE FROM pending_results WHERE completed_at < ?", (now - self.result_ttl_seconds,)
+        )
+        self._stats["expired"] += expired
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection inherited across fork() must not be used; each worker opens its own.
+        if self._db is not None and (self.path is None or self._pid == os.getpid()):
+            return self._db
+        if self.path is None:
+            db = sqlite3.connect(":memory:", check_same_thread=False)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=10.0)
+            db.execute("PRAGMA journal_mode=WAL")
+        db.execute(_CREATE_MESSAGES)
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS pending_recipient ON pending_messages (recipient, id)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS pending_token ON pending_messages (result_token)")
+        db.execute(_CREATE_RESULTS)
+        self._db = db
+        self._pid = os.getpid()
+        return db
@@ -0,0 +1,209 @@
+"""Token-budgeted prompt composition for the chat router.
+
+A chat prompt is the system prompt, optional long-term memory notes, the
+conversation history (a running summary, then the turns still in short-term
+memory) and the user's message. ``PromptBuilder`` fits these into the model's
+context window, less ``reply_tokens`` kept free for the answer. The system prompt
+and the message always go in. The history is filled newest turn first, so the
+oldest turns are dropped first, and memory notes take what room is left, best
+ranked first. A message that does not fit on its own loses its beginning.
+
+Token counts are estimates. They are cheap enough to run on every request and
+lean high rather than low, so a prompt that fits the estimate fits the model.
+"""
+
+import functools
+import math
+import string
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+DEFAULT_CONTEXT_TOKENS = 4096  # Ollama's default num_ctx
+TRUNCATED_MARKER = "[earlier text truncated]\n"
+
+_STRIP_PUNCTUATION = str.maketrans("", "", string.punctuation)
+
+
+@dataclass
+class TokenEstimator:
+    """Fast token estimate for one model, memoizing recently seen texts.
+
+    The estimate is the larger of two counts: characters divided by
+    ``chars_per_token``, and whitespace-separated words plus ASCII punctuation
+    marks. The first dominates for prose, the second for code, which tokenizes
+    densely. Both are computed by C string methods, about 80 µs for 10 KB of
+    code, where a regex tokenization takes over a millisecond. History turns
+    and memory notes come back on every request of a conversation, so their counts
+    are kept in a small LRU; texts longer than ``memo_max_chars`` are not kept.
+    """
+
+    chars_per_token: float = 4.0
+    memo_size: int = 1024
+    memo_max_chars: int = 8192
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._memo: OrderedDict[str, int] = OrderedDict()
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if len(text) > self.memo_max_chars:
+            return self._estimate(text)
+        with self._lock:
+            cached = self._memo.get(text)
+            if cached is not None:
+                self._memo.move_to_end(text)
+                return cached
+        tokens = self._estimate(text)
+        with self._lock:
+            self._memo[text] = tokens
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return tokens
+
+    def _estimate(self, text: str) -> int:
+        punctuation = len(text) - len(text.translate(_STRIP_PUNCTUATION))
+        return max(math.ceil(len(text) / self.chars_per_token), len(text.split()) + punctuation)
+
+
+@functools.lru_cache(maxsize=64)
+def estimator_for(model: str) -> TokenEstimator:
+    """The shared estimator for ``model``; code models get a denser ratio."""
+    return TokenEstimator(chars_per_token=3.5 if "coder" in model.lower() else 4.0)
+
+
+def estimate_tokens(text: str, model: str = "") -> int:
+    """Estimated tokens in ``text`` for ``model`` (at least 1)."""
+    return max(1, estimator_for(model).count(text))
+
+
+@dataclass(frozen=True)
+class ComposedPrompt:
+    message: str  # everything after the system prompt
+    tokens: int  # estimate for the system prompt plus ``message``
+    budget: int
+    dropped_turns: int = 0
+    dropped_notes: int = 0
+    truncated: bool = False
+
+
+@dataclass
+class PromptBuilder:
+    """Fits prompts into per-model context budgets and keeps composition stats."""
+
+    context_tokens: dict[str, int] = field(default_factory=dict)  # per model
+    default_context_tokens: int = DEFAULT_CONTEXT_TOKENS
+    reply_tokens: int = 1024
+    window: int = 256
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._recent: deque[int] = deque(maxlen=self.window)
+        self._stats = {"composed": 0, "truncated": 0, "dropped_turns": 0, "dropped_notes": 0}
+
+    def budget(self, model: str) -> int:
+        """Prompt tokens allowed for ``model``: its context less the reply reserve."""
+        context = self.context_tokens.get(model, self.default_context_tokens)
+        return max(1, context - self.reply_tokens)
+
+    def build(
+        self,
+        model: str,
+        system_prompt: str,
+        message: str,
+        history: Sequence[str] = (),
+        notes: Sequence[str] = (),
+    ) -> ComposedPrompt:
+        """Compose the user part of the prompt for ``model``.
+
+        ``history`` lines are oldest first; ``notes`` are best ranked first.
+        """
+        estimator = estimator_for(model)
+        budget = self.budget(model)
+        # Providers send f"{system_prompt}\n\nUser: {message}".
+        fixed = estimator.count(f"{system_prompt}\n\nUser:")
+        used = fixed + estimator.count(message)
+        truncated = used > budget
+        if truncated:
+            message = self._truncate(message, budget - fixed, estimator)
+            used = fixed + estimator.count(message)
+
+        kept_history: list[str] = []
+        if history and not truncated:
+            used += estimator.count("Conversation so far:")
+            for line in reversed(history):
+                tokens = estimator.count(line)
+                if used + tokens > budget:
+                    break  # older lines would leave a gap in the conversation
+                kept_history.append(line)
+                used += tokens
+            kept_history.reverse()
+            if not kept_history:
+                used -= estimator.count("Conversation so far:")
+
+        kept_notes: list[str] = []
+        if notes and not truncated:
+            header = estimator.count("Relevant notes from long-term memory:")
+            for line in notes:
+                tokens = estimator.count(line) + (0 if kept_notes else header)
+                if used + tokens > budget:
+                    continue  # a shorter, lower-ranked note may still fit
+                kept_notes.append(line)
+                used += tokens
+
+        composed = message
+        if kept_history:
+            composed = "Conversation so far:\n" + "\n".join(kept_history) + f"\n\n{composed}"
+        if kept_notes:
+            composed = (
+                "Relevant notes from long-term memory:\n"
+                + "\n".join(kept_notes)
+                + f"\n\n{composed}"
+            )
+        result = ComposedPrompt(
+            message=composed,
+            tokens=used,
+            budget=budget,
+            dropped_turns=len(history) - len(kept_history),
+            dropped_notes=len(notes) - len(kept_notes),
+            truncated=truncated,
+        )
+        self._record(result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            ordered = sorted(self._recent)
+            stats = dict(self._stats)
+        return {
+            **stats,
+            "tokens_p50": _nearest_rank(ordered, 0.5),
+            "tokens_p90": _nearest_rank(ordered, 0.9),
+            "tokens_max": ordered[-1] if ordered else None,
+        }
+
+    def _record(self, result: ComposedPrompt) -> None:
+        with self._lock:
+            self._recent.append(result.tokens)
+            self._stats["composed"] += 1
+            self._stats["truncated"] += int(result.truncated)
+            self._stats["dropped_turns"] += result.dropped_turns
+            self._stats["dropped_notes"] += result.dropped_notes
+
+    @staticmethod
+    def _truncate(message: str, budget: int, estimator: TokenEstimator) -> str:
+        """Keep the end of ``message``, the part most likely to hold the question."""
+        room = budget - estimator.count(TRUNCATED_MARKER) - 1  # the join may add a token
+        keep = max(0, int(room * estimator.chars_per_token))
+        while keep > 0 and estimator.count(message[-keep:]) > room:
+            keep = int(keep * 0.9)
+        return TRUNCATED_MARKER + (message[-keep:] if keep else "")
+
+
+def _nearest_rank(ordered: list[int], q: float) -> int | None:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
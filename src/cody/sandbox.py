@@ -1,7 +1,12 @@
 """Docker sandbox runner for executing Python code with strict restrictions."""
 
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
+import logging
 import subprocess
+import threading
+
+from .singleflight import SingleFlight
 
 
 @dataclass(frozen=True)
@@ -46,18 +51,321 @@ class DockerPolicy:
         return flags
 
 
-def run_python_in_docker(code: str, policy: DockerPolicy | None = None) -> dict:
+@dataclass
+class ContainerPool:
+    """Pool of pre-started, locked-down containers that jobs ``docker exec`` into.
+
+    Containers are started with the same flags as a cold ``docker run`` and kept
+    idle with ``sleep infinity``. Each container serves exactly one job and is then
+    removed, so no state leaks between jobs; a background thread replaces it.
+    """
+
+    size: int = 2
+    policy: DockerPolicy = field(default_factory=DockerPolicy)
+    label: str = "cody.sandbox.pool"
+    max_backoff_seconds: float = 30.0
+    logger: logging.Logger = field(default_factory=lambda: logging.getLogger("cody.sandbox.pool"))
+
+    def __post_init__(self) -> None:
+        self._idle: deque[str] = deque()
+        self._retired: deque[str] = deque()
+        self._starting = 0
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "started": 0,
+            "start_failures": 0,
+            "recycled": 0,
+        }
+
+    def start(self) -> None:
+        """Start the background refill thread."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._refill_loop, name="cody-sandbox-pool", daemon=True
+            )
+            self._thread.start()
+
+    def close(self) -> None:
+        """Stop refilling and remove every container owned by the pool."""
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=self.policy.timeout_seconds)
+        with self._cond:
+            leftovers = [*self._idle, *self._retired]
+            self._idle.clear()
+            self._retired.clear()
+        for container_id in leftovers:
+            self._remove(container_id)
+
+    def fill(self) -> int:
+        """Synchronously start containers until the pool is full; returns how many were added."""
+        added = 0
+        while self._deficit() > 0:
+            with self._cond:
+                self._starting += 1
+            container_id = self._start_container()
+            with self._cond:
+                self._starting -= 1
+                if container_id is None:
+                    break
+                self._idle.append(container_id)
+                self._cond.notify_all()
+            added += 1
+        return added
+
+    def acquire(self) -> str | None:
+        """Take an idle container for one job, or return None when the pool is empty."""
+        with self._cond:
+            if not self._idle:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            container_id = self._idle.popleft()
+            self._cond.notify_all()
+            return container_id
+
+    def release(self, container_id: str, stale: bool = False) -> None:
+        """Hand a used container back for removal; it is never reused."""
+        with self._cond:
+            if stale:
+                self._stats["stale"] += 1
+            self._retired.append(container_id)
+            background = self._thread is not None
+            self._cond.notify_all()
+        if not background:
+            self._drain_retired()
+
+    def stats(self) -> dict:
+        """Return pool counters plus the current idle count."""
+        with self._cond:
+            return {
+                "enabled": True,
+                "size": self.size,
+                "idle": len(self._idle),
+                **self._stats,
+            }
+
+    def _deficit(self) -> int:
+        with self._cond:
+            return self.size - len(self._idle) - self._starting
+
+    def _refill_loop(self) -> None:
+        backoff = 1.0
+        while not self._stopped.is_set():
+            with self._cond:
+                while not self._stopped.is_set() and not self._retired and self._deficit() <= 0:
+                    self._cond.wait()
+            if self._stopped.is_set():
+                return
+            self._drain_retired()
+            if self._deficit() > 0 and self.fill() == 0 and self._deficit() > 0:
+                # Docker is unavailable or refusing containers; back off instead of spinning.
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff_seconds)
+            else:
+                backoff = 1.0
+
+    def _drain_retired(self) -> None:
+        while True:
+            with self._cond:
+                if not self._retired:
+                    return
+                container_id = self._retired.popleft()
+            self._remove(container_id)
+            with self._cond:
+                self._stats["recycled"] += 1
+
+    def _start_container(self) -> str | None:
+        cmd: list[str] = [
+            "docker",
+            "run",
+            "--detach",
+            "--label",
+            self.label,
+            *self.policy.to_docker_flags(),
+            self.policy.image,
+            "sleep",
+            "infinity",
+        ]
+        try:
+            completed = subprocess.run(
+                cmd,
+                check=False,
+                capture_output=True,
+                text=True,
+                timeout=self.policy.timeout_seconds,
+            )
+        except (FileNotFoundError, subprocess.TimeoutExpired) as exc:
+            self._record_start_failure(type(exc).__name__)
+            return None
+        container_id = completed.stdout.strip()
+        if completed.returncode != 0 or not container_id:
+            self._record_start_failure(
+                completed.stderr.strip() or f"exit_code={completed.returncode}"
+            )
+            return None
+        with self._cond:
+            self._stats["started"] += 1
+        return container_id
+
+    def _record_start_failure(self, reason: str) -> None:
+        with self._cond:
+            self._stats["start_failures"] += 1
+        self.logger.info("sandbox.pool.start_failed reason=%s", reason)
+
+    def _remove(self, container_id: str) -> None:
+        try:
+            subprocess.run(
+                ["docker", "rm", "--force", container_id],
+                check=False,
+                capture_output=True,
+                text=True,
+                timeout=self.policy.timeout_seconds,
+            )
+        except (FileNotFoundError, subprocess.TimeoutExpired):
+            self.logger.info("sandbox.pool.remove_failed container=%s", container_id)
+
+
+_DEFAULT_POOL: ContainerPool | None = None
+
+
+def start_default_pool(size: int, policy: DockerPolicy | None = None) -> ContainerPool | None:
+    """Start the process-wide warm pool used by ``run_python_in_docker``.
+
+    A size of zero or less disables pooling and every run uses a cold container.
+    """
+    global _DEFAULT_POOL
+    if _DEFAULT_POOL is not None:
+        _DEFAULT_POOL.close()
+        _DEFAULT_POOL = None
+    if size <= 0:
+        return None
+    _DEFAULT_POOL = ContainerPool(size=size, policy=policy or DockerPolicy())
+    _DEFAULT_POOL.start()
+    return _DEFAULT_POOL
+
+
+def pool_stats() -> dict:
+    """Return stats for the process-wide warm pool."""
+    if _DEFAULT_POOL is None:
+        return {"enabled": False}
+    return _DEFAULT_POOL.stats()
+
+
+# Identical code submitted concurrently with the same policy runs once and shares the result.
+RUN_FLIGHTS: SingleFlight[dict] = SingleFlight()
+
+
+def coalescing_stats() -> dict:
+    """Return counters for coalesced sandbox runs."""
+    return RUN_FLIGHTS.stats()
+
+
+_DAEMON_ERROR = "Error response from daemon:"
+
+
+def _exec_never_started(
+    container_id: str, completed: subprocess.CompletedProcess, policy: DockerPolicy
+) -> bool:
+    """Detect a docker exec refused because the pooled container was already dead.
+
+    Only then is it safe to rerun the code in a cold container. A failed exec
+    whose stderr does not start with the docker daemon's error is the user
+    code's own exit (even one that took the container down) and is returned as
+    is; otherwise docker is asked whether the container is still running.
+    """
+    if completed.returncode == 0 or not completed.stderr.startswith(_DAEMON_ERROR):
+        return False
+    try:
+        inspected = subprocess.run(
+            ["docker", "inspect", "--format", "{{.State.Running}}", container_id],
+            check=False,
+            capture_output=True,
+            text=True,
+            timeout=policy.timeout_seconds,
+        )
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return True
+    return inspected.returncode != 0 or inspected.stdout.strip() != "true"
+
+
+def _exec_in_container(
+    container_id: str, code: str, policy: DockerPolicy
+) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ["docker", "exec", container_id, "python", "-c", code],
+        check=False,
+        capture_output=True,
+        text=True,
+        timeout=policy.timeout_seconds,
+    )
+
+
+def run_python_in_docker(
+    code: str, policy: DockerPolicy | None = None, pool: ContainerPool | None = None
+) -> dict:
     """Execute Python code in a Docker sandbox with the given policy.
 
+    When a warm pool is available (``pool`` or the process-wide default) and its
+    policy matches, the code runs in an idle pooled container; otherwise a cold
+    ``docker run --rm`` container is used. Identical concurrent runs are coalesced
+    into one container execution and every caller gets its own copy of the result.
+
     Args:
         code: Python code to execute.
         policy: Optional DockerPolicy configuration. Uses defaults if not provided.
+        pool: Optional ContainerPool. Falls back to the process-wide pool.
 
     Returns:
         Dictionary with execution result containing 'ok', 'stdout', 'stderr', 'exit_code',
         or 'error' and 'message' on failure.
     """
     sandbox_policy = policy or DockerPolicy()
+    result, _ = RUN_FLIGHTS.do(
+        (code, sandbox_policy), lambda: _run_python(code, sandbox_policy, pool or _DEFAULT_POOL)
+    )
+    return dict(result)
+
+
+def _run_python(code: str, sandbox_policy: DockerPolicy, active_pool: ContainerPool | None) -> dict:
+    if active_pool is not None and active_pool.policy == sandbox_policy:
+        container_id = active_pool.acquire()
+        if container_id is not None:
+            stale = False
+            try:
+                completed = _exec_in_container(container_id, code, sandbox_policy)
+            except FileNotFoundError:
+                stale = True
+            except subprocess.TimeoutExpired:
+                return {
+                    "ok": False,
+                    "error": "sandbox_timeout",
+                    "message": "Sandbox execution exceeded timeout.",
+                }
+            else:
+                stale = _exec_never_started(container_id, completed, sandbox_policy)
+                if not stale:
+                    return {
+                        "ok": True,
+                        "stdout": completed.stdout,
+                        "stderr": completed.stderr,
+                        "exit_code": completed.returncode,
+                    }
+            finally:
+                # Timed-out or finished, the container is recycled so the next job starts clean.
+                active_pool.release(container_id, stale=stale)
+
     cmd: list[str] = [
         "docker",
         "run",
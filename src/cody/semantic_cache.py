@@ -0,0 +1,242 @@
+"""Semantic response cache: reuse replies for paraphrased prompts via embedding similarity.
+
+Embeddings are kept L2-normalized in one NumPy matrix (optionally memory-mapped on
+disk), so a lookup is a single matrix-vector product followed by a top-k selection.
+NumPy is an optional dependency; ``is_available()`` reports whether it is installed.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore[assignment]
+
+
+def is_available() -> bool:
+    """Return True when NumPy is installed and the semantic cache can be used."""
+    return np is not None
+
+
+@dataclass
+class SemanticCache:
+    """Fixed-capacity embedding index with cosine top-k lookup.
+
+    Entries are scoped by ``namespace`` (model + system prompt) so a reply is only
+    reused for the same kind of request. When full, expired slots are reused first,
+    then the least recently used one. With ``path`` set, the embedding matrix is a
+    memory-mapped ``.npy`` file and reply metadata lives in a SQLite side table.
+
+    All entries share one embedding dimension. An insert with a different one
+    (the embedding model was changed) logs a warning and empties the cache, since
+    old and new vectors cannot be compared; until then lookups of the new
+    dimension miss.
+    """
+
+    capacity: int = 10_000
+    threshold: float = 0.92
+    top_k: int = 4
+    ttl_seconds: float = 3600.0
+    path: Path | None = None
+    clock: Callable[[], float] = time.time
+    logger: logging.Logger = field(default_factory=lambda: logging.getLogger("cody.semantic_cache"))
+
+    def __post_init__(self) -> None:
+        if np is None:
+            raise RuntimeError("numpy is required for the semantic cache; install codey[semantic]")
+        self._lock = threading.Lock()
+        self._matrix: np.ndarray | None = None
+        self._count = 0
+        self._namespace_ids: dict[str, int] = {}
+        self._namespaces = np.full(self.capacity, -1, dtype=np.int32)
+        self._expires = np.zeros(self.capacity, dtype=np.float64)
+        self._last_used = np.zeros(self.capacity, dtype=np.float64)
+        self._replies: list[tuple[str, str] | None] = [None] * self.capacity
+        self._db: sqlite3.Connection | None = None
+        self._stats = {"hits": 0, "misses": 0, "inserts": 0, "evictions": 0, "resets": 0}
+        if self.path is not None:
+            self._load(self.path)
+
+    def lookup(self, namespace: str, embedding: Sequence[float]) -> dict | None:
+        """Return the best cached reply above ``threshold`` as a dict, or None.
+
+        The result includes ``similarity`` and the ``top_k`` candidate scores.
+        """
+        with self._lock:
+            vector = self._normalize(embedding)
+            namespace_id = self._namespace_ids.get(namespace)
+            matrix = self._matrix
+            if vector is None or namespace_id is None or matrix is None or self._count == 0:
+                self._stats["misses"] += 1
+                return None
+
+            now = self.clock()
+            count = self._count
+            scores = matrix[:count] @ vector
+            live = (self._namespaces[:count] == namespace_id) & (self._expires[:count] > now)
+            scores = np.where(live, scores, -np.inf)
+
+            k = min(self.top_k, count)
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            best = int(candidates[0])
+            best_score = float(scores[best])
+            entry = self._replies[best]
+            if entry is None or not np.isfinite(best_score) or best_score < self.threshold:
+                self._stats["misses"] += 1
+                return None
+
+            self._stats["hits"] += 1
+            self._last_used[best] = now
+            reply, provider = entry
+            return {
+                "reply": reply,
+                "provider": provider,
+                "similarity": round(best_score, 4),
+                "top_k": [round(float(scores[i]), 4) for i in candidates if np.isfinite(scores[i])],
+            }
+
+    def insert(self, namespace: str, embedding: Sequence[float], reply: str, provider: str) -> None:
+        with self._lock:
+            vector = self._normalize(embedding, allocate=True)
+            if vector is None or self._matrix is None:
+                return
+            now = self.clock()
+            slot = self._free_slot(now)
+            namespace_id = self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+            self._matrix[slot] = vector
+            self._namespaces[slot] = namespace_id
+            self._expires[slot] = now + self.ttl_seconds
+            self._last_used[slot] = now
+            self._replies[slot] = (reply, provider)
+            self._stats["inserts"] += 1
+            if self.path is not None:
+                self._persist(self.path, slot, namespace)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": self._count,
+                "capacity": self.capacity,
+                "threshold": self.threshold,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if isinstance(self._matrix, np.memmap):
+                self._matrix.flush()
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _normalize(self, embedding: Sequence[float], allocate: bool = False) -> np.ndarray | None:
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.ndim != 1 or vector.size == 0:
+            return None
+        if self._matrix is None:
+            if not allocate:
+                return None
+            self._allocate(vector.size)
+        elif vector.size != self._matrix.shape[1]:
+            if not allocate:
+                return None
+            self._reset(self._matrix.shape[1], vector.size)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    def _allocate(self, dim: int) -> None:
+        if self.path is None:
+            self._matrix = np.zeros((self.capacity, dim), dtype=np.float32)
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._matrix = np.lib.format.open_memmap(
+            self.path / "embeddings.npy", mode="w+", dtype=np.float32, shape=(self.capacity, dim)
+        )
+
+    def _reset(self, old_dim: int, dim: int) -> None:
+        self.logger.warning(
+            "semantic_cache.dimension_changed old=%s new=%s dropped=%s",
+            old_dim,
+            dim,
+            self._count,
+        )
+        self._matrix = None
+        self._count = 0
+        self._namespace_ids.clear()
+        self._namespaces.fill(-1)
+        self._expires.fill(0.0)
+        self._last_used.fill(0.0)
+        self._replies = [None] * self.capacity
+        self._stats["resets"] += 1
+        if self.path is not None:
+            with self._connect(self.path) as db:
+                db.execute("DELETE FROM entries")
+        self._allocate(dim)
+
+    def _free_slot(self, now: float) -> int:
+        if self._count < self.capacity:
+            self._count += 1
+            return self._count - 1
+        expired = np.flatnonzero(self._expires <= now)
+        if expired.size:
+            return int(expired[0])
+        self._stats["evictions"] += 1
+        return int(np.argmin(self._last_used))
+
+    def _connect(self, path: Path) -> sqlite3.Connection:
+        if self._db is None:
+            path.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path / "entries.sqlite", check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "slot INTEGER PRIMARY KEY, namespace TEXT NOT NULL, reply TEXT NOT NULL, "
+                "provider TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        return self._db
+
+    def _persist(self, path: Path, slot: int, namespace: str) -> None:
+        entry = self._replies[slot]
+        if entry is None:
+            return
+        reply, provider = entry
+        with self._connect(path) as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (slot, namespace, reply, provider, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (slot, namespace, reply, provider, float(self._expires[slot])),
+            )
+        if isinstance(self._matrix, np.memmap):
+            self._matrix.flush()
+
+    def _load(self, path: Path) -> None:
+        matrix_path = path / "embeddings.npy"
+        if not matrix_path.exists():
+            return
+        matrix = np.lib.format.open_memmap(matrix_path, mode="r+")
+        if matrix.shape[0] != self.capacity or matrix.dtype != np.float32:
+            # Capacity changed since the file was written; start over rather than misindex.
+            del matrix
+            matrix_path.unlink()
+            (path / "entries.sqlite").unlink(missing_ok=True)
+            return
+        self._matrix = matrix
+        rows = self._connect(path).execute(
+            "SELECT slot, namespace, reply, provider, expires_at FROM entries"
+        ).fetchall()
+        for slot, namespace, reply, provider, expires_at in rows:
+            namespace_id = self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+            self._namespaces[slot] = namespace_id
+            self._expires[slot] = expires_at
+            self._replies[slot] = (reply, provider)
+            self._count = max(self._count, slot + 1)
@@ -0,0 +1,121 @@
+"""Single-flight coalescing: identical concurrent calls share one execution."""
+
+import asyncio
+import functools
+import threading
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+
+
+class _Call[T]:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: T  # set by the leader before ``done``, unless it raised
+        self.error: BaseException | None = None
+
+
+@dataclass
+class SingleFlight[T]:
+    """Run ``fn`` once per key among concurrent callers and fan the result out.
+
+    The first caller for a key executes ``fn``; callers arriving while it runs block
+    and receive the same result (or exception). Once the call finishes the key is
+    forgotten, so later callers trigger a fresh execution.
+    """
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call[T]] = {}
+        self._stats = {"calls": 0, "executions": 0, "shared": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> tuple[T, bool]:
+        """Return ``(result, shared)``; ``shared`` is True if another caller did the work."""
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats["shared"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> dict:
+        """Counters: ``shared`` is the number of upstream calls saved."""
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._calls)}
+
+
+class _AsyncCall[T]:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future[T]) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+@dataclass
+class AsyncSingleFlight[T]:
+    """``SingleFlight`` for coroutines: callers await one shared task instead of blocking.
+
+    The call runs as its own task, and every caller, the first included, awaits it
+    through ``asyncio.shield``. A cancelled caller (a client that went away) only
+    stops waiting; the task is cancelled once no caller is left waiting for it.
+    Must be used from a single event loop.
+    """
+
+    def __post_init__(self) -> None:
+        self._calls: dict[Hashable, _AsyncCall[T]] = {}
+        self._stats = {"calls": 0, "executions": 0, "shared": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Return ``(result, shared)``; ``shared`` is True if another caller did the work."""
+        self._stats["calls"] += 1
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _AsyncCall(asyncio.ensure_future(fn()))
+            # Mark the outcome as retrieved so an unawaited failure is not logged by asyncio.
+            call.task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            call.task.add_done_callback(functools.partial(self._forget, key, call))
+            self._calls[key] = call
+            self._stats["executions"] += 1
+        else:
+            self._stats["shared"] += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.task.done() or call.waiters == 0:
+                self._forget(key, call)
+            if call.waiters == 0:
+                call.task.cancel()
+
+    def stats(self) -> dict:
+        return {**self._stats, "in_flight": len(self._calls)}
+
+    def _forget(self, key: Hashable, call: _AsyncCall[T], _done: object = None) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
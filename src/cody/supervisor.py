@@ -0,0 +1,225 @@
+"""Pre-fork supervisor: run N copies of a Cody server that share one port via SO_REUSEPORT.
+
+Each worker binds its own listening socket with SO_REUSEPORT, and the kernel spreads
+new connections across them. Parsing, dispatch and logging then use every core
+instead of sharing one GIL. The supervisor restarts workers that exit unexpectedly.
+A configured Unix socket (``CODY_UNIX_SOCKET``, or ``CODY_API_UNIX_SOCKET`` for the
+API) cannot use SO_REUSEPORT, so the supervisor binds it once before forking and
+every worker accepts from the inherited listener.
+
+Cross-process state:
+
+- Queued stub messages (``pending_messages``) and their replayed answers live in a
+  shared SQLite file (``CODY_PENDING_PATH``, default ``data/pending_messages.sqlite``).
+  Every worker runs a replay worker; claims are leased, so each message is answered
+  once, and a client can fetch the answer from any worker.
+- The response cache's optional SQLite tier (``CODY_CACHE_PATH``) is shared. The
+  in-memory LRU in front of it is per worker.
+- Circuit breakers, latency windows, hedging counters and single-flight
+  coalescing are per worker. Each worker learns provider health on its own.
+- Every worker keeps its own warm sandbox pool of ``CODY_SANDBOX_POOL_SIZE``.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import time
+import traceback
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from . import config, listeners
+
+
+def _serve_tcp() -> None:
+    from . import tcp_server
+
+    tcp_server.main(reuse_port=True)
+
+
+def _serve_tcp_async() -> None:
+    from . import async_tcp_server
+
+    async_tcp_server.main(reuse_port=True)
+
+
+def _serve_api() -> None:
+    from . import api_ui
+
+    api_ui.main(reuse_port=True)
+
+
+# Servers are imported inside the worker so routers, pools and SQLite handles are
+# created after fork(), never inherited from the supervisor.
+SERVERS: dict[str, Callable[[], None]] = {
+    "tcp": _serve_tcp,
+    "tcp-async": _serve_tcp_async,
+    "api": _serve_api,
+}
+
+
+@dataclass
+class Supervisor:
+    """Fork ``workers`` children running ``target`` and keep that many alive.
+
+    A worker that crashes (exits nonzero) while the supervisor is running is
+    restarted; one that exits cleanly has nothing left to serve and is not. If a
+    worker slot keeps crashing within ``restart_window`` seconds of starting, its
+    restarts back off exponentially, starting at ``restart_delay`` and capped at
+    ``max_restart_delay``. A restart is scheduled, not slept on, so other workers
+    and signals are still handled meanwhile. SIGTERM or SIGINT stops the
+    supervisor; it forwards the signal to every worker and waits for them to exit.
+    """
+
+    target: Callable[[], None]
+    workers: int = 1
+    restart_delay: float = 0.5
+    max_restart_delay: float = 30.0
+    restart_window: float = 10.0
+    poll_interval: float = 0.1  # how often exits are checked while a restart is pending
+    logger: logging.Logger = field(default_factory=lambda: logging.getLogger("cody.supervisor"))
+
+    def __post_init__(self) -> None:
+        self._children: dict[int, int] = {}  # pid -> slot
+        self._started_at: dict[int, float] = {}  # slot -> start time
+        self._backoff: dict[int, float] = {}  # slot -> next restart delay
+        self._restart_at: dict[int, float] = {}  # slot -> when to restart it
+        self._stopping = False
+        self._stats = {"spawned": 0, "restarts": 0, "crashes": 0}
+
+    def run(self) -> None:
+        """Spawn the workers and supervise them until a stop signal arrives."""
+        previous = {
+            sig: signal.signal(sig, self._handle_stop) for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            for slot in range(self.workers):
+                self._spawn(slot)
+            while self._children or (self._restart_at and not self._stopping):
+                self._restart_due()
+                if not self._restart_at:
+                    try:
+                        pid, status = os.wait()
+                    except ChildProcessError:
+                        break
+                else:
+                    try:
+                        pid, status = os.waitpid(-1, os.WNOHANG)
+                    except ChildProcessError:
+                        pid, status = 0, 0
+                    if pid == 0:
+                        next_restart = min(self._restart_at.values()) - time.monotonic()
+                        time.sleep(max(0.0, min(next_restart, self.poll_interval)))
+                        continue
+                if pid not in self._children:
+                    continue
+                self._on_exit(self._children.pop(pid), pid, status)
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+    def stop(self, sig: int = signal.SIGTERM) -> None:
+        """Stop restarting workers and forward ``sig`` to the live ones."""
+        self._stopping = True
+        self._restart_at.clear()
+        for pid in list(self._children):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def stats(self) -> dict:
+        return {**self._stats, "alive": len(self._children), "workers": self.workers}
+
+    def _handle_stop(self, signum: int, _frame: object) -> None:
+        self.logger.info("supervisor.stopping signal=%s workers=%s", signum, len(self._children))
+        self.stop(signum)
+
+    def _on_exit(self, slot: int, pid: int, status: int) -> None:
+        code = os.waitstatus_to_exitcode(status)
+        if self._stopping:
+            self.logger.info(
+                "supervisor.worker.stopped slot=%s pid=%s exit_code=%s", slot, pid, code
+            )
+            return
+        if code == 0:
+            self.logger.info("supervisor.worker.finished slot=%s pid=%s", slot, pid)
+            return
+        self._stats["crashes"] += 1
+        lived = time.monotonic() - self._started_at.get(slot, 0.0)
+        if lived >= self.restart_window:
+            self._backoff[slot] = self.restart_delay
+        delay = self._backoff.get(slot, self.restart_delay)
+        self._backoff[slot] = min(delay * 2, self.max_restart_delay)
+        self.logger.warning(
+            "supervisor.worker.exited slot=%s pid=%s exit_code=%s restart_in=%.2f",
+            slot,
+            pid,
+            code,
+            delay,
+        )
+        self._restart_at[slot] = time.monotonic() + delay
+
+    def _restart_due(self) -> None:
+        now = time.monotonic()
+        for slot, due in list(self._restart_at.items()):
+            if due <= now and not self._stopping:
+                del self._restart_at[slot]
+                self._stats["restarts"] += 1
+                self._spawn(slot)
+
+    def _spawn(self, slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            self._run_child()
+        self._children[pid] = slot
+        if self._stopping:  # the stop signal arrived between fork and registration
+            os.kill(pid, signal.SIGTERM)
+        self._started_at[slot] = time.monotonic()
+        self._stats["spawned"] += 1
+        self.logger.info("supervisor.worker.started slot=%s pid=%s", slot, pid)
+
+    def _run_child(self) -> None:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        code = 0
+        try:
+            self.target()
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Run several Cody server workers on one port.")
+    parser.add_argument("server", choices=sorted(SERVERS), help="which server each worker runs")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.DEFAULT_SETTINGS.workers,
+        help="worker processes (default: CODY_WORKERS, or one per CPU)",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+
+    workers = args.workers if args.workers > 0 else os.cpu_count() or 1
+    settings = config.DEFAULT_SETTINGS
+    unix_path = settings.api_unix_socket_path if args.server == "api" else settings.unix_socket_path
+    if unix_path:
+        listeners.prebind_unix_socket(unix_path, settings.unix_socket_mode)
+
+    print(f"Cody supervisor starting {workers} '{args.server}' workers")
+    try:
+        Supervisor(target=SERVERS[args.server], workers=workers).run()
+    finally:
+        if unix_path:
+            listeners.remove_unix_socket(unix_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,31 @@
 """NDJSON TCP server for Cody."""
 
 import json
+import socket
 import socketserver
+import threading
 import uuid
+from collections.abc import Iterator
+from concurrent import futures
 
-from . import config, llm, sandbox, status
+from . import batch, config, framing, listeners, llm, sandbox, status
 
 
 def _build_router() -> llm.LLMRouter:
-    return llm.LLMRouter(
-        intent_client=llm.OllamaClient(config.DEFAULT_SETTINGS.ollama_intent_url),
-        primary_client=llm.OllamaClient(config.DEFAULT_SETTINGS.ollama_primary_url),
-        fallback_client=llm.OllamaClient(config.DEFAULT_SETTINGS.ollama_fallback_url),
-    )
+    return llm.build_router(config.DEFAULT_SETTINGS)
+
+
+def _with_router_metrics(response: dict, router: llm.LLMRouter | None) -> dict:
+    """Attach router metrics (provider circuit state, ...) when a router is in scope."""
+    if router is None:
+        return response
+    return {**response, "router": router.metrics()}
+
+
+def chat_conversation_id(payload: dict) -> str | None:
+    """The chat's ``conversation_id`` when the client sent a non-empty string."""
+    conversation_id = payload.get("conversation_id")
+    return conversation_id if isinstance(conversation_id, str) and conversation_id else None
 
 
 def handle_command(
@@ -31,62 +44,268 @@ def handle_command(
     if cmd == "chat":
         active_router = router or _build_router()
         routed = active_router.route_chat(
-            payload.get("message", ""), request_id=request_id, recipient=recipient
+            payload.get("message", ""),
+            request_id=request_id,
+            recipient=recipient,
+            conversation_id=chat_conversation_id(payload),
         )
         return {"ok": True, **routed}
     if cmd == "get_phase_1_status":
-        return {"ok": True, "status": status.get_phase_1_status()}
+        return _with_router_metrics({"ok": True, "status": status.get_phase_1_status()}, router)
     if cmd == "get_phase_2_status":
-        return {"ok": True, "status": status.get_phase_2_status()}
+        return _with_router_metrics({"ok": True, "status": status.get_phase_2_status()}, router)
     if cmd == "get_phase_3_status":
-        return {"ok": True, "status": status.get_phase_3_status()}
+        return _with_router_metrics({"ok": True, "status": status.get_phase_3_status()}, router)
+    if cmd == "get_provider_status":
+        return _with_router_metrics({"ok": True}, router or _build_router())
+    if cmd == "get_result":
+        wanted = payload.get("request_id")
+        if not isinstance(wanted, str) or not wanted:
+            return {"ok": False, "error": "missing_request_id"}
+        token = payload.get("result_token")
+        if not isinstance(token, str) or not token:
+            return {"ok": False, "error": "missing_result_token"}
+        return {"ok": True, **(router or _build_router()).pending_result(wanted, token)}
+    if cmd == "batch":
+        return _handle_batch(payload, router, request_id or uuid.uuid4().hex, recipient)
     return {"ok": False, "error": "unknown_command"}
 
 
+def batch_parallelism(payload: dict, settings: config.Settings = config.DEFAULT_SETTINGS) -> int:
+    """Parallelism for a batch: the client may ask for less than the configured limit, not more."""
+    requested = payload.get("parallelism")
+    limit = settings.batch_max_parallelism
+    if isinstance(requested, int) and not isinstance(requested, bool) and requested > 0:
+        return min(requested, limit)
+    return limit
+
+
+def _iter_batch(
+    payload: dict, router: llm.LLMRouter | None, request_id: str, recipient: str
+) -> Iterator[tuple[int, dict]]:
+    items = payload["items"]
+    active_router = router or _build_router()
+
+    def execute(item: dict, index: int) -> dict:
+        return handle_command(
+            item,
+            router=active_router,
+            request_id=batch.item_request_id(item, request_id, index),
+            recipient=recipient,
+        )
+
+    for index, result in batch.iter_batch(items, execute, batch_parallelism(payload)):
+        yield index, batch.tag_result(items, index, request_id, result)
+
+
+def _handle_batch(
+    payload: dict, router: llm.LLMRouter | None, request_id: str, recipient: str
+) -> dict:
+    error = batch.validate_batch(payload, config.DEFAULT_SETTINGS.batch_max_items)
+    if error is not None:
+        return error
+    results: list[dict] = [{}] * len(payload["items"])
+    for index, result in _iter_batch(payload, router, request_id, recipient):
+        results[index] = result
+    return batch.summarize(results)
+
+
+def handle_command_stream(
+    payload: dict,
+    router: llm.LLMRouter | None = None,
+    request_id: str | None = None,
+    recipient: str = "unknown",
+) -> Iterator[dict]:
+    """Yield response frames for a command.
+
+    ``chat`` with ``"stream": true`` yields ``{"type": "delta"}`` frames tagged with
+    the request id followed by a ``{"type": "final"}`` frame. ``batch`` with
+    ``"stream": true`` yields one ``{"type": "item"}`` frame per item as it finishes,
+    then a ``{"type": "final"}`` summary. Every other command yields the single
+    ``handle_command`` response.
+    """
+    if payload.get("cmd") == "batch" and payload.get("stream"):
+        yield from _stream_batch(payload, router, request_id or uuid.uuid4().hex, recipient)
+        return
+    if payload.get("cmd") != "chat" or not payload.get("stream"):
+        yield handle_command(payload, router=router, request_id=request_id, recipient=recipient)
+        return
+
+    active_router = router or _build_router()
+    for event in active_router.route_chat_stream(
+        payload.get("message", ""),
+        request_id=request_id,
+        recipient=recipient,
+        conversation_id=chat_conversation_id(payload),
+    ):
+        yield {"ok": True, "request_id": request_id, **event}
+
+
+def _stream_batch(
+    payload: dict, router: llm.LLMRouter | None, request_id: str, recipient: str
+) -> Iterator[dict]:
+    error = batch.validate_batch(payload, config.DEFAULT_SETTINGS.batch_max_items)
+    if error is not None:
+        yield error
+        return
+    failed = 0
+    for index, result in _iter_batch(payload, router, request_id, recipient):
+        failed += not result.get("ok")
+        yield {
+            "ok": True,
+            "request_id": request_id,
+            "type": "item",
+            "index": index,
+            "result": result,
+        }
+    yield {
+        "ok": True,
+        "request_id": request_id,
+        "type": "final",
+        "count": len(payload["items"]),
+        "failed": failed,
+    }
+
+
+def parse_request_line(raw: bytes) -> tuple[dict | None, dict | None]:
+    """Decode one NDJSON request line into ``(payload, error_response)``.
+
+    Blank lines yield ``(None, None)`` and should be skipped.
+    """
+    try:
+        decoded = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return None, {"ok": False, "error": "invalid_encoding"}
+
+    line = decoded.strip()
+    if not line:
+        # Ignore blank lines instead of erroring; clients often send them.
+        return None, None
+
+    try:
+        payload = json.loads(line)
+    except json.JSONDecodeError:
+        return None, {"ok": False, "error": "invalid_json"}
+
+    if not isinstance(payload, dict):
+        return None, {"ok": False, "error": "invalid_message_type"}
+    return payload, None
+
+
+def tag_frame(frame: dict, request_id: str) -> dict:
+    """Echo the request id on every response frame so pipelined replies can be matched."""
+    return {**frame, "request_id": request_id}
+
+
 class NDJSONRequestHandler(socketserver.StreamRequestHandler):
+    """Reads request lines and runs up to ``server.max_in_flight`` commands concurrently.
+
+    Responses are written as each command completes, so a slow ``chat`` does not hold
+    back a ``ping`` sent after it; clients match replies by ``request_id``. Once the cap
+    is reached the handler stops reading, which pushes back on the client via TCP.
+    """
+
     def setup(self) -> None:
         super().setup()
-        self.router = _build_router()
+        shared_router = getattr(self.server, "shared_router", None)
+        self.router = shared_router() if shared_router else _build_router()
+        max_in_flight = getattr(
+            self.server, "max_in_flight", config.DEFAULT_SETTINGS.tcp_max_in_flight
+        )
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._write_lock = threading.Lock()
+        # Set once a ``hello`` switches the connection to binary frames.
+        self._codec: framing.FrameCodec | None = None
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="cody-tcp-command"
+        )
 
     def handle(self) -> None:
-        while True:
-            raw = self.rfile.readline()
-            if not raw:
-                break
-
-            try:
-                decoded = raw.decode("utf-8")
-            except UnicodeDecodeError:
-                self._send_safe({"ok": False, "error": "invalid_encoding"})
-                continue
+        # Unix socket peers have no address; TCP peers are identified by their IP.
+        recipient = self.client_address[0] if self.client_address else "unix-client"
+        commands_seen = False
+        try:
+            while True:
+                payload, error, done = self._read_request()
+                if done:
+                    break
+                if error is not None:
+                    self._send_safe(error)
+                    continue
+                if payload is None:
+                    continue
 
-            line = decoded.strip()
-            if not line:
-                # Ignore blank lines instead of erroring; clients often send them.
-                continue
+                request_id = payload.get("request_id") or uuid.uuid4().hex
+                if payload.get("cmd") == "hello":
+                    self._handshake(payload, request_id, first=not commands_seen)
+                    continue
+                commands_seen = True
+                self._in_flight.acquire()
+                self._executor.submit(self._run_command, payload, request_id, recipient)
+        finally:
+            # Let in-flight commands finish writing before the socket is closed.
+            self._executor.shutdown(wait=True)
 
-            try:
-                payload = json.loads(line)
-            except json.JSONDecodeError:
-                self._send_safe({"ok": False, "error": "invalid_json"})
-                continue
+    def _read_request(self) -> tuple[dict | None, dict | None, bool]:
+        """Return ``(payload, error_response, end_of_stream)`` for the next NDJSON line or frame."""
+        if self._codec is None:
+            raw = self.rfile.readline()
+            if not raw:
+                return None, None, True
+            payload, error = parse_request_line(raw)
+            return payload, error, False
+        try:
+            frame = self._codec.read_frame(self.rfile)
+        except framing.FramingError as exc:
+            # A bad frame leaves the byte stream unsynchronized; report it and hang up.
+            self._send_safe({"ok": False, "error": "invalid_frame", "message": str(exc)})
+            return None, None, True
+        if frame is None:
+            return None, None, True
+        if not isinstance(frame, dict):
+            return None, {"ok": False, "error": "invalid_message_type"}, False
+        return frame, None, False
 
-            if not isinstance(payload, dict):
-                self._send_safe({"ok": False, "error": "invalid_message_type"})
-                continue
+    def _handshake(self, payload: dict, request_id: str, first: bool) -> None:
+        """Answer ``hello`` in NDJSON, then switch this connection to binary frames."""
+        if not first or self._codec is not None:
+            self._send_safe(tag_frame({"ok": False, "error": "hello_must_be_first"}, request_id))
+            return
+        codec, response = framing.negotiate(
+            payload, max_frame_bytes=config.DEFAULT_SETTINGS.tcp_max_line_bytes
+        )
+        with self._write_lock:
+            self._write_ndjson(tag_frame(response, request_id))
+            self._codec = codec
 
-            request_id = payload.get("request_id") or uuid.uuid4().hex
-            recipient = self.client_address[0] if self.client_address else "tcp-client"
+    def _run_command(self, payload: dict, request_id: str, recipient: str) -> None:
+        try:
+            for frame in handle_command_stream(
+                payload,
+                router=self.router,
+                request_id=request_id,
+                recipient=recipient,
+            ):
+                self._send_safe(tag_frame(frame, request_id))
+        except Exception as exc:  # one failing command must not take the connection down
             self._send_safe(
-                handle_command(
-                    payload,
-                    router=self.router,
-                    request_id=request_id,
-                    recipient=recipient,
-                )
+                tag_frame({"ok": False, "error": "internal_error", "message": str(exc)}, request_id)
             )
+        finally:
+            self._in_flight.release()
 
     def _send_safe(self, body: dict) -> None:
+        with self._write_lock:
+            if self._codec is None:
+                self._write_ndjson(body)
+                return
+            try:
+                self.wfile.write(self._codec.encode(body))
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+    def _write_ndjson(self, body: dict) -> None:
         try:
             self.wfile.write((json.dumps(body) + "\n").encode("utf-8"))
             self.wfile.flush()
@@ -97,12 +316,108 @@ class NDJSONRequestHandler(socketserver.StreamRequestHandler):
 
 class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     allow_reuse_address = True
+    max_in_flight: int = config.DEFAULT_SETTINGS.tcp_max_in_flight
+    router: llm.LLMRouter | None = None
+    _router_lock = threading.Lock()
 
+    def shared_router(self) -> llm.LLMRouter:
+        """Router shared by every connection so breaker state and queued messages are global."""
+        with self._router_lock:
+            if self.router is None:
+                self.router = _build_router()
+            return self.router
 
-def main() -> None:
-    with ThreadedTCPServer((config.DEFAULT_SETTINGS.tcp_host, config.DEFAULT_SETTINGS.tcp_port), NDJSONRequestHandler) as server:
-        print(f"Cody TCP server listening on {config.DEFAULT_SETTINGS.tcp_host}:{config.DEFAULT_SETTINGS.tcp_port}")
-        server.serve_forever()
+
+class ReusePortTCPServer(ThreadedTCPServer):
+    """Threaded server whose listening socket sets SO_REUSEPORT, so the kernel spreads
+    connections across every worker process bound to the port."""
+
+    allow_reuse_port = True
+
+
+class ThreadedUnixServer(ThreadedTCPServer):
+    """Same handler and shared router as ``ThreadedTCPServer``, listening on a Unix socket.
+
+    The socket file gets ``socket_mode`` permissions and is removed on close. Under
+    the supervisor the listener pre-bound before fork is reused instead.
+    """
+
+    address_family = socket.AF_UNIX
+
+    def __init__(
+        self,
+        path: str,
+        handler_class: type[socketserver.BaseRequestHandler],
+        socket_mode: int = listeners.DEFAULT_MODE,
+    ) -> None:
+        self.unix_path = path
+        self.socket_mode = socket_mode
+        self._owns_path = False
+        # TCPServer's stub only types inet addresses; socketserver itself accepts a path.
+        super().__init__(path, handler_class)  # type: ignore[arg-type]
+
+    def server_bind(self) -> None:
+        self.socket.close()
+        self.socket, self._owns_path = listeners.unix_listener(self.unix_path, self.socket_mode)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if self._owns_path:
+            listeners.remove_unix_socket(self.unix_path)
+
+
+def build_servers(settings: config.Settings, reuse_port: bool = False) -> list[ThreadedTCPServer]:
+    """TCP and/or Unix socket servers for ``settings``, all sharing one router."""
+    servers: list[ThreadedTCPServer] = []
+    if settings.tcp_enabled:
+        server_class = ReusePortTCPServer if reuse_port else ThreadedTCPServer
+        servers.append(server_class((settings.tcp_host, settings.tcp_port), NDJSONRequestHandler))
+    if settings.unix_socket_path:
+        try:
+            servers.append(
+                ThreadedUnixServer(
+                    settings.unix_socket_path, NDJSONRequestHandler, settings.unix_socket_mode
+                )
+            )
+        except OSError:
+            for server in servers:
+                server.server_close()
+            raise
+    if servers:
+        router = servers[0].shared_router()
+        for server in servers[1:]:
+            server.router = router
+    return servers
+
+
+def main(reuse_port: bool = False) -> None:
+    """Serve forever; ``reuse_port`` lets supervisor workers bind the same port (SO_REUSEPORT)."""
+    settings = config.DEFAULT_SETTINGS
+    servers = build_servers(settings, reuse_port=reuse_port)
+    if not servers:
+        print("Nothing to serve: enable TCP (CODY_TCP_ENABLED) or set CODY_UNIX_SOCKET")
+        return
+    sandbox.start_default_pool(settings.sandbox_pool_size)
+    servers[0].shared_router().start_health_probe(settings.health_probe_interval_seconds)
+    servers[0].shared_router().start_memory_workers(settings.long_term_compact_interval_seconds)
+    servers[0].shared_router().start_replay_worker(settings.pending_replay_interval_seconds)
+    if settings.model_preload:
+        servers[0].shared_router().start_model_manager(
+            settings.model_touch_interval_seconds, settings.timeout_ceiling_seconds
+        )
+    if settings.tcp_enabled:
+        print(f"Cody TCP server listening on {settings.tcp_host}:{settings.tcp_port}")
+    if settings.unix_socket_path:
+        print(f"Cody TCP server listening on unix:{settings.unix_socket_path}")
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        servers[0].serve_forever()
+    finally:
+        for server in servers[1:]:
+            server.shutdown()
+        for server in servers:
+            server.server_close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,518 @@
+"""Pooled HTTP/1.1 keep-alive transport shared by Ollama clients (blocking and asyncio)."""
+
+import asyncio
+import http.client
+import threading
+import time
+import weakref
+from collections.abc import AsyncIterator, Awaitable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+# Errors that mean a reused keep-alive socket was closed by the server while idle.
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+@dataclass
+class ConnectionPool:
+    """Keep-alive connections to one origin with a per-host limit and idle eviction."""
+
+    scheme: str
+    host: str
+    port: int
+    max_connections: int = 8
+    idle_timeout: float = 30.0
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        # LIFO stack of (connection, last_used) so the warmest socket is reused first.
+        self._idle: list[tuple[http.client.HTTPConnection, float]] = []
+        self._in_use = 0
+        self._stats = {
+            "requests": 0,
+            "created": 0,
+            "reused": 0,
+            "evicted": 0,
+            "stale_reconnects": 0,
+            "waits": 0,
+        }
+
+    @property
+    def origin(self) -> str:
+        return f"{self.scheme}://{self.host}:{self.port}"
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: bytes | None = None,
+        headers: dict[str, str] | None = None,
+        timeout: float = 30.0,
+    ) -> tuple[int, bytes]:
+        """Send a request and return ``(status, body)``, reusing an idle connection when possible.
+
+        Raises OSError (including TimeoutError) or http.client.HTTPException on failure.
+        """
+        with self.stream(method, path, body, headers, timeout) as response:
+            return response.status, response.read()
+
+    @contextmanager
+    def stream(
+        self,
+        method: str,
+        path: str,
+        body: bytes | None = None,
+        headers: dict[str, str] | None = None,
+        timeout: float = 30.0,
+    ) -> Iterator[http.client.HTTPResponse]:
+        """Yield the raw response; the connection returns to the pool only if it was fully read."""
+        self._acquire_slot(timeout)
+        try:
+            conn, reused = self._checkout(timeout)
+            try:
+                try:
+                    response = self._send(conn, method, path, body, headers)
+                except _STALE_ERRORS:
+                    if not reused:
+                        raise
+                    conn.close()
+                    with self._lock:
+                        self._stats["stale_reconnects"] += 1
+                    conn = self._connect(timeout)
+                    response = self._send(conn, method, path, body, headers)
+            except BaseException:
+                conn.close()  # the replacement too, if the retry failed
+                raise
+
+            try:
+                yield response
+            except BaseException:
+                conn.close()
+                raise
+            if response.isclosed() and not response.will_close:
+                self._checkin(conn)
+            else:
+                conn.close()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def evict_idle(self) -> int:
+        """Close idle connections that have outlived ``idle_timeout``."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            expired = [conn for conn, last_used in self._idle if last_used < cutoff]
+            self._idle = [
+                (conn, last_used) for conn, last_used in self._idle if last_used >= cutoff
+            ]
+            self._stats["evicted"] += len(expired)
+        for conn in expired:
+            conn.close()
+        return len(expired)
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "max_connections": self.max_connections,
+            }
+
+    def _acquire_slot(self, timeout: float) -> None:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["waits"] += 1
+            if not self._slots.acquire(timeout=timeout):
+                raise TimeoutError(f"no free connection to {self.origin} within {timeout}s")
+        with self._lock:
+            self._in_use += 1
+            self._stats["requests"] += 1
+
+    def _checkout(self, timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        self.evict_idle()
+        with self._lock:
+            if self._idle:
+                conn, _ = self._idle.pop()
+                self._stats["reused"] += 1
+            else:
+                conn = None
+        if conn is None:
+            return self._connect(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _checkin(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def _connect(self, timeout: float) -> http.client.HTTPConnection:
+        connection_class = (
+            http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        )
+        with self._lock:
+            self._stats["created"] += 1
+        return connection_class(self.host, self.port, timeout=timeout)
+
+    @staticmethod
+    def _send(
+        conn: http.client.HTTPConnection,
+        method: str,
+        path: str,
+        body: bytes | None,
+        headers: dict[str, str] | None,
+    ) -> http.client.HTTPResponse:
+        conn.request(
+            method, path, body=body, headers={"Connection": "keep-alive", **(headers or {})}
+        )
+        return conn.getresponse()
+
+
+class AsyncResponse:
+    """Response head plus an incremental body reader for ``AsyncConnectionPool.stream``."""
+
+    def __init__(
+        self, status: int, headers: dict[str, str], reader: asyncio.StreamReader, timeout: float
+    ) -> None:
+        self.status = status
+        self.headers = headers
+        self._reader = reader
+        self._timeout = timeout
+        self._chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        length = headers.get("content-length")
+        self._remaining = int(length) if length is not None and not self._chunked else None
+        self.will_close = headers.get("connection", "").lower() == "close" or (
+            not self._chunked and self._remaining is None
+        )
+        self.complete = self._remaining == 0
+
+    async def read(self) -> bytes:
+        """Read the rest of the body."""
+        return b"".join([piece async for piece in self.iter_chunks()])
+
+    async def iter_lines(self) -> AsyncIterator[bytes]:
+        """Yield body lines (without the trailing newline) as they arrive."""
+        buffer = b""
+        async for piece in self.iter_chunks():
+            buffer += piece
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line
+        if buffer:
+            yield buffer
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        """Yield raw body fragments until the body is exhausted."""
+        while not self.complete:
+            if self._chunked:
+                size_line = await self._wait(self._reader.readline())
+                if not size_line:
+                    raise asyncio.IncompleteReadError(b"", None)
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+                if size == 0:
+                    while (await self._wait(self._reader.readline())).strip():
+                        pass  # trailer headers
+                    self.complete = True
+                    return
+                data = await self._wait(self._reader.readexactly(size + 2))
+                yield data[:-2]
+            elif self._remaining is not None:
+                data = await self._wait(self._reader.read(min(self._remaining, 65536)))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", self._remaining)
+                self._remaining -= len(data)
+                self.complete = self._remaining == 0
+                yield data
+            else:
+                data = await self._wait(self._reader.read(65536))
+                if not data:
+                    self.complete = True
+                    return
+                yield data
+
+    async def _wait[T](self, operation: Awaitable[T]) -> T:
+        return await asyncio.wait_for(operation, self._timeout)
+
+
+@dataclass
+class AsyncConnectionPool:
+    """asyncio counterpart of ``ConnectionPool``: keep-alive streams bound to one event loop."""
+
+    scheme: str
+    host: str
+    port: int
+    max_connections: int = 8
+    idle_timeout: float = 30.0
+
+    def __post_init__(self) -> None:
+        self._slots = asyncio.Semaphore(self.max_connections)
+        # LIFO stack of (reader, writer, last_used), mirroring the blocking pool.
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter, float]] = []
+        self._in_use = 0
+        self._stats = {
+            "requests": 0,
+            "created": 0,
+            "reused": 0,
+            "evicted": 0,
+            "stale_reconnects": 0,
+            "waits": 0,
+        }
+
+    @property
+    def origin(self) -> str:
+        return f"{self.scheme}://{self.host}:{self.port}"
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        body: bytes | None = None,
+        headers: dict[str, str] | None = None,
+        timeout: float = 30.0,
+    ) -> tuple[int, bytes]:
+        """Send a request and return ``(status, body)`` without blocking the event loop.
+
+        Raises OSError (including TimeoutError) or ValueError on malformed responses.
+        """
+        async with self.stream(method, path, body, headers, timeout) as response:
+            return response.status, await response.read()
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        method: str,
+        path: str,
+        body: bytes | None = None,
+        headers: dict[str, str] | None = None,
+        timeout: float = 30.0,
+    ) -> AsyncIterator[AsyncResponse]:
+        """Yield the response; the connection returns to the pool only if it was fully read."""
+        await self._acquire_slot(timeout)
+        try:
+            reader, writer, reused = await self._checkout(timeout)
+            try:
+                try:
+                    response = await self._send(
+                        reader, writer, method, path, body, headers, timeout
+                    )
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    if not reused:
+                        raise
+                    writer.close()
+                    self._stats["stale_reconnects"] += 1
+                    reader, writer = await self._connect(timeout)
+                    response = await self._send(
+                        reader, writer, method, path, body, headers, timeout
+                    )
+            except BaseException:
+                writer.close()  # the replacement too, if the retry failed
+                raise
+
+            try:
+                yield response
+            except BaseException:
+                writer.close()
+                raise
+            if response.complete and not response.will_close:
+                self._idle.append((reader, writer, time.monotonic()))
+            else:
+                writer.close()
+        finally:
+            self._in_use -= 1
+            self._slots.release()
+
+    def evict_idle(self) -> int:
+        """Close idle connections that have outlived ``idle_timeout`` or were closed by the peer."""
+        cutoff = time.monotonic() - self.idle_timeout
+        keep = []
+        expired = 0
+        for reader, writer, last_used in self._idle:
+            if last_used < cutoff or reader.at_eof():
+                writer.close()
+                expired += 1
+            else:
+                keep.append((reader, writer, last_used))
+        self._idle = keep
+        self._stats["evicted"] += expired
+        return expired
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        idle, self._idle = self._idle, []
+        for _, writer, _ in idle:
+            writer.close()
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "max_connections": self.max_connections,
+        }
+
+    async def _acquire_slot(self, timeout: float) -> None:
+        if self._slots.locked():
+            self._stats["waits"] += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except TimeoutError:
+            raise TimeoutError(f"no free connection to {self.origin} within {timeout}s") from None
+        self._in_use += 1
+        self._stats["requests"] += 1
+
+    async def _checkout(
+        self, timeout: float
+    ) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        self.evict_idle()
+        if self._idle:
+            reader, writer, _ = self._idle.pop()
+            self._stats["reused"] += 1
+            return reader, writer, True
+        reader, writer = await self._connect(timeout)
+        return reader, writer, False
+
+    async def _connect(self, timeout: float) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        self._stats["created"] += 1
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.scheme == "https" or None),
+            timeout,
+        )
+
+    async def _send(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        method: str,
+        path: str,
+        body: bytes | None,
+        headers: dict[str, str] | None,
+        timeout: float,
+    ) -> AsyncResponse:
+        request_headers = {
+            "Host": f"{self.host}:{self.port}",
+            "Connection": "keep-alive",
+            "Content-Length": str(len(body or b"")),
+            **(headers or {}),
+        }
+        head = f"{method} {path} HTTP/1.1\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in request_headers.items()
+        )
+        writer.write(head.encode("latin-1") + b"\r\n" + (body or b""))
+        await asyncio.wait_for(writer.drain(), timeout)
+
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        if not status_line:
+            raise asyncio.IncompleteReadError(b"", None)
+        parts = status_line.decode("latin-1").split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            raise ValueError(f"malformed status line from {self.origin}: {status_line!r}")
+        response_headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        return AsyncResponse(int(parts[1]), response_headers, reader, timeout)
+
+
+_POOLS: dict[str, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+# asyncio streams belong to one event loop, so async pools are kept per loop.
+_ASYNC_POOLS: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[str, AsyncConnectionPool]
+] = weakref.WeakKeyDictionary()
+
+
+def _origin(endpoint: str) -> tuple[str, str, int]:
+    parts = urlsplit(endpoint)
+    scheme = parts.scheme or "http"
+    port = parts.port or (443 if scheme == "https" else 80)
+    return scheme, parts.hostname or "127.0.0.1", port
+
+
+def get_pool(endpoint: str, max_connections: int = 8, idle_timeout: float = 30.0) -> ConnectionPool:
+    """Return the process-wide pool for the endpoint's origin, creating it on first use."""
+    scheme, host, port = _origin(endpoint)
+    key = f"{scheme}://{host}:{port}"
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                scheme=scheme,
+                host=host,
+                port=port,
+                max_connections=max_connections,
+                idle_timeout=idle_timeout,
+            )
+            _POOLS[key] = pool
+        return pool
+
+
+def get_async_pool(
+    endpoint: str, max_connections: int = 8, idle_timeout: float = 30.0
+) -> AsyncConnectionPool:
+    """Return the running loop's async pool for the endpoint's origin, creating it on first use."""
+    scheme, host, port = _origin(endpoint)
+    key = f"{scheme}://{host}:{port}"
+    with _POOLS_LOCK:
+        pools = _ASYNC_POOLS.setdefault(asyncio.get_running_loop(), {})
+        pool = pools.get(key)
+        if pool is None:
+            pool = AsyncConnectionPool(
+                scheme=scheme,
+                host=host,
+                port=port,
+                max_connections=max_connections,
+                idle_timeout=idle_timeout,
+            )
+            pools[key] = pool
+        return pool
+
+
+def async_pool_stats() -> dict[str, dict]:
+    """Return stats for every async pool keyed by origin, summed across event loops."""
+    with _POOLS_LOCK:
+        pools = [pool for per_loop in _ASYNC_POOLS.values() for pool in per_loop.values()]
+    totals: dict[str, dict] = {}
+    for pool in pools:
+        merged = totals.setdefault(pool.origin, {})
+        for name, value in pool.stats().items():
+            merged[name] = merged.get(name, 0) + value
+    return totals
+
+
+def pool_stats() -> dict[str, dict]:
+    """Return stats for every shared pool keyed by origin."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    return {pool.origin: pool.stats() for pool in pools}
+
+
+def close_pools() -> None:
+    """Close and forget every shared pool."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+def close_async_pools() -> None:
+    """Close and forget the async pools of the running event loop."""
+    with _POOLS_LOCK:
+        pools = list(_ASYNC_POOLS.pop(asyncio.get_running_loop(), {}).values())
+    for pool in pools:
+        pool.close()
@@ -1,7 +1,7 @@
 import unittest
 from unittest.mock import patch
 
-from cody.api_ui import render_chat_page
+from cody.api_ui import format_sse_events, format_sse_events_async, render_chat_page
 
 
 class APIUITests(unittest.TestCase):
@@ -12,6 +12,45 @@ class APIUITests(unittest.TestCase):
         self.assertIn("fetch('/chat'", html)
         self.assertIn('Cody Chat', html)
 
+    def test_format_sse_events_tags_each_event_with_request_id(self):
+        events = [
+            {"type": "delta", "delta": "hi"},
+            {"type": "final", "reply": "hi", "provider": "ollama-cloud"},
+        ]
+
+        encoded = list(format_sse_events(iter(events), "req-1"))
+
+        self.assertEqual(
+            encoded[0],
+            'event: delta\ndata: {"request_id": "req-1", "type": "delta", "delta": "hi"}\n\n',
+        )
+        self.assertTrue(encoded[1].startswith("event: final\n"))
+        self.assertIn('"provider": "ollama-cloud"', encoded[1])
+
+    def test_format_sse_events_async_matches_sync_encoding(self):
+        import asyncio
+
+        events = [
+            {"type": "delta", "delta": "hi"},
+            {"type": "final", "reply": "hi", "provider": "cache"},
+        ]
+
+        async def source():
+            for event in events:
+                yield event
+
+        async def collect():
+            return [chunk async for chunk in format_sse_events_async(source(), "req-1")]
+
+        self.assertEqual(asyncio.run(collect()), list(format_sse_events(iter(events), "req-1")))
+
+    def test_batch_endpoint_is_registered(self):
+        from cody.api_ui import app
+
+        batch_routes = [r for r in app.routes if r.path == '/batch']
+        self.assertEqual(len(batch_routes), 1)
+        self.assertEqual(batch_routes[0].methods, {'POST'})
+
     @patch('cody.api_ui.sandbox.run_python_in_docker')
     def test_run_endpoint_exists_and_calls_sandbox(self, mock_run):
         """Test that the /run endpoint is defined and calls sandbox."""
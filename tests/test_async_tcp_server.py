@@ -0,0 +1,320 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from cody import framing
+from cody.async_tcp_server import AsyncTCPServer, handle_command_async, handle_command_stream_async
+from cody.singleflight import AsyncSingleFlight
+
+
+class SlowAsyncStubRouter:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    async def route_chat(
+        self, message: str, request_id=None, recipient="unknown", conversation_id=None
+    ) -> dict:
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return {"reply": message, "provider": "ollama-cloud"}
+
+    def metrics(self) -> dict:
+        return {}
+
+
+class SyncStubRouter:
+    """The sync router an ``AsyncStubRouter`` wraps; records which thread served it."""
+
+    def __init__(self):
+        self.threads = []
+
+    def metrics(self) -> dict:
+        self.threads.append(threading.get_ident())
+        return {"providers": {"ollama-cloud": {"state": "closed"}}}
+
+    def pending_result(self, request_id: str, result_token: str) -> dict:
+        self.threads.append(threading.get_ident())
+        return {"request_id": request_id, "status": "pending"}
+
+
+class AsyncStubRouter:
+    def __init__(self, reply: str = "hi", provider: str = "ollama-cloud"):
+        self.reply = reply
+        self.provider = provider
+        self.calls = []
+        self.router = SyncStubRouter()
+        self.flights = AsyncSingleFlight()
+
+    async def route_chat(
+        self, message: str, request_id=None, recipient="unknown", conversation_id=None
+    ) -> dict:
+        self.calls.append({"message": message, "request_id": request_id, "recipient": recipient})
+        return {"reply": self.reply, "provider": self.provider}
+
+    async def route_chat_stream(
+        self, message: str, request_id=None, recipient="unknown", conversation_id=None
+    ):
+        self.calls.append({"message": message, "request_id": request_id, "recipient": recipient})
+        for token in self.reply.split():
+            yield {"type": "delta", "delta": token}
+        yield {"type": "final", "reply": self.reply, "provider": self.provider}
+
+
+class AsyncTCPServerTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.router = AsyncStubRouter(reply="hello world")
+        self.server = AsyncTCPServer(
+            router=self.router, port=0, max_connections=50, max_line_bytes=256
+        )
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def _connect(self):
+        return await asyncio.open_connection("127.0.0.1", self.server.port)
+
+    async def _request(self, line: bytes) -> dict:
+        reader, writer = await self._connect()
+        writer.write(line)
+        response = json.loads(await reader.readline())
+        writer.close()
+        return response
+
+    async def test_ping_command(self):
+        self.assertEqual(
+            await self._request(b'{"cmd":"ping","request_id":"req-p"}\n'),
+            {"ok": True, "reply": "pong", "request_id": "req-p"},
+        )
+
+    async def test_chat_uses_shared_router(self):
+        first = await self._request(b'{"cmd":"chat","message":"a","request_id":"req-1"}\n')
+        second = await self._request(b'{"cmd":"chat","message":"b"}\n')
+
+        self.assertEqual(
+            first,
+            {"ok": True, "reply": "hello world", "provider": "ollama-cloud", "request_id": "req-1"},
+        )
+        self.assertTrue(second["ok"])
+        self.assertEqual([call["message"] for call in self.router.calls], ["a", "b"])
+        self.assertEqual(self.router.calls[0]["request_id"], "req-1")
+        self.assertEqual(self.router.calls[0]["recipient"], "127.0.0.1")
+
+    async def test_provider_status_uses_router_metrics(self):
+        response = await self._request(b'{"cmd":"get_provider_status"}\n')
+        self.assertEqual(response["router"]["providers"]["ollama-cloud"]["state"], "closed")
+        self.assertIn("async_coalescing", response["router"])
+
+    async def test_store_lookups_run_off_the_event_loop(self):
+        payload = {"cmd": "get_result", "request_id": "r1", "result_token": "t1"}
+
+        response = await handle_command_async(payload, self.router)
+        await handle_command_async({"cmd": "get_phase_1_status"}, self.router)
+
+        self.assertEqual(response, {"ok": True, "request_id": "r1", "status": "pending"})
+        self.assertEqual(len(self.router.router.threads), 2)
+        self.assertNotIn(threading.get_ident(), self.router.router.threads)
+
+    async def test_connection_serves_several_lines_and_skips_blank_ones(self):
+        reader, writer = await self._connect()
+        writer.write(b'\n{"cmd":"ping"\n{"cmd":"ping"}\n')
+
+        self.assertEqual(json.loads(await reader.readline())["error"], "invalid_json")
+        self.assertEqual(json.loads(await reader.readline())["reply"], "pong")
+        writer.close()
+
+    async def test_streaming_chat_emits_delta_frames(self):
+        reader, writer = await self._connect()
+        writer.write(b'{"cmd":"chat","message":"x","stream":true,"request_id":"req-s"}\n')
+
+        frames = [json.loads(await reader.readline()) for _ in range(3)]
+        writer.close()
+
+        self.assertEqual([frame["type"] for frame in frames], ["delta", "delta", "final"])
+        self.assertTrue(all(frame["request_id"] == "req-s" for frame in frames))
+
+    async def test_overlong_line_is_rejected_and_connection_closed(self):
+        reader, writer = await self._connect()
+        writer.write(b'{"cmd":"chat","message":"' + b"x" * 1024 + b'"}\n')
+
+        self.assertEqual(json.loads(await reader.readline())["error"], "line_too_long")
+        self.assertEqual(await reader.read(), b"")
+        writer.close()
+
+    async def test_idle_connections_are_held_without_threads_up_to_the_cap(self):
+        connections = [await self._connect() for _ in range(50)]
+        extra_reader, extra_writer = await self._connect()
+
+        self.assertEqual(json.loads(await extra_reader.readline())["error"], "server_busy")
+        reader, writer = connections[-1]
+        writer.write(b'{"cmd":"ping"}\n')
+        self.assertEqual(json.loads(await reader.readline())["reply"], "pong")
+        stats = self.server.stats()
+        self.assertEqual(stats["open"], 50)
+        self.assertEqual(stats["rejected"], 1)
+
+        for _, conn_writer in connections:
+            conn_writer.close()
+        extra_writer.close()
+
+
+class AsyncPipeliningTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.router = SlowAsyncStubRouter(delay=0.2)
+        self.server = AsyncTCPServer(router=self.router, port=0, max_in_flight=2)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def _exchange(self, lines: list[bytes], expected: int) -> list[dict]:
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        writer.write(b"".join(lines))
+        responses = [json.loads(await reader.readline()) for _ in range(expected)]
+        writer.close()
+        return responses
+
+    async def test_ping_is_answered_before_earlier_slow_chat(self):
+        responses = await self._exchange(
+            [
+                b'{"cmd":"chat","message":"slow","request_id":"chat-1"}\n',
+                b'{"cmd":"ping","request_id":"ping-1"}\n',
+            ],
+            expected=2,
+        )
+
+        self.assertEqual([r["request_id"] for r in responses], ["ping-1", "chat-1"])
+
+    async def test_in_flight_commands_are_capped_per_connection(self):
+        lines = [
+            f'{{"cmd":"chat","message":"m{i}","request_id":"c{i}"}}\n'.encode() for i in range(4)
+        ]
+
+        responses = await self._exchange(lines, expected=4)
+
+        self.assertEqual({r["request_id"] for r in responses}, {"c0", "c1", "c2", "c3"})
+        self.assertEqual(self.router.peak, 2)
+
+    async def test_half_closed_client_still_gets_in_flight_replies(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        writer.write(b'{"cmd":"chat","message":"bye","request_id":"c-last"}\n')
+        writer.write_eof()
+
+        self.assertEqual(json.loads(await reader.readline())["request_id"], "c-last")
+        writer.close()
+
+
+class AsyncUnixSocketTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cody.sock")
+        self.router = AsyncStubRouter(reply="over unix")
+        self.server = AsyncTCPServer(router=self.router, tcp_enabled=False, unix_path=self.path)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        self.tmp.cleanup()
+
+    async def test_unix_socket_only_server(self):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        writer.write(b'{"cmd":"chat","message":"x","request_id":"u1"}\n')
+        response = json.loads(await reader.readline())
+        writer.close()
+
+        self.assertEqual(response["reply"], "over unix")
+        self.assertEqual(self.router.calls[0]["recipient"], "unix-client")
+        self.assertEqual(self.server.port, 8888)  # TCP was never bound
+
+    async def test_close_removes_socket_file(self):
+        await self.server.close()
+
+        self.assertFalse(os.path.exists(self.path))
+
+
+class AsyncBinaryFramingTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = AsyncTCPServer(router=AsyncStubRouter(reply="framed reply"), port=0)
+        await self.server.start()
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        await self.server.close()
+
+    async def test_hello_switches_connection_to_binary_frames(self):
+        self.writer.write(b'{"cmd":"hello","encoding":["msgpack","json"],"request_id":"h"}\n')
+        response = json.loads(await self.reader.readline())
+        self.assertTrue(response["ok"])
+
+        codec = framing.FrameCodec(
+            encoding=response["encoding"], compression=response["compression"]
+        )
+        self.writer.write(
+            codec.encode({"cmd": "chat", "message": "x", "stream": True, "request_id": "s"})
+        )
+        frames = [await codec.read_frame_async(self.reader) for _ in range(3)]
+
+        self.assertEqual([frame["type"] for frame in frames], ["delta", "delta", "final"])
+        self.assertTrue(all(frame["request_id"] == "s" for frame in frames))
+
+    async def test_refused_hello_keeps_ndjson(self):
+        self.writer.write(b'{"cmd":"hello","encoding":"cbor"}\n{"cmd":"ping"}\n')
+
+        self.assertEqual(json.loads(await self.reader.readline())["error"], "unsupported_encoding")
+        self.assertEqual(json.loads(await self.reader.readline())["reply"], "pong")
+
+    async def test_oversized_frame_closes_connection(self):
+        self.writer.write(b'{"cmd":"hello"}\n')
+        await self.reader.readline()
+
+        self.writer.write(framing.HEADER.pack(self.server.max_line_bytes + 1, 0))
+
+        codec = framing.FrameCodec()
+        self.assertEqual((await codec.read_frame_async(self.reader))["error"], "invalid_frame")
+        self.assertIsNone(await codec.read_frame_async(self.reader))
+
+
+class HandleCommandStreamAsyncTests(unittest.IsolatedAsyncioTestCase):
+    async def test_batch_runs_items_concurrently_in_order(self):
+        router = SlowAsyncStubRouter(delay=0.05)
+        payload = {"cmd": "batch", "items": [{"cmd": "chat", "message": f"m{i}"} for i in range(4)]}
+
+        frames = [
+            frame async for frame in handle_command_stream_async(payload, router, request_id="b1")
+        ]
+
+        results = frames[0]["results"]
+        self.assertEqual([r["reply"] for r in results], ["m0", "m1", "m2", "m3"])
+        self.assertEqual(router.peak, 4)
+
+    async def test_streamed_batch_ends_with_summary(self):
+        payload = {"cmd": "batch", "stream": True, "items": [{"cmd": "ping"}, 7]}
+
+        frames = [
+            frame
+            async for frame in handle_command_stream_async(
+                payload, AsyncStubRouter(), request_id="b2"
+            )
+        ]
+
+        self.assertEqual(
+            frames[-1], {"ok": True, "request_id": "b2", "type": "final", "count": 2, "failed": 1}
+        )
+
+    async def test_non_streaming_commands_yield_single_response(self):
+        frames = [
+            frame async for frame in handle_command_stream_async({"cmd": "ping"}, AsyncStubRouter())
+        ]
+        self.assertEqual(frames, [{"ok": True, "reply": "pong"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
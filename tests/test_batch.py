@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from cody import batch
+
+
+class BatchTests(unittest.TestCase):
+    def test_results_come_back_in_item_order(self):
+        def execute(item, index):
+            time.sleep(item["delay"])
+            return {"ok": True, "value": index}
+
+        items = [{"delay": 0.05}, {"delay": 0.0}, {"delay": 0.02}]
+
+        results = batch.run_batch(items, execute, max_parallelism=3)
+
+        self.assertEqual([result["value"] for result in results], [0, 1, 2])
+
+    def test_iter_batch_yields_in_completion_order(self):
+        def execute(item, index):
+            time.sleep(item["delay"])
+            return {"ok": True}
+
+        items = [{"delay": 0.1}, {"delay": 0.0}]
+
+        order = [index for index, _ in batch.iter_batch(items, execute, max_parallelism=2)]
+
+        self.assertEqual(order, [1, 0])
+
+    def test_parallelism_is_capped(self):
+        lock = threading.Lock()
+        active = [0]
+        peak = [0]
+
+        def execute(item, index):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return {"ok": True}
+
+        batch.run_batch([{}] * 8, execute, max_parallelism=3)
+
+        self.assertEqual(peak[0], 3)
+
+    def test_failing_and_invalid_items_do_not_affect_others(self):
+        def execute(item, index):
+            if item.get("boom"):
+                raise RuntimeError("exploded")
+            return {"ok": True}
+
+        results = batch.run_batch(
+            [{"boom": True}, {}, "not-a-dict", {"cmd": "batch"}], execute, max_parallelism=2
+        )
+
+        self.assertEqual(
+            results[0], {"ok": False, "error": "internal_error", "message": "exploded"}
+        )
+        self.assertEqual(results[1], {"ok": True})
+        self.assertEqual(results[2]["error"], "invalid_message_type")
+        self.assertEqual(results[3]["error"], "nested_batch")
+        self.assertEqual(batch.summarize(results)["failed"], 3)
+
+    def test_validate_batch(self):
+        self.assertEqual(batch.validate_batch({"items": []}, 10)["error"], "invalid_batch")
+        self.assertEqual(batch.validate_batch({"items": "x"}, 10)["error"], "invalid_batch")
+        self.assertEqual(batch.validate_batch({"items": [{}] * 3}, 2)["error"], "batch_too_large")
+        self.assertIsNone(batch.validate_batch({"items": [{}]}, 2))
+
+    def test_item_request_id_prefers_the_items_own_id(self):
+        self.assertEqual(batch.item_request_id({"request_id": "mine"}, "b1", 0), "mine")
+        self.assertEqual(batch.item_request_id({}, "b1", 2), "b1.2")
+
+
+class AsyncBatchTests(unittest.IsolatedAsyncioTestCase):
+    async def test_async_batch_orders_results_and_caps_parallelism(self):
+        active = 0
+        peak = 0
+
+        async def execute(item, index):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01 * (5 - index))
+            active -= 1
+            if index == 2:
+                raise ValueError("bad item")
+            return {"ok": True, "value": index}
+
+        results = await batch.run_batch_async([{}] * 5, execute, max_parallelism=2)
+
+        self.assertEqual(peak, 2)
+        self.assertEqual([r.get("value") for r in results], [0, 1, None, 3, 4])
+        self.assertEqual(results[2]["error"], "internal_error")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from cody.cache import ResponseCache, cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CacheKeyTests(unittest.TestCase):
+    def test_key_ignores_whitespace_differences(self):
+        self.assertEqual(
+            cache_key("m", "sys", "  explain   decorators\n"),
+            cache_key("m", "sys", "explain decorators"),
+        )
+
+    def test_key_covers_model_and_system_prompt(self):
+        base = cache_key("m", "sys", "hello")
+        self.assertNotEqual(base, cache_key("other", "sys", "hello"))
+        self.assertNotEqual(base, cache_key("m", "other", "hello"))
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def test_hit_after_put(self):
+        cache = ResponseCache()
+        cache.put("k", "reply", "ollama-cloud")
+
+        self.assertEqual(cache.get("k"), {"reply": "reply", "provider": "ollama-cloud"})
+        self.assertIsNone(cache.get("missing"))
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = ResponseCache(ttl_seconds=10, clock=clock)
+        cache.put("k", "reply", "ollama-cloud")
+
+        clock.now += 11
+
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.stats()["expired"], 1)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_lru_eviction_respects_byte_budget(self):
+        cache = ResponseCache(max_bytes=600)
+        cache.put("a", "x" * 100, "p")
+        cache.put("b", "x" * 100, "p")
+        cache.get("a")
+        cache.put("c", "x" * 100, "p")
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertLessEqual(cache.stats()["bytes"], 600)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_oversized_entry_is_not_cached(self):
+        cache = ResponseCache(max_bytes=200)
+        cache.put("k", "x" * 500, "p")
+
+        self.assertIsNone(cache.get("k"))
+
+    def test_disk_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "cache" / "responses.sqlite"
+            first = ResponseCache(path=path)
+            first.put("k", "persisted", "ollama-local")
+            first.close()
+
+            second = ResponseCache(path=path)
+            self.assertEqual(second.get("k"), {"reply": "persisted", "provider": "ollama-local"})
+            self.assertEqual(second.stats()["disk_hits"], 1)
+            self.assertEqual(second.get("k")["reply"], "persisted")
+            self.assertEqual(second.stats()["hits"], 1)
+            second.close()
+
+    def test_disk_tier_respects_ttl(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            clock = FakeClock()
+            path = Path(tmp) / "responses.sqlite"
+            first = ResponseCache(path=path, ttl_seconds=5, clock=clock)
+            first.put("k", "persisted", "ollama-local")
+            first.close()
+
+            clock.now += 6
+            second = ResponseCache(path=path, ttl_seconds=5, clock=clock)
+            self.assertIsNone(second.get("k"))
+            second.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from cody.calc import CalcLimits, evaluate, evaluate_print_call
+
+
+class EvaluateTests(unittest.TestCase):
+    def test_evaluates_arithmetic_with_precedence(self):
+        self.assertEqual(evaluate("2 + 2 * 10"), 22)
+        self.assertEqual(evaluate("(1 + 2) * -3"), -9)
+        self.assertEqual(evaluate("7 // 2 + 7 % 2"), 4)
+        self.assertEqual(evaluate("2 ** 10"), 1024)
+
+    def test_true_division_matches_python_print_output(self):
+        self.assertEqual(str(evaluate("100 / 4")), "25.0")
+        self.assertEqual(str(evaluate("1.5 * 2")), "3.0")
+
+    def test_declines_names_calls_and_non_numeric_literals(self):
+        self.assertIsNone(evaluate("__import__('os')"))
+        self.assertIsNone(evaluate("x + 1"))
+        self.assertIsNone(evaluate("'a' * 3"))
+        self.assertIsNone(evaluate("True + 1"))
+        self.assertIsNone(evaluate("[1][0]"))
+
+    def test_declines_division_by_zero(self):
+        self.assertIsNone(evaluate("1 / 0"))
+        self.assertIsNone(evaluate("1 % 0"))
+
+    def test_caps_exponent_and_result_size(self):
+        self.assertIsNone(evaluate("2 ** 100000"))
+        self.assertIsNone(evaluate("9 ** 9 ** 9"))
+        self.assertIsNone(evaluate("10.0 ** 400"))
+        self.assertIsNone(evaluate("2 ** 8", CalcLimits(max_exponent=4)))
+
+    def test_caps_operand_size(self):
+        huge_literal = "1" * 100
+        self.assertIsNone(evaluate(f"{huge_literal} + 1"))
+
+    def test_caps_evaluation_steps(self):
+        expression = " + ".join(["1"] * 40)
+        self.assertEqual(evaluate(expression), 40)
+        self.assertIsNone(evaluate(expression, CalcLimits(max_steps=10)))
+
+    def test_declines_syntax_errors(self):
+        self.assertIsNone(evaluate("2 +"))
+
+
+class EvaluatePrintCallTests(unittest.TestCase):
+    def test_evaluates_single_argument_print(self):
+        self.assertEqual(evaluate_print_call("print(2 + 2 * 10)"), 22)
+
+    def test_declines_other_calls(self):
+        self.assertIsNone(evaluate_print_call("exec('1 + 1')"))
+        self.assertIsNone(evaluate_print_call("print(1, 2)"))
+        self.assertIsNone(evaluate_print_call("print('hello')"))
+
+
+if __name__ == "__main__":
+    unittest.main()
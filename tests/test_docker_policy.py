@@ -1,7 +1,7 @@
 import unittest
 from unittest.mock import patch, MagicMock
 
-from cody.sandbox import DockerPolicy, run_python_in_docker
+from cody.sandbox import ContainerPool, DockerPolicy, coalescing_stats, run_python_in_docker
 
 
 class DockerPolicyTests(unittest.TestCase):
@@ -68,5 +68,203 @@ class RunPythonInDockerTests(unittest.TestCase):
         self.assertEqual(result["error"], "docker_not_available")
 
 
+class FakeDocker:
+    """Minimal stand-in for the docker CLI used by the warm pool."""
+
+    def __init__(self):
+        self.commands = []
+        self.counter = 0
+        self.stopped = set()
+
+    def __call__(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        if cmd[1] == "run" and "--detach" in cmd:
+            self.counter += 1
+            return MagicMock(stdout=f"container-{self.counter}\n", stderr="", returncode=0)
+        if cmd[1] == "exec":
+            return MagicMock(stdout="pooled\n", stderr="", returncode=0)
+        if cmd[1] == "run":
+            return MagicMock(stdout="cold\n", stderr="", returncode=0)
+        if cmd[1] == "inspect":
+            if cmd[-1] in self.stopped:
+                return MagicMock(stdout="false\n", stderr="", returncode=0)
+            return MagicMock(stdout="true\n", stderr="", returncode=0)
+        return MagicMock(stdout="", stderr="", returncode=0)
+
+    def subcommands(self, name):
+        return [cmd for cmd in self.commands if cmd[1] == name]
+
+
+class ContainerPoolTests(unittest.TestCase):
+    @patch('cody.sandbox.subprocess.run')
+    def test_pooled_run_execs_into_idle_container_and_recycles_it(self, mock_run):
+        docker = FakeDocker()
+        mock_run.side_effect = docker
+        pool = ContainerPool(size=1)
+        pool.fill()
+
+        result = run_python_in_docker("print('hi')", pool=pool)
+
+        self.assertTrue(result["ok"])
+        self.assertEqual(result["stdout"], "pooled\n")
+        self.assertEqual(docker.subcommands("exec")[0][:3], ["docker", "exec", "container-1"])
+        self.assertEqual(docker.subcommands("rm")[0][-1], "container-1")
+        stats = pool.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 0)
+        self.assertEqual(stats["recycled"], 1)
+
+    @patch('cody.sandbox.subprocess.run')
+    def test_pooled_containers_use_policy_flags(self, mock_run):
+        docker = FakeDocker()
+        mock_run.side_effect = docker
+        pool = ContainerPool(size=1)
+        pool.fill()
+
+        start_cmd = docker.subcommands("run")[0]
+        for flag in DockerPolicy().to_docker_flags():
+            self.assertIn(flag, start_cmd)
+        self.assertEqual(start_cmd[-2:], ["sleep", "infinity"])
+
+    @patch('cody.sandbox.subprocess.run')
+    def test_empty_pool_counts_miss_and_falls_back_to_cold_run(self, mock_run):
+        docker = FakeDocker()
+        mock_run.side_effect = docker
+        pool = ContainerPool(size=1)
+
+        result = run_python_in_docker("print('hi')", pool=pool)
+
+        self.assertEqual(result["stdout"], "cold\n")
+        self.assertEqual(pool.stats()["misses"], 1)
+        self.assertEqual(pool.stats()["hits"], 0)
+
+    @patch('cody.sandbox.subprocess.run')
+    def test_stale_container_falls_back_to_cold_run(self, mock_run):
+        docker = FakeDocker()
+
+        def stale_exec(cmd, **kwargs):
+            if cmd[1] == "exec":
+                docker.commands.append(cmd)
+                docker.stopped.add(cmd[2])
+                return MagicMock(
+                    stdout="",
+                    stderr="Error response from daemon: container container-1 is not running\n",
+                    returncode=1,
+                )
+            return docker(cmd, **kwargs)
+
+        mock_run.side_effect = stale_exec
+        pool = ContainerPool(size=1)
+        pool.fill()
+
+        result = run_python_in_docker("print('hi')", pool=pool)
+
+        self.assertEqual(result["stdout"], "cold\n")
+        self.assertEqual(pool.stats()["stale"], 1)
+
+    @patch('cody.sandbox.subprocess.run')
+    def test_failing_code_in_a_running_container_is_not_retried(self, mock_run):
+        docker = FakeDocker()
+
+        def failing_exec(cmd, **kwargs):
+            if cmd[1] == "exec":
+                docker.commands.append(cmd)
+                return MagicMock(stdout="", stderr="RuntimeError: No such container", returncode=1)
+            return docker(cmd, **kwargs)
+
+        mock_run.side_effect = failing_exec
+        pool = ContainerPool(size=1)
+        pool.fill()
+
+        result = run_python_in_docker("raise RuntimeError('No such container')", pool=pool)
+
+        self.assertEqual(result["exit_code"], 1)
+        self.assertEqual(docker.subcommands("inspect"), [])
+        self.assertEqual(len(docker.subcommands("run")), 1)
+        self.assertEqual(pool.stats()["stale"], 0)
+
+    @patch('cody.sandbox.subprocess.run')
+    def test_code_that_kills_its_container_is_not_rerun(self, mock_run):
+        docker = FakeDocker()
+
+        def killing_exec(cmd, **kwargs):
+            if cmd[1] == "exec":
+                docker.commands.append(cmd)
+                docker.stopped.add(cmd[2])
+                return MagicMock(stdout="", stderr="", returncode=137)
+            return docker(cmd, **kwargs)
+
+        mock_run.side_effect = killing_exec
+        pool = ContainerPool(size=1)
+        pool.fill()
+
+        result = run_python_in_docker("import os, signal; os.kill(1, signal.SIGKILL)", pool=pool)
+
+        self.assertEqual(result["exit_code"], 137)
+        self.assertEqual(len(docker.subcommands("run")), 1)  # only the pool's own container
+        self.assertEqual(pool.stats()["stale"], 0)
+
+    @patch('cody.sandbox.subprocess.run')
+    def test_background_thread_refills_after_each_job(self, mock_run):
+        docker = FakeDocker()
+        mock_run.side_effect = docker
+        pool = ContainerPool(size=1)
+        pool.start()
+        try:
+            self._wait_for(lambda: pool.stats()["idle"] == 1)
+            run_python_in_docker("print('hi')", pool=pool)
+            self._wait_for(lambda: pool.stats()["idle"] == 1 and pool.stats()["recycled"] == 1)
+        finally:
+            pool.close()
+
+        self.assertEqual(pool.stats()["started"], 2)
+
+    def _wait_for(self, predicate, timeout=2.0):
+        import time
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                self.fail("condition not reached before timeout")
+            time.sleep(0.01)
+
+    @patch('cody.sandbox.subprocess.run')
+    def test_pool_start_failure_is_counted(self, mock_run):
+        mock_run.side_effect = FileNotFoundError()
+        pool = ContainerPool(size=2)
+
+        self.assertEqual(pool.fill(), 0)
+        self.assertEqual(pool.stats()["start_failures"], 1)
+        self.assertEqual(pool.stats()["idle"], 0)
+
+
+class RunCoalescingTests(unittest.TestCase):
+    @patch('cody.sandbox.subprocess.run')
+    def test_identical_concurrent_runs_share_one_container(self, mock_run):
+        import threading
+        import time
+
+        def slow_run(cmd, **kwargs):
+            time.sleep(0.2)
+            return MagicMock(stdout="42\n", stderr="", returncode=0)
+
+        mock_run.side_effect = slow_run
+        before = coalescing_stats()["shared"]
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(run_python_in_docker("print(6 * 7)")))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertEqual([r["stdout"] for r in results], ["42\n"] * 3)
+        self.assertEqual(coalescing_stats()["shared"] - before, 2)
+        results[0]["stdout"] = "mutated"
+        self.assertEqual(results[1]["stdout"], "42\n")
+
+
 if __name__ == "__main__":
     unittest.main()
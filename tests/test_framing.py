@@ -0,0 +1,112 @@
+import io
+import struct
+import unittest
+import zlib
+
+from cody import framing
+
+
+class FrameCodecTests(unittest.TestCase):
+    def test_json_round_trip_without_compression(self):
+        codec = framing.FrameCodec()
+        frame = codec.encode({"cmd": "ping"})
+
+        self.assertEqual(frame[:5], framing.HEADER.pack(len(frame) - 5, 0))
+        self.assertEqual(codec.read_frame(io.BytesIO(frame)), {"cmd": "ping"})
+
+    def test_small_payloads_are_not_compressed(self):
+        codec = framing.FrameCodec(compression="deflate", min_compress_bytes=512)
+        frame = codec.encode({"reply": "short"})
+
+        self.assertEqual(frame[4], 0)
+
+    def test_large_payload_is_compressed_and_round_trips(self):
+        codec = framing.FrameCodec(compression="deflate")
+        body = {"stdout": "line of output\n" * 200}
+        frame = codec.encode(body)
+
+        self.assertEqual(frame[4], framing.FLAG_COMPRESSED)
+        self.assertLess(len(frame), len(framing.FrameCodec().encode(body)))
+        self.assertEqual(codec.read_frame(io.BytesIO(frame)), body)
+
+    def test_read_frame_returns_none_at_end_of_stream(self):
+        self.assertIsNone(framing.FrameCodec().read_frame(io.BytesIO(b"")))
+
+    def test_truncated_frame_is_an_error(self):
+        frame = framing.FrameCodec().encode({"cmd": "ping"})
+
+        with self.assertRaises(framing.FramingError):
+            framing.FrameCodec().read_frame(io.BytesIO(frame[:3]))
+        with self.assertRaises(framing.FramingError):
+            framing.FrameCodec().read_frame(io.BytesIO(frame[:-1]))
+
+    def test_oversized_frame_header_is_rejected(self):
+        codec = framing.FrameCodec(max_frame_bytes=64)
+        header = framing.HEADER.pack(65, 0)
+
+        with self.assertRaises(framing.FramingError):
+            codec.read_frame(io.BytesIO(header + b"x" * 65))
+
+    def test_decompression_bomb_is_rejected(self):
+        codec = framing.FrameCodec(compression="deflate", max_frame_bytes=1024)
+        bomb = zlib.compress(b"0" * 100_000)
+        frame = struct.pack("!IB", len(bomb), framing.FLAG_COMPRESSED) + bomb
+
+        with self.assertRaises(framing.FramingError):
+            codec.read_frame(io.BytesIO(frame))
+
+    def test_undecodable_payload_is_an_error(self):
+        frame = framing.HEADER.pack(3, 0) + b"{x}"
+
+        with self.assertRaises(framing.FramingError):
+            framing.FrameCodec().read_frame(io.BytesIO(frame))
+
+    @unittest.skipUnless(framing.msgpack is not None, "msgpack not installed")
+    def test_msgpack_round_trip(self):
+        codec = framing.FrameCodec(encoding="msgpack")
+        body = {"ok": True, "stdout": "x", "exit_code": 0}
+
+        self.assertEqual(codec.read_frame(io.BytesIO(codec.encode(body))), body)
+
+    @unittest.skipUnless(framing.zstandard is not None, "zstandard not installed")
+    def test_zstd_round_trip_and_bomb_rejection(self):
+        codec = framing.FrameCodec(compression="zstd", max_frame_bytes=4096)
+        body = {"reply": "token " * 500}
+
+        self.assertEqual(codec.read_frame(io.BytesIO(codec.encode(body))), body)
+        bomb = framing.zstandard.ZstdCompressor().compress(b"0" * 100_000)
+        with self.assertRaises(framing.FramingError):
+            codec.decode(framing.FLAG_COMPRESSED, bomb)
+
+
+class NegotiateTests(unittest.TestCase):
+    def test_defaults_to_json_without_compression(self):
+        codec, response = framing.negotiate({"cmd": "hello"})
+
+        self.assertEqual(
+            response, {"ok": True, "framing": "binary", "encoding": "json", "compression": "none"}
+        )
+        self.assertEqual(codec.describe(), {"encoding": "json", "compression": "none"})
+
+    def test_first_supported_preference_wins(self):
+        codec, response = framing.negotiate(
+            {"encoding": ["cbor", "json"], "compression": ["brotli", "deflate"]}
+        )
+
+        self.assertEqual((response["encoding"], response["compression"]), ("json", "deflate"))
+        self.assertEqual(codec.compression, "deflate")
+
+    def test_unsupported_options_are_refused_with_alternatives(self):
+        codec, response = framing.negotiate({"encoding": "cbor"})
+
+        self.assertIsNone(codec)
+        self.assertEqual(response["error"], "unsupported_encoding")
+        self.assertIn("json", response["encodings"])
+
+        codec, response = framing.negotiate({"compression": ["brotli"]})
+        self.assertIsNone(codec)
+        self.assertEqual(response["error"], "unsupported_compression")
+
+
+if __name__ == "__main__":
+    unittest.main()
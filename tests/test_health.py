@@ -0,0 +1,188 @@
+import unittest
+
+from cody.health import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    AdaptiveTimeout,
+    CircuitBreaker,
+    HealthProbe,
+    LatencyHistogram,
+    LatencyWindow,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            "ollama-cloud", failure_threshold=2, reset_timeout=10.0, clock=self.clock
+        )
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.snapshot()["rejected"], 1)
+        self.assertEqual(self.breaker.snapshot()["trips"], 1)
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_allows_single_trial_after_reset_timeout(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now = 10.0
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_failed_trial_reopens_circuit(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now = 10.0
+        self.breaker.allow_request()
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.snapshot()["retry_in_seconds"], 10.0)
+
+
+class LatencyWindowTests(unittest.TestCase):
+    def test_percentiles_over_rolling_window(self):
+        window = LatencyWindow(size=4)
+        self.assertIsNone(window.percentile(0.9))
+
+        for sample in (10.0, 1.0, 2.0, 3.0, 4.0):
+            window.record(sample)
+
+        self.assertEqual(len(window), 4)
+        self.assertEqual(window.percentile(0.5), 2.0)
+        self.assertEqual(window.percentile(0.9), 4.0)
+        self.assertEqual(window.snapshot()["count"], 4)
+
+
+class LatencyHistogramTests(unittest.TestCase):
+    def test_percentiles_are_within_bucket_precision_at_any_scale(self):
+        histogram = LatencyHistogram()
+        for ms in range(1, 101):
+            histogram.record(ms / 1000)
+        for _ in range(100):
+            histogram.record(40.0)
+
+        self.assertEqual(len(histogram), 200)
+        self.assertAlmostEqual(histogram.percentile(0.25), 0.050, delta=0.050 * 0.05)
+        self.assertAlmostEqual(histogram.percentile(0.99), 40.0, delta=40.0 * 0.05)
+        self.assertGreaterEqual(histogram.percentile(0.99), 40.0)
+
+    def test_samples_age_out_after_two_windows(self):
+        clock = FakeClock()
+        histogram = LatencyHistogram(window_seconds=10, clock=clock)
+        histogram.record(5.0)
+
+        clock.now = 15.0
+        histogram.record(0.1)
+        self.assertEqual(len(histogram), 2)
+
+        clock.now = 26.0
+        self.assertEqual(len(histogram), 1)
+        self.assertLess(histogram.percentile(0.99), 0.11)
+
+        clock.now = 60.0
+        self.assertIsNone(histogram.percentile(0.5))
+
+    def test_snapshot_includes_an_ewma(self):
+        histogram = LatencyHistogram(ewma_alpha=0.5)
+        histogram.record(1.0)
+        histogram.record(3.0)
+
+        self.assertEqual(histogram.snapshot()["ewma"], 2.0)
+
+
+class AdaptiveTimeoutTests(unittest.TestCase):
+    def test_default_applies_until_enough_samples(self):
+        timeouts = AdaptiveTimeout(default=30.0, min_samples=5)
+        for _ in range(4):
+            timeouts.record("m", "generate", 2.0)
+
+        self.assertEqual(timeouts.timeout("m", "generate"), 30.0)
+        timeouts.record("m", "generate", 2.0)
+        self.assertAlmostEqual(timeouts.timeout("m", "generate"), 3.0, delta=0.15)
+
+    def test_timeout_is_clamped_to_floor_and_ceiling(self):
+        timeouts = AdaptiveTimeout(min_samples=1, floor=1.0, ceiling=60.0)
+        timeouts.record("fast", "generate", 0.05)
+        timeouts.record("slow", "generate", 100.0)
+
+        self.assertEqual(timeouts.timeout("fast", "generate"), 1.0)
+        self.assertEqual(timeouts.timeout("slow", "generate"), 60.0)
+
+    def test_recorded_timeouts_raise_the_timeout(self):
+        timeouts = AdaptiveTimeout(min_samples=10, ceiling=100.0)
+        for _ in range(20):
+            timeouts.record("m", "generate", 1.0)
+        before = timeouts.timeout("m", "generate")
+
+        for _ in range(3):
+            timeouts.record("m", "generate", before)
+
+        self.assertGreater(timeouts.timeout("m", "generate"), before)
+
+    def test_snapshot_is_keyed_by_model_and_operation(self):
+        timeouts = AdaptiveTimeout()
+        timeouts.record("m", "generate", 1.0)
+        timeouts.record("m", "embed", 0.1)
+
+        snapshot = timeouts.snapshot()
+
+        self.assertEqual(set(snapshot["m"]), {"generate", "embed"})
+        self.assertEqual(snapshot["m"]["generate"]["timeout"], 30.0)
+
+
+class HealthProbeTests(unittest.TestCase):
+    def test_probe_closes_recovered_circuits_only(self):
+        recovered = CircuitBreaker("ollama-cloud", failure_threshold=1)
+        still_down = CircuitBreaker("ollama-local", failure_threshold=1)
+        healthy = CircuitBreaker("other", failure_threshold=1)
+        recovered.record_failure()
+        still_down.record_failure()
+        probed = []
+
+        def probe_healthy():
+            probed.append("healthy")
+            return True
+
+        def probe_down():
+            raise OSError("connection refused")
+
+        HealthProbe(
+            targets=[(recovered, probe_healthy), (still_down, probe_down), (healthy, probe_healthy)]
+        ).probe_once()
+
+        self.assertEqual(recovered.state, CLOSED)
+        self.assertEqual(still_down.state, OPEN)
+        self.assertEqual(probed, ["healthy"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import socket
+import stat
+import tempfile
+import unittest
+
+from cody import listeners
+
+
+class UnixListenerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cody.sock")
+
+    def tearDown(self):
+        listeners._PREBOUND.clear()
+        self.tmp.cleanup()
+
+    def test_socket_file_gets_requested_permissions(self):
+        sock = listeners.bind_unix_socket(self.path, mode=0o600)
+        self.addCleanup(sock.close)
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_stale_socket_file_is_replaced(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.path)
+        stale.close()  # the file stays behind with nobody listening
+
+        sock = listeners.bind_unix_socket(self.path)
+        self.addCleanup(sock.close)
+        sock.listen(1)
+
+    def test_live_socket_is_not_stolen(self):
+        live = listeners.bind_unix_socket(self.path)
+        self.addCleanup(live.close)
+        live.listen(1)
+
+        with self.assertRaises(OSError):
+            listeners.bind_unix_socket(self.path)
+
+    def test_regular_file_is_never_removed(self):
+        with open(self.path, "w") as handle:
+            handle.write("data")
+
+        with self.assertRaises(FileExistsError):
+            listeners.bind_unix_socket(self.path)
+        self.assertTrue(os.path.isfile(self.path))
+
+    def test_prebound_socket_is_shared_and_not_owned(self):
+        listeners.prebind_unix_socket(self.path)
+
+        sock, owned = listeners.unix_listener(self.path)
+        self.addCleanup(sock.close)
+
+        self.assertFalse(owned)
+        self.assertEqual(sock.getsockname(), self.path)
+
+    def test_remove_unix_socket_deletes_file(self):
+        listeners.bind_unix_socket(self.path).close()
+
+        listeners.remove_unix_socket(self.path)
+        listeners.remove_unix_socket(self.path)  # already gone is fine
+
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,24 @@
+import tempfile
+import threading
+import time
 import unittest
+from pathlib import Path
 
-from cody.llm import LLMRouter, ToolExecutor, extract_code_block
+from cody import semantic_cache
+from cody.cache import ResponseCache
+from cody.llm import (
+    SUMMARY_TOPIC,
+    AsyncLLMRouter,
+    ConversationSummarizer,
+    LLMRouter,
+    ModelManager,
+    PendingReplayer,
+    StreamTruncatedError,
+    ToolExecutor,
+    extract_code_block,
+)
+from cody.memory import MemoryStore
+from cody.prompt import PromptBuilder
 
 
 class StubClient:
@@ -13,6 +31,75 @@ class StubClient:
         return self.response
 
 
+class ProbingStubClient(StubClient):
+    def __init__(self, response=None):
+        super().__init__(response)
+        self.probes = []
+
+    def probe(self, model: str):
+        self.probes.append(model)
+        return self.response is not None
+
+
+class StreamingStubClient(StubClient):
+    def __init__(self, chunks=None, truncated=False):
+        super().__init__(response="".join(chunks) if chunks else None)
+        self.chunks = chunks or []
+        self.truncated = truncated
+
+    def chat_stream(self, message: str, model: str):
+        self.calls.append({"message": message, "model": model})
+        yield from self.chunks
+        if self.truncated:
+            raise StreamTruncatedError(model)
+
+
+class EmbeddingStubClient(StubClient):
+    def __init__(self, embeddings):
+        super().__init__()
+        self.embeddings = embeddings
+        self.embed_calls = []
+
+    def embed(self, text: str, model: str):
+        self.embed_calls.append({"text": text, "model": model})
+        return self.embeddings.get(text)
+
+
+class SlowStubClient(StubClient):
+    def __init__(self, response=None, delay=0.0):
+        super().__init__(response=response)
+        self.delay = delay
+
+    def chat(self, message: str, model: str):
+        import time
+        time.sleep(self.delay)
+        return super().chat(message, model)
+
+
+class AsyncStubClient(StubClient):
+    def __init__(self, response=None, delay=0.0, chunks=None, truncated=False):
+        super().__init__(response=response)
+        self.delay = delay
+        self.chunks = chunks or []
+        self.truncated = truncated
+
+    async def chat(self, message: str, model: str):
+        import asyncio
+        self.calls.append({"message": message, "model": model})
+        await asyncio.sleep(self.delay)
+        return self.response
+
+    async def chat_stream(self, message: str, model: str):
+        self.calls.append({"message": message, "model": model})
+        for chunk in self.chunks:
+            yield chunk
+        if self.truncated:
+            raise StreamTruncatedError(model)
+
+    async def embed(self, text: str, model: str):
+        return None
+
+
 class StubSandbox:
     def __init__(self, result=None):
         self.result = result or {"ok": True, "stdout": "42\n", "stderr": "", "exit_code": 0}
@@ -55,6 +142,22 @@ class ToolExecutorTests(unittest.TestCase):
             self.assertEqual(result["stdout"], "hello\n")
             self.assertEqual(len(sandbox.calls), 1)
             self.assertEqual(sandbox.calls[0]["code"], "print('hello')")
+            self.assertEqual(result["engine"], "docker")
+        finally:
+            cody.llm.sandbox = original_sandbox
+
+    def test_execute_python_answers_arithmetic_in_process(self):
+        sandbox = StubSandbox()
+        executor = ToolExecutor()
+        import cody.llm
+        original_sandbox = cody.llm.sandbox
+        cody.llm.sandbox = sandbox
+
+        try:
+            result = executor.execute_python("print(2 + 2 * 10)", "req-123")
+            self.assertEqual(result["stdout"], "22\n")
+            self.assertEqual(result["engine"], "inprocess")
+            self.assertEqual(sandbox.calls, [])
         finally:
             cody.llm.sandbox = original_sandbox
 
@@ -72,9 +175,31 @@ class LLMRouterTests(unittest.TestCase):
         self.assertEqual(response["provider"], "stub")
         self.assertTrue(response["queued"])
         self.assertEqual(response["queued_messages"], 1)
-        self.assertEqual(router.pending_messages, ["hello"])
+        self.assertEqual(router.pending_messages.messages("unknown"), ["hello"])
+
+    def test_health_probe_closes_a_circuit_only_once_its_model_answers(self):
+        primary, fallback = ProbingStubClient(), ProbingStubClient()
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=primary,
+            fallback_client=fallback,
+            primary_model="big-cloud",
+            fallback_model="small",
+        )
+        for breaker in router.breakers.values():
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure()
+        probe = router.start_health_probe(interval=3600)
+        self.addCleanup(probe.stop)
 
-    def test_queued_messages_are_replayed_and_cleared_when_provider_recovers(self):
+        fallback.response = "up"
+        probe.probe_once()
+
+        self.assertEqual((primary.probes, fallback.probes), (["big-cloud"], ["small"]))
+        self.assertEqual(router.breakers["ollama-cloud"].state, "open")
+        self.assertEqual(router.breakers["ollama-local"].state, "closed")
+
+    def test_queued_messages_are_replayed_separately_when_provider_recovers(self):
         primary_client = StubClient(response=None)
         fallback_client = StubClient(response=None)
         router = LLMRouter(
@@ -83,21 +208,26 @@ class LLMRouterTests(unittest.TestCase):
             fallback_client=fallback_client,
         )
 
-        router.route_chat("first")
-        router.route_chat("second")
+        first = router.route_chat("first", request_id="req-1")
+        second = router.route_chat("second", request_id="req-2")
+        self.assertEqual(first["request_id"], "req-1")
 
         fallback_client.response = "Recovered response"
         response = router.route_chat("third")
 
-        self.assertEqual(response["provider"], "ollama-local")
         self.assertEqual(response["reply"], "Recovered response")
-        self.assertEqual(router.pending_messages, [])
+        self.assertNotIn("first", fallback_client.calls[-1]["message"])
+        self.assertEqual(router.pending_messages.messages("unknown"), ["first", "second"])
 
-        latest_payload = fallback_client.calls[-1]["message"]
-        self.assertIn("Queued messages:", latest_payload)
-        self.assertIn("- first", latest_payload)
-        self.assertIn("- second", latest_payload)
-        self.assertIn("Latest user message:\nthird", latest_payload)
+        replayer = PendingReplayer(router)
+        self.assertEqual(replayer.replay_once(), 1)
+        self.assertEqual(replayer.replay_once(), 1)
+
+        self.assertEqual(len(router.pending_messages), 0)
+        self.assertEqual(
+            router.pending_result("req-1", first["result_token"])["reply"], "Recovered response"
+        )
+        self.assertEqual(router.pending_result("req-2", second["result_token"])["status"], "done")
 
     def test_route_chat_logs_request_lifecycle_with_provider_and_recipient(self):
         router = LLMRouter(
@@ -169,6 +299,29 @@ class LLMRouterTests(unittest.TestCase):
             self.assertEqual(response["provider"], "local-tool")
             self.assertIn("22", response["reply"])
             self.assertEqual(response["executed_code"], "print(2 + 2 * 10)")
+            self.assertEqual(response["engine"], "inprocess")
+            self.assertEqual(sandbox.calls, [])
+        finally:
+            cody.llm.sandbox = original_sandbox
+
+    def test_route_chat_uses_docker_when_evaluator_declines(self):
+        sandbox = StubSandbox(
+            {"ok": True, "stdout": "", "stderr": "ZeroDivisionError", "exit_code": 1}
+        )
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=StubClient(response=None),
+            fallback_client=StubClient(response=None),
+        )
+        import cody.llm
+        original_sandbox = cody.llm.sandbox
+        cody.llm.sandbox = sandbox
+
+        try:
+            response = router.route_chat("What is 1 / 0?", request_id="req-123")
+            self.assertEqual(response["provider"], "local-tool")
+            self.assertEqual(response["engine"], "docker")
+            self.assertEqual(sandbox.calls, [{"code": "print(1 / 0)"}])
         finally:
             cody.llm.sandbox = original_sandbox
 
@@ -184,6 +337,802 @@ class LLMRouterTests(unittest.TestCase):
         self.assertEqual(response["provider"], "ollama-cloud")
         self.assertEqual(response["reply"], "Cloud response")
 
+    def test_open_circuit_skips_primary_without_calling_it(self):
+        primary_client = StubClient(response=None)
+        fallback_client = StubClient(response="local answer")
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=primary_client,
+            fallback_client=fallback_client,
+            breaker_failure_threshold=2,
+        )
+
+        router.route_chat("first")
+        router.route_chat("second")
+        with self.assertLogs("cody.llm", level="INFO") as captured:
+            response = router.route_chat("third", request_id="req-3")
+
+        self.assertEqual(response["provider"], "ollama-local")
+        self.assertEqual(len(primary_client.calls), 2)
+        self.assertIn(
+            "llm.call.skipped request_id=req-3 provider=ollama-cloud", "\n".join(captured.output)
+        )
+        self.assertEqual(router.metrics()["providers"]["ollama-cloud"]["state"], "open")
+        self.assertEqual(router.metrics()["providers"]["ollama-local"]["state"], "closed")
+
+    def test_failed_provider_records_breaker_failure(self):
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=StubClient(response=None),
+            fallback_client=StubClient(response="ok"),
+        )
+
+        router.route_chat("hello")
+
+        health = router.provider_health()
+        self.assertEqual(health["ollama-cloud"]["consecutive_failures"], 1)
+        self.assertEqual(health["ollama-local"]["successes"], 1)
+
+
+class LLMRouterCacheTests(unittest.TestCase):
+    def _router(self, primary):
+        return LLMRouter(
+            intent_client=StubClient(),
+            primary_client=primary,
+            fallback_client=StubClient(response=None),
+            response_cache=ResponseCache(),
+        )
+
+    def test_repeated_prompt_is_served_from_cache(self):
+        primary = StubClient(response="Cloud response")
+        router = self._router(primary)
+
+        first = router.route_chat("Explain decorators")
+        second = router.route_chat("  Explain   decorators ")
+
+        self.assertEqual(first["provider"], "ollama-cloud")
+        self.assertEqual(
+            second,
+            {"reply": "Cloud response", "provider": "cache", "cached_provider": "ollama-cloud"},
+        )
+        self.assertEqual(len(primary.calls), 1)
+        self.assertEqual(router.metrics()["cache"]["hits"], 1)
+
+    def test_stub_replies_are_not_cached(self):
+        primary = StubClient(response=None)
+        router = self._router(primary)
+
+        router.route_chat("Explain decorators")
+        primary.response = "Recovered"
+        response = router.route_chat("Explain decorators")
+
+        self.assertEqual(response["provider"], "ollama-cloud")
+
+    def test_fallback_replies_are_not_cached_as_the_primary_models(self):
+        primary = StubClient(response=None)
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=primary,
+            fallback_client=StubClient(response="Local response"),
+            response_cache=ResponseCache(),
+        )
+
+        first = router.route_chat("Explain decorators")
+        primary.response = "Cloud response"
+        second = router.route_chat("Explain decorators")
+
+        self.assertEqual(first["provider"], "ollama-local")
+        self.assertEqual(second, {"reply": "Cloud response", "provider": "ollama-cloud"})
+        self.assertEqual(router.metrics()["cache"]["hits"], 0)
+
+    def test_streaming_uses_cache(self):
+        primary = StreamingStubClient(["Hel", "lo"])
+        router = self._router(primary)
+
+        list(router.route_chat_stream("Explain decorators"))
+        events = list(router.route_chat_stream("Explain decorators"))
+
+        self.assertEqual(
+            events,
+            [
+                {
+                    "type": "final",
+                    "reply": "Hello",
+                    "provider": "cache",
+                    "cached_provider": "ollama-cloud",
+                }
+            ],
+        )
+
+    def test_metrics_report_disabled_cache(self):
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=StubClient(),
+            fallback_client=StubClient(),
+        )
+
+        self.assertEqual(router.metrics()["cache"], {"enabled": False})
+
+
+@unittest.skipUnless(semantic_cache.is_available(), "numpy not installed")
+class LLMRouterSemanticCacheTests(unittest.TestCase):
+    def test_paraphrase_is_served_from_semantic_cache(self):
+        intent_client = EmbeddingStubClient(
+            {
+                "How do decorators work?": [1.0, 0.0, 0.1],
+                "Explain how decorators work": [0.98, 0.0, 0.12],
+            }
+        )
+        primary = StubClient(response="Decorators wrap functions")
+        router = LLMRouter(
+            intent_client=intent_client,
+            primary_client=primary,
+            fallback_client=StubClient(response=None),
+            semantic_cache=semantic_cache.SemanticCache(capacity=16, threshold=0.95),
+        )
+
+        router.route_chat("How do decorators work?")
+        response = router.route_chat("Explain how decorators work")
+
+        self.assertEqual(response["provider"], "semantic-cache")
+        self.assertEqual(response["cached_provider"], "ollama-cloud")
+        self.assertEqual(response["reply"], "Decorators wrap functions")
+        self.assertEqual(len(primary.calls), 1)
+        self.assertEqual(intent_client.embed_calls[0]["model"], "nomic-embed-text")
+        self.assertEqual(router.metrics()["semantic_cache"]["hits"], 1)
+
+    def test_unrelated_prompt_goes_to_provider(self):
+        intent_client = EmbeddingStubClient({"a": [1.0, 0.0], "b": [0.0, 1.0]})
+        primary = StubClient(response="answer")
+        router = LLMRouter(
+            intent_client=intent_client,
+            primary_client=primary,
+            fallback_client=StubClient(response=None),
+            semantic_cache=semantic_cache.SemanticCache(capacity=16),
+        )
+
+        router.route_chat("a")
+        response = router.route_chat("b")
+
+        self.assertEqual(response["provider"], "ollama-cloud")
+        self.assertEqual(len(primary.calls), 2)
+
+
+class LLMRouterHedgingTests(unittest.TestCase):
+    def _router(self, primary, fallback, **kwargs):
+        return LLMRouter(
+            intent_client=StubClient(),
+            primary_client=primary,
+            fallback_client=fallback,
+            hedge_enabled=True,
+            **kwargs,
+        )
+
+    def test_slow_primary_is_hedged_and_fallback_wins(self):
+        router = self._router(
+            SlowStubClient(response="cloud", delay=0.5),
+            StubClient(response="local"),
+            hedge_after_seconds=0.05,
+        )
+
+        response = router.route_chat("Explain decorators", request_id="req-h")
+
+        self.assertEqual(response["provider"], "ollama-local")
+        self.assertEqual(response["reply"], "local")
+        self.assertTrue(response["hedged"])
+        hedging = router.metrics()["hedging"]
+        self.assertEqual(hedging["fired"], 1)
+        self.assertEqual(hedging["won_by_fallback"], 1)
+
+    def test_fast_primary_is_not_hedged(self):
+        fallback = StubClient(response="local")
+        router = self._router(StubClient(response="cloud"), fallback, hedge_after_seconds=1.0)
+
+        response = router.route_chat("Explain decorators")
+
+        self.assertEqual(response["provider"], "ollama-cloud")
+        self.assertFalse(response["hedged"])
+        self.assertEqual(fallback.calls, [])
+
+    def test_primary_failure_before_budget_falls_back_without_hedging(self):
+        router = self._router(
+            StubClient(response=None), StubClient(response="local"), hedge_after_seconds=1.0
+        )
+
+        response = router.route_chat("Explain decorators")
+
+        self.assertEqual(response["provider"], "ollama-local")
+        self.assertFalse(response["hedged"])
+
+    def test_hedged_primary_can_still_win(self):
+        router = self._router(
+            SlowStubClient(response="cloud", delay=0.1),
+            SlowStubClient(response="local", delay=1.0),
+            hedge_after_seconds=0.01,
+        )
+
+        response = router.route_chat("Explain decorators")
+
+        self.assertEqual(response["provider"], "ollama-cloud")
+        self.assertTrue(response["hedged"])
+
+    def test_hedging_is_skipped_while_losers_hold_every_slot(self):
+        router = self._router(
+            SlowStubClient(response="cloud", delay=0.3),
+            StubClient(response="local"),
+            hedge_after_seconds=0.02,
+            hedge_max_concurrency=1,
+        )
+
+        first = router.route_chat("Explain decorators")
+        second = router.route_chat("Explain generators")  # the first's primary still runs
+        time.sleep(0.05)  # let the first's losing call return its slot
+        third = router.route_chat("Explain closures")
+
+        self.assertEqual((first["provider"], first["hedged"]), ("ollama-local", True))
+        self.assertEqual((second["provider"], second["hedged"]), ("ollama-cloud", False))
+        self.assertTrue(third["hedged"])
+        hedging = router.metrics()["hedging"]
+        self.assertEqual((hedging["fired"], hedging["skipped_busy"]), (2, 1))
+
+    def test_thread_queueing_is_not_charged_to_the_hedge_budget(self):
+        router = self._router(
+            SlowStubClient(response="cloud", delay=0.05),
+            StubClient(response="local"),
+            hedge_after_seconds=0.2,
+        )
+        blocker = threading.Event()
+        pool = router._hedge_pool()
+        for _ in range(2 * router.hedge_max_concurrency):
+            pool.submit(blocker.wait)
+        threading.Timer(0.3, blocker.set).start()
+
+        response = router.route_chat("Explain decorators")
+
+        self.assertEqual(response["provider"], "ollama-cloud")
+        self.assertFalse(response["hedged"])
+        self.assertGreaterEqual(router.metrics()["hedging"]["queued_seconds"], 0.25)
+
+    def test_budget_tracks_primary_rolling_percentile(self):
+        router = self._router(
+            StubClient(response="cloud"), StubClient(response="local"), hedge_min_samples=10
+        )
+        self.assertEqual(router.hedge_budget(), router.hedge_default_seconds)
+
+        for sample in range(1, 11):
+            router.latency["ollama-cloud"].record(sample / 10)
+
+        self.assertAlmostEqual(router.hedge_budget(), 0.9)
+
+    def test_responses_omit_hedge_field_when_disabled(self):
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=StubClient(response="cloud"),
+            fallback_client=StubClient(response=None),
+        )
+
+        self.assertNotIn("hedged", router.route_chat("Explain decorators"))
+
+
+class LLMRouterCoalescingTests(unittest.TestCase):
+    def test_identical_concurrent_requests_share_one_provider_call(self):
+        import threading
+
+        primary = SlowStubClient(response="cloud", delay=0.3)
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=primary,
+            fallback_client=StubClient(),
+        )
+        responses = []
+        threads = [
+            threading.Thread(
+                target=lambda: responses.append(router.route_chat("Explain decorators"))
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(len(primary.calls), 1)
+        self.assertEqual([r["reply"] for r in responses], ["cloud"] * 4)
+        self.assertEqual(sum(1 for r in responses if r.get("coalesced")), 3)
+        self.assertEqual(router.metrics()["coalescing"]["shared"], 3)
+
+    def test_different_prompts_are_not_coalesced(self):
+        primary = StubClient(response="cloud")
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=primary,
+            fallback_client=StubClient(),
+        )
+
+        router.route_chat("Explain decorators")
+        response = router.route_chat("Explain generators")
+
+        self.assertEqual(len(primary.calls), 2)
+        self.assertNotIn("coalesced", response)
+
+
+class LLMRouterMemoryRetrievalTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.memory = MemoryStore(long_term_path=Path(self.tmp.name) / "memory.sqlite")
+        self.memory.save_long_term_summary(
+            {"topic": "sandbox", "summary": "Docker runs code without network."}
+        )
+        self.memory.save_long_term_summary(
+            {"topic": "routing", "summary": "Cloud first, then the local model."}
+        )
+        self.memory.save_long_term_summary({"topic": "gardening", "summary": "Tomatoes need sun."})
+
+    def tearDown(self):
+        self.memory.long_term.close()
+        self.tmp.cleanup()
+
+    def _router(self, **kwargs):
+        self.primary = StubClient(response="cloud")
+        return LLMRouter(
+            intent_client=StubClient(),
+            primary_client=self.primary,
+            fallback_client=StubClient(),
+            memory=self.memory,
+            **kwargs,
+        )
+
+    def test_top_hits_are_prepended_to_the_prompt(self):
+        router = self._router(memory_top_k=2)
+
+        router.route_chat("Why does the sandbox block network access?")
+
+        prompt = self.primary.calls[0]["message"]
+        self.assertIn("User: Relevant notes from long-term memory:\n- sandbox: Docker", prompt)
+        self.assertNotIn("gardening", prompt)
+        self.assertTrue(prompt.endswith("Why does the sandbox block network access?"))
+
+    def test_notes_respect_the_token_budget(self):
+        router = self._router(memory_top_k=3, memory_token_budget=1)
+
+        router.route_chat("sandbox routing")
+
+        self.assertNotIn("Relevant notes", self.primary.calls[0]["message"])
+
+    def test_retrieval_is_off_by_default(self):
+        router = self._router()
+
+        router.route_chat("sandbox")
+
+        self.assertTrue(self.primary.calls[0]["message"].endswith("User: sandbox"))
+
+
+class ConversationSummarizerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.memory = MemoryStore(long_term_path=Path(self.tmp.name) / "memory.sqlite")
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(self.memory.long_term.close)
+
+    def _router(self, **kwargs):
+        self.primary = StubClient(response="cloud reply")
+        self.fallback = StubClient(response="User asked about decorators and closures.")
+        return LLMRouter(
+            intent_client=StubClient(),
+            primary_client=self.primary,
+            fallback_client=self.fallback,
+            memory=self.memory,
+            **{"summarize_after_tokens": 10, "summary_keep_turns": 2, **kwargs},
+        )
+
+    def test_conversation_history_is_recorded_and_sent_with_the_next_message(self):
+        router = self._router()
+
+        router.route_chat("Explain decorators", conversation_id="c1")
+        router.route_chat("And closures?", conversation_id="c1")
+
+        prompt = self.primary.calls[1]["message"]
+        self.assertIn(
+            "Conversation so far:\nUser: Explain decorators\nAssistant: cloud reply", prompt
+        )
+        self.assertTrue(prompt.endswith("And closures?"))
+        self.assertEqual(len(self.memory.get_short_term("c1")), 4)
+
+    def test_history_beyond_the_context_budget_is_dropped_oldest_first_and_summarized(self):
+        router = self._router(
+            summarize_after_tokens=100_000,
+            prompt_builder=PromptBuilder(default_context_tokens=120, reply_tokens=0),
+        )
+        for i in range(6):
+            router.route_chat(f"Question {i} " + "detail " * 10, conversation_id="c1")
+
+        with self.assertLogs("cody.llm", level="INFO") as captured:
+            router.route_chat("Last question", conversation_id="c1", request_id="req-9")
+
+        prompt = self.primary.calls[-1]["message"]
+        self.assertIn("Question 5", prompt)
+        self.assertNotIn("Question 0", prompt)
+        self.assertIn("llm.prompt.composed request_id=req-9", "\n".join(captured.output))
+        self.assertEqual(router.summarizer.stats()["queued"], 1)
+        stats = router.metrics()["prompt"]
+        self.assertEqual(stats["budget_tokens"], 120)
+        self.assertGreater(stats["dropped_turns"], 0)
+        self.assertLessEqual(stats["tokens_max"], 120)
+
+    def test_long_history_is_summarized_into_long_term_memory_and_trimmed(self):
+        router = self._router()
+        router.route_chat("Explain decorators with a long example please", conversation_id="c1")
+        router.route_chat("And closures?", conversation_id="c1")
+
+        summary_id = router.summarizer.compact("c1")
+
+        self.assertIsNotNone(summary_id)
+        self.assertIn("Explain decorators", self.fallback.calls[0]["message"])
+        self.assertEqual(
+            self.memory.load_long_term_summary(topic=SUMMARY_TOPIC, conversation_id="c1")[
+                "summary"
+            ],
+            "User asked about decorators and closures.",
+        )
+        self.assertEqual(
+            [turn.content for turn in self.memory.get_short_term_turns("c1")],
+            ["And closures?", "cloud reply"],
+        )
+        router.route_chat("Thanks", conversation_id="c1")
+        self.assertIn(
+            "(Summary of earlier turns) User asked about decorators",
+            self.primary.calls[2]["message"],
+        )
+
+    def test_summaries_are_not_offered_as_notes_to_other_conversations(self):
+        router = self._router(memory_top_k=3)
+        router.route_chat("Explain decorators with a long example please", conversation_id="c1")
+        router.route_chat("And closures?", conversation_id="c1")
+        router.summarizer.compact("c1")
+
+        router.route_chat("What about decorators and closures?", conversation_id="c2")
+
+        self.assertNotIn("User asked about decorators", self.primary.calls[-1]["message"])
+
+    def test_observe_only_queues_conversations_over_budget(self):
+        summarizer = ConversationSummarizer(
+            memory=self.memory, summarize=lambda _: "s", max_tokens=50
+        )
+        for _ in range(6):
+            self.memory.append_short_term("short", "user", "hi")
+            self.memory.append_short_term("long", "user", "x" * 100)
+
+        self.assertFalse(summarizer.observe("short"))
+        self.assertTrue(summarizer.observe("long"))
+        self.assertFalse(summarizer.observe("long"))  # already queued
+        self.assertEqual(summarizer.stats()["pending"], 1)
+
+    def test_worker_summarizes_in_the_background(self):
+        done = threading.Event()
+
+        def summarize(prompt):
+            done.set()
+            return "summary"
+
+        summarizer = ConversationSummarizer(
+            memory=self.memory, summarize=summarize, max_tokens=1, keep_turns=1
+        )
+        summarizer.start()
+        self.addCleanup(summarizer.stop)
+        for content in ("first", "second", "third"):
+            self.memory.append_short_term("c1", "user", content)
+
+        summarizer.observe("c1")
+
+        self.assertTrue(done.wait(5))
+        summarizer.stop()
+        self.assertEqual(
+            [turn.content for turn in self.memory.get_short_term_turns("c1")], ["third"]
+        )
+        self.assertEqual(summarizer.stats()["summarized"], 1)
+
+    def test_turns_added_while_summarizing_are_kept(self):
+        def summarize(prompt):
+            self.memory.append_short_term("c1", "user", "arrived meanwhile")
+            return "summary"
+
+        summarizer = ConversationSummarizer(
+            memory=self.memory, summarize=summarize, max_tokens=1, keep_turns=1
+        )
+        for content in ("first", "second"):
+            self.memory.append_short_term("c1", "user", content)
+
+        summarizer.compact("c1")
+
+        self.assertEqual(
+            [turn.content for turn in self.memory.get_short_term_turns("c1")],
+            ["second", "arrived meanwhile"],
+        )
+
+    def test_unavailable_model_keeps_the_history(self):
+        router = self._router()
+        self.fallback.response = None
+        router.route_chat("Explain decorators with a long example please", conversation_id="c1")
+        router.route_chat("And closures?", conversation_id="c1")
+
+        self.assertIsNone(router.summarizer.compact("c1"))
+        self.assertEqual(len(self.memory.get_short_term("c1")), 4)
+        self.assertEqual(router.metrics()["summarizer"]["failed"], 1)
+
+    def test_stub_replies_are_not_recorded(self):
+        router = self._router()
+        self.primary.response = None
+        self.fallback.response = None
+
+        router.route_chat("hello", conversation_id="c1")
+
+        self.assertEqual(len(self.memory.get_short_term("c1")), 0)
+
+
+class LoadingStubClient(StubClient):
+    def __init__(self, endpoint="http://ollama", resident=(), loadable=True):
+        super().__init__()
+        self.endpoint = endpoint
+        self.resident = set(resident)
+        self.loadable = loadable
+        self.loads = []
+
+    def load(self, model: str, timeout=None):
+        self.loads.append(model)
+        if self.loadable:
+            self.resident.add(model)
+        return self.loadable
+
+    def running_models(self, timeout=2.0):
+        return set(self.resident)
+
+
+class ModelManagerTests(unittest.TestCase):
+    def test_refresh_loads_models_and_counts_cold_loads(self):
+        client = LoadingStubClient(resident={"small"})
+        manager = ModelManager(targets=[(client, "small"), (client, "fallback")])
+
+        self.assertEqual(manager.refresh(), {"small": True, "fallback": True})
+        manager.refresh()
+
+        stats = {entry["model"]: entry for entry in manager.stats()["models"]}
+        self.assertEqual(client.loads, ["small", "fallback", "small", "fallback"])
+        self.assertEqual((stats["small"]["loads"], stats["small"]["cold_loads"]), (2, 0))
+        self.assertEqual((stats["fallback"]["loads"], stats["fallback"]["cold_loads"]), (2, 1))
+        self.assertEqual(manager.warm_models(), ["small", "fallback"])
+
+    def test_failed_loads_leave_the_model_cold(self):
+        manager = ModelManager(targets=[(LoadingStubClient(loadable=False), "fallback")])
+
+        self.assertEqual(manager.refresh(), {"fallback": False})
+        self.assertEqual(manager.stats()["models"][0]["failures"], 1)
+        self.assertEqual(manager.warm_models(), [])
+
+    def test_router_manages_local_models_and_reports_them(self):
+        intent, local = LoadingStubClient(), LoadingStubClient(endpoint="http://local")
+        router = LLMRouter(
+            intent_client=intent,
+            primary_client=LoadingStubClient(),
+            fallback_client=local,
+            primary_model="qwen3-coder:480b-cloud",
+        )
+        self.assertEqual(router.metrics()["models"], {"enabled": False})
+
+        manager = router.start_model_manager(interval=60)
+        self.addCleanup(manager.stop)
+        manager.refresh()
+
+        self.assertEqual(intent.loads[-1:], [router.intent_model])
+        self.assertEqual(local.loads[-1:], [router.fallback_model])
+        self.assertEqual(
+            [entry["model"] for entry in router.metrics()["models"]["models"]],
+            [router.intent_model, router.fallback_model],
+        )
+
+
+class LLMRouterStreamingTests(unittest.TestCase):
+    def test_stream_yields_deltas_then_final_from_primary(self):
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=StreamingStubClient(["Hel", "lo"]),
+            fallback_client=StreamingStubClient(["unused"]),
+        )
+
+        events = list(router.route_chat_stream("Explain decorators", request_id="req-1"))
+
+        self.assertEqual(events[0], {"type": "delta", "delta": "Hel"})
+        self.assertEqual(events[1], {"type": "delta", "delta": "lo"})
+        self.assertEqual(events[2], {"type": "final", "reply": "Hello", "provider": "ollama-cloud"})
+        self.assertEqual(router.fallback_client.calls, [])
+
+    def test_stream_falls_back_when_primary_fails_before_first_token(self):
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=StreamingStubClient([]),
+            fallback_client=StreamingStubClient(["local"]),
+        )
+
+        events = list(router.route_chat_stream("Explain decorators"))
+
+        self.assertEqual(events[-1]["provider"], "ollama-local")
+        self.assertEqual(events[-1]["reply"], "local")
+        self.assertEqual(len(router.primary_client.calls), 1)
+
+    def test_truncated_stream_is_flagged_and_not_cached_or_remembered(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            memory = MemoryStore(long_term_path=Path(tmp) / "memory.sqlite")
+            self.addCleanup(memory.long_term.close)
+            router = LLMRouter(
+                intent_client=StubClient(),
+                primary_client=StreamingStubClient(["Hel"], truncated=True),
+                fallback_client=StreamingStubClient(["unused"]),
+                response_cache=ResponseCache(),
+                memory=memory,
+            )
+
+            events = list(router.route_chat_stream("Explain decorators", conversation_id="c1"))
+
+            self.assertEqual(events[0], {"type": "delta", "delta": "Hel"})
+            self.assertEqual(
+                events[1],
+                {
+                    "type": "final",
+                    "reply": "Hel",
+                    "provider": "ollama-cloud",
+                    "truncated": True,
+                    "error": "stream_truncated",
+                },
+            )
+            self.assertEqual(router.fallback_client.calls, [])
+            self.assertEqual(router.metrics()["cache"]["entries"], 0)
+            self.assertEqual(memory.get_short_term("c1"), [])
+
+    def test_stream_queues_message_when_all_providers_fail(self):
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=StreamingStubClient([]),
+            fallback_client=StreamingStubClient([]),
+        )
+
+        events = list(router.route_chat_stream("hello"))
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["type"], "final")
+        self.assertEqual(events[0]["provider"], "stub")
+        self.assertEqual(router.pending_messages.messages("unknown"), ["hello"])
+
+    def test_stream_answers_math_with_single_final_event(self):
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=StreamingStubClient(["unused"]),
+            fallback_client=StreamingStubClient([]),
+        )
+
+        events = list(router.route_chat_stream("What is 6 * 7?"))
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["provider"], "local-tool")
+        self.assertIn("42", events[0]["reply"])
+
+
+class AsyncLLMRouterTests(unittest.IsolatedAsyncioTestCase):
+    def _router(self, primary, fallback, **kwargs):
+        router = LLMRouter(
+            intent_client=StubClient(),
+            primary_client=StubClient(),
+            fallback_client=StubClient(),
+            **kwargs,
+        )
+        return AsyncLLMRouter(
+            router=router,
+            intent_client=AsyncStubClient(),
+            primary_client=primary,
+            fallback_client=fallback,
+        )
+
+    async def test_routes_to_primary_without_touching_sync_clients(self):
+        router = self._router(AsyncStubClient(response="cloud"), AsyncStubClient(response="local"))
+
+        response = await router.route_chat("Explain decorators", request_id="req-a")
+
+        self.assertEqual(response, {"reply": "cloud", "provider": "ollama-cloud"})
+        self.assertEqual(router.router.primary_client.calls, [])
+        self.assertEqual(router.fallback_client.calls, [])
+
+    async def test_failures_trip_the_shared_sync_breaker(self):
+        router = self._router(
+            AsyncStubClient(response=None),
+            AsyncStubClient(response="local"),
+            breaker_failure_threshold=1,
+        )
+
+        first = await router.route_chat("Explain decorators")
+        second = await router.route_chat("Explain generators")
+
+        self.assertEqual(first["provider"], "ollama-local")
+        self.assertEqual(second["provider"], "ollama-local")
+        self.assertEqual(len(router.primary_client.calls), 1)
+        self.assertEqual(router.router.provider_health()["ollama-cloud"]["state"], "open")
+
+    async def test_queues_message_when_all_providers_fail(self):
+        router = self._router(AsyncStubClient(), AsyncStubClient())
+
+        response = await router.route_chat("hello")
+
+        self.assertEqual(response["provider"], "stub")
+        self.assertEqual(router.router.pending_messages.messages("unknown"), ["hello"])
+
+    async def test_math_runs_the_tool_path(self):
+        router = self._router(AsyncStubClient(response="unused"), AsyncStubClient())
+
+        response = await router.route_chat("What is 6 * 7?")
+
+        self.assertEqual(response["provider"], "local-tool")
+        self.assertIn("42", response["reply"])
+
+    async def test_concurrent_identical_requests_are_coalesced(self):
+        import asyncio
+
+        primary = AsyncStubClient(response="cloud", delay=0.05)
+        router = self._router(primary, AsyncStubClient())
+
+        responses = await asyncio.gather(
+            *(router.route_chat("Explain decorators") for _ in range(5))
+        )
+
+        self.assertEqual(len(primary.calls), 1)
+        self.assertEqual({r["reply"] for r in responses}, {"cloud"})
+        self.assertEqual(router.metrics()["async_coalescing"]["shared"], 4)
+
+    async def test_slow_primary_is_hedged_and_fallback_wins(self):
+        router = self._router(
+            AsyncStubClient(response="cloud", delay=1.0),
+            AsyncStubClient(response="local"),
+            hedge_enabled=True,
+            hedge_after_seconds=0.02,
+        )
+
+        response = await router.route_chat("Explain decorators")
+
+        self.assertEqual(response["provider"], "ollama-local")
+        self.assertTrue(response["hedged"])
+        self.assertEqual(router.metrics()["hedging"]["won_by_fallback"], 1)
+
+    async def test_stream_yields_deltas_then_final(self):
+        router = self._router(AsyncStubClient(chunks=["Hel", "lo"]), AsyncStubClient())
+
+        events = [event async for event in router.route_chat_stream("Explain decorators")]
+
+        self.assertEqual([e["delta"] for e in events[:-1]], ["Hel", "lo"])
+        self.assertEqual(
+            events[-1], {"type": "final", "reply": "Hello", "provider": "ollama-cloud"}
+        )
+
+    async def test_truncated_stream_is_flagged(self):
+        router = self._router(AsyncStubClient(chunks=["Hel"], truncated=True), AsyncStubClient())
+
+        events = [event async for event in router.route_chat_stream("Explain decorators")]
+
+        self.assertTrue(events[-1]["truncated"])
+        self.assertEqual((events[-1]["reply"], events[-1]["error"]), ("Hel", "stream_truncated"))
+
+    async def test_blocking_stages_run_off_the_event_loop(self):
+        router = self._router(AsyncStubClient(response="cloud"), AsyncStubClient())
+        threads = []
+        for name in ("_compose_message", "_record_turns"):
+            stage = getattr(router.router, name)
+
+            def recording(*args, _stage=stage):
+                threads.append(threading.current_thread())
+                return _stage(*args)
+
+            setattr(router.router, name, recording)
+
+        await router.route_chat("Explain decorators", conversation_id="c1")
+
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.current_thread(), threads)
+
 
 if __name__ == "__main__":
     unittest.main()
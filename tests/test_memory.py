@@ -1,8 +1,10 @@
+import json
 import tempfile
+import threading
 import unittest
 from pathlib import Path
 
-from cody.memory import MemoryStore
+from cody.memory import LongTermMemory, MemoryStore, ShortTermMemory, StripedShortTermMemory, Turn
 
 
 class MemoryTests(unittest.TestCase):
@@ -15,6 +17,8 @@ class MemoryTests(unittest.TestCase):
 
             self.assertEqual(len(store.get_short_term("c1")), 2)
             self.assertEqual(len(store.get_short_term("c2")), 1)
+            self.assertEqual(store.get_short_term("c1")[0], {"role": "user", "content": "hello"})
+            self.assertEqual(store.get_short_term_turns("c1")[1], Turn("assistant", "hi"))
 
     def test_long_term_summary_save_and_load(self):
         with tempfile.TemporaryDirectory() as tmp:
@@ -32,6 +36,269 @@ class MemoryTests(unittest.TestCase):
             with self.assertRaises(ValueError):
                 store.save_long_term_summary({"topic": "", "summary": "stored"})
 
+    def test_legacy_json_summary_is_imported_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy = Path(tmp) / "long_term_memory.json"
+            legacy.write_text(
+                json.dumps({"topic": "phase1", "summary": "from json"}), encoding="utf-8"
+            )
+
+            store = MemoryStore(long_term_path=Path(tmp) / "long_term_memory.sqlite")
+            self.assertEqual(store.load_long_term_summary()["summary"], "from json")
+            store.save_long_term_summary({"topic": "phase1", "summary": "newer"})
+            store.long_term.close()
+
+            reopened = MemoryStore(long_term_path=Path(tmp) / "long_term_memory.sqlite")
+            self.assertEqual(len(reopened.list_long_term_summaries()), 2)
+            self.assertTrue(legacy.exists())
+
+
+class LongTermMemoryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = MemoryStore(
+            long_term_path=Path(self.tmp.name) / "memory.sqlite", keep_versions=2
+        )
+
+    def tearDown(self):
+        self.store.long_term.close()
+        self.tmp.cleanup()
+
+    def test_many_summaries_by_topic_and_conversation(self):
+        for i in range(3):
+            self.store.save_long_term_summary(
+                {"topic": "sandbox", "summary": f"s{i}", "conversation_id": "c1"}
+            )
+        self.store.save_long_term_summary(
+            {"topic": "routing", "summary": "r0", "conversation_id": "c2"}
+        )
+
+        self.assertEqual(self.store.load_long_term_summary()["summary"], "r0")
+        self.assertEqual(self.store.load_long_term_summary(topic="sandbox")["summary"], "s2")
+        self.assertEqual(
+            [s["summary"] for s in self.store.list_long_term_summaries(conversation_id="c1")],
+            ["s2", "s1", "s0"],
+        )
+        self.assertEqual(self.store.load_long_term_summary(topic="missing"), {})
+
+    def test_compaction_keeps_newest_versions_of_written_keys(self):
+        ids = [
+            self.store.save_long_term_summary(
+                {"topic": "sandbox", "summary": f"s{i}", "conversation_id": "c1"}
+            )
+            for i in range(4)
+        ]
+        self.store.save_long_term_summary({"topic": "routing", "summary": "r0"})
+
+        deleted = self.store.long_term.compact()
+
+        self.assertEqual(sorted(deleted), ids[:2])
+        self.assertEqual(len(self.store.long_term), 3)
+        self.assertEqual(self.store.long_term.compact(), [])  # nothing written since
+
+    def test_background_compactor_runs(self):
+        long_term = LongTermMemory(path=Path(self.tmp.name) / "bg.sqlite", keep_versions=1)
+        for i in range(3):
+            long_term.save({"topic": "t", "summary": f"s{i}"})
+
+        long_term.start_compactor(interval=0.01)
+        for _ in range(200):
+            if long_term.stats()["compacted"]:
+                break
+            long_term._stopped.wait(0.01)
+        long_term.close()
+
+        self.assertEqual(long_term.stats()["compacted"], 2)
+        self.assertEqual(long_term.latest()["summary"], "s2")
+
+    def test_bm25_search_ranks_relevant_summaries_and_tracks_compaction(self):
+        self.store.save_long_term_summary(
+            {"topic": "sandbox", "summary": "Docker containers run Python code."}
+        )
+        self.store.save_long_term_summary(
+            {"topic": "routing", "summary": "Fallback to the local Docker-free model."}
+        )
+        for i in range(3):
+            self.store.save_long_term_summary({"topic": "notes", "summary": f"gardening tip {i}"})
+
+        hits = self.store.search_long_term("How is python code run in the sandbox?", k=2)
+
+        self.assertEqual(hits[0][0]["topic"], "sandbox")
+        self.assertGreater(hits[0][1], 0)
+        self.assertEqual(self.store.search_long_term("the of and"), [])
+
+        self.store.long_term.compact()  # keep_versions=2 drops "gardening tip 0"
+        self.assertEqual(
+            sorted(hit["summary"] for hit, _ in self.store.search_long_term("gardening", k=5)),
+            ["gardening tip 1", "gardening tip 2"],
+        )
+
+    def test_search_skips_common_terms_beyond_candidate_budget(self):
+        self.store.long_term.search_candidates = 2
+        for i in range(4):
+            self.store.save_long_term_summary({"topic": f"t{i}", "summary": f"python note {i}"})
+        self.store.save_long_term_summary(
+            {"topic": "decorators", "summary": "python decorators wrap functions"}
+        )
+
+        hits = self.store.search_long_term("python decorators", k=5)
+
+        self.assertEqual([hit["topic"] for hit, _ in hits], ["decorators"])
+
+    def test_underscored_identifiers_are_split_like_the_index(self):
+        self.store.save_long_term_summary(
+            {"topic": "config", "summary": "parse_config reads the TOML file"}
+        )
+
+        hits = self.store.search_long_term("how does parse_config work")
+
+        self.assertEqual([hit["topic"] for hit, _ in hits], ["config"])
+
+    def test_search_can_exclude_topics(self):
+        self.store.save_long_term_summary(
+            {"topic": "conversation", "summary": "alice asked about decorators"}
+        )
+        self.store.save_long_term_summary(
+            {"topic": "python", "summary": "decorators wrap functions"}
+        )
+
+        hits = self.store.search_long_term("decorators", k=5, exclude_topics=("conversation",))
+
+        self.assertEqual([hit["topic"] for hit, _ in hits], ["python"])
+
+    def test_search_index_is_built_for_existing_summaries(self):
+        path = Path(self.tmp.name) / "memory.sqlite"
+        self.store.save_long_term_summary({"topic": "sandbox", "summary": "Docker isolation"})
+        self.store.long_term.close()
+        import sqlite3
+
+        with sqlite3.connect(path) as db:  # simulate a database written before the index existed
+            db.execute("DROP TABLE summaries_fts")
+            db.execute("DROP TRIGGER summaries_fts_insert")
+            db.execute("DELETE FROM meta WHERE key = 'search_index'")
+
+        reopened = MemoryStore(long_term_path=path)
+        self.addCleanup(reopened.long_term.close)
+        self.assertEqual(reopened.search_long_term("docker")[0][0]["topic"], "sandbox")
+
+
+class ShortTermMemoryTests(unittest.TestCase):
+    def test_ring_keeps_newest_turns(self):
+        memory = ShortTermMemory(max_turns=3)
+        for i in range(5):
+            memory.append("c1", "user", f"m{i}")
+
+        self.assertEqual([turn.content for turn in memory.view("c1")], ["m2", "m3", "m4"])
+        self.assertEqual(memory.stats()["evicted_turns"], 2)
+
+    def test_view_is_a_snapshot_without_copying(self):
+        memory = ShortTermMemory(max_turns=10)
+        memory.append("c1", "user", "hello")
+        view = memory.view("c1")
+        memory.append("c1", "assistant", "hi")
+
+        self.assertEqual(list(view), [Turn("user", "hello")])
+        self.assertEqual(memory.view("c1").as_dicts()[-1], {"role": "assistant", "content": "hi"})
+        self.assertEqual(memory.view("c1")[-1].content, "hi")
+        self.assertEqual(len(memory.view("unknown")), 0)
+
+    def test_reading_evicted_turns_through_a_view_raises(self):
+        memory = ShortTermMemory(max_turns=2)
+        memory.append("c1", "user", "a")
+        memory.append("c1", "user", "b")
+        view = memory.view("c1")
+        memory.append("c1", "user", "c")
+
+        self.assertEqual(view[1].content, "b")
+        with self.assertRaises(RuntimeError):
+            view[0]
+
+    def test_budget_evicts_least_recently_used_conversations(self):
+        memory = ShortTermMemory(max_turns=10, max_bytes=2200)
+        for cid in ("cold", "warm", "new"):
+            memory.append(cid, "user", "x" * 300)
+        memory.view("cold")  # reading a conversation keeps it warm
+        memory.append("new", "user", "y" * 300)
+
+        self.assertIn("cold", memory)
+        self.assertNotIn("warm", memory)
+        self.assertEqual(memory.stats()["evicted_conversations"], 1)
+        self.assertLessEqual(memory.stats()["bytes"], 2200)
+
+    def test_single_oversized_conversation_loses_oldest_turns(self):
+        memory = ShortTermMemory(max_turns=100, max_bytes=1500)
+        for i in range(10):
+            memory.append("c1", "user", f"{i}" * 300)
+
+        history = memory.view("c1")
+        self.assertEqual(history[-1].content, "9" * 300)
+        self.assertLess(len(history), 10)
+        self.assertLessEqual(memory.stats()["bytes"], 1500)
+
+    def test_trim_returns_dropped_turns_and_frees_budget(self):
+        memory = ShortTermMemory(max_turns=10)
+        for i in range(4):
+            memory.append("c1", "user", f"m{i}")
+        before = memory.stats()["bytes"]
+
+        dropped = memory.trim("c1", keep=1)
+        memory.append("c1", "user", "m4")
+
+        self.assertEqual([turn.content for turn in dropped], ["m0", "m1", "m2"])
+        self.assertEqual([turn.content for turn in memory.view("c1")], ["m3", "m4"])
+        self.assertLess(memory.stats()["bytes"], before)
+
+
+class StripedShortTermMemoryTests(unittest.TestCase):
+    def test_concurrent_appends_are_not_lost(self):
+        memory = StripedShortTermMemory(max_turns=1000, max_bytes=1 << 30, stripes=4)
+
+        def worker(thread: int) -> None:
+            for i in range(200):
+                # Conversations are shared by all threads.
+                memory.append(f"c{i % 10}", "user", f"{thread}-{i}")
+                memory.turns(f"c{i % 10}")
+
+        threads = [threading.Thread(target=worker, args=(thread,)) for thread in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(len(memory.turns(f"c{i}")) for i in range(10)), 1600)
+        self.assertEqual(memory.stats()["appends"], 1600)
+        self.assertEqual(memory.stats()["conversations"], 10)
+
+    def test_budget_is_split_across_stripes(self):
+        memory = StripedShortTermMemory(max_turns=10, max_bytes=4000, stripes=4)
+        for i in range(50):
+            memory.append(f"c{i}", "user", "x" * 300)
+
+        self.assertLessEqual(memory.stats()["bytes"], 4000)
+        self.assertGreater(memory.stats()["evicted_conversations"], 0)
+        self.assertEqual(memory.stats()["stripes"], 4)
+
+    def test_drop_keeps_turns_added_after_the_copy(self):
+        memory = StripedShortTermMemory(max_turns=10)
+        memory.append("c1", "user", "old")
+        copied = memory.turns("c1")
+        memory.append("c1", "user", "new")
+
+        self.assertEqual(memory.drop("c1", copied), 1)
+        self.assertEqual([turn.content for turn in memory.turns("c1")], ["new"])
+
+    def test_turns_are_a_copy_unaffected_by_later_eviction(self):
+        memory = StripedShortTermMemory(max_turns=2)
+        memory.append("c1", "user", "a")
+        memory.append("c1", "user", "b")
+        copied = memory.turns("c1")
+        memory.append("c1", "user", "c")
+        memory.append("c1", "user", "d")
+
+        self.assertIsInstance(copied, list)
+        self.assertEqual([turn.content for turn in copied], ["a", "b"])
+        self.assertFalse(hasattr(memory, "view"))
+
 
 if __name__ == "__main__":
     unittest.main()
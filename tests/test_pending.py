@@ -0,0 +1,187 @@
+import sqlite3
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from cody.llm import LLMRouter, PendingReplayer
+from cody.pending import PendingQueue
+
+
+class StubClient:
+    def __init__(self, response=None):
+        self.response = response
+        self.calls = []
+
+    def chat(self, message: str, model: str):
+        self.calls.append(message)
+        return self.response
+
+
+class PendingQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "pending.sqlite"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _queue(self, **kwargs) -> PendingQueue:
+        queue = PendingQueue(self.path, **kwargs)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_messages_are_partitioned_by_recipient(self):
+        queue = self._queue()
+
+        self.assertEqual(queue.append("first", request_id="r1", recipient="alice"), 1)
+        self.assertEqual(queue.append("second", request_id="r2", recipient="alice"), 2)
+        self.assertEqual(queue.append("hello", request_id="r3", recipient="bob"), 1)
+
+        self.assertEqual(queue.messages("alice"), ["first", "second"])
+        self.assertEqual(queue.messages("bob"), ["hello"])
+        self.assertEqual(len(queue), 3)
+
+    def test_queue_survives_reopening(self):
+        self._queue().append("remember me", request_id="r1", recipient="alice")
+
+        self.assertEqual(self._queue().messages("alice"), ["remember me"])
+
+    def test_recipient_cap_drops_oldest_messages(self):
+        queue = self._queue(max_per_recipient=2)
+        for i in range(4):
+            queue.append(f"m{i}", request_id=f"r{i}", recipient="alice")
+        queue.append("other", request_id="b", recipient="bob")
+
+        self.assertEqual(queue.messages("alice"), ["m2", "m3"])
+        self.assertEqual(queue.messages("bob"), ["other"])
+        self.assertEqual(queue.stats()["dropped"], 2)
+
+    def test_old_messages_expire(self):
+        queue = self._queue(max_age_seconds=60)
+        queue.append("stale", request_id="r1", recipient="alice", result_token="t1")
+        with sqlite3.connect(self.path) as db:
+            db.execute("UPDATE pending_messages SET created_at = ?", (time.time() - 120,))
+
+        self.assertEqual(queue.claim(), [])
+        self.assertEqual(queue.result("r1", "t1"), {"status": "unknown"})
+        self.assertEqual(queue.stats()["expired"], 1)
+
+    def test_claim_takes_one_message_per_recipient_and_leases_it(self):
+        queue = self._queue()
+        for i in range(3):
+            queue.append(f"alice {i}", request_id=f"a{i}", recipient="alice")
+        queue.append("bob 0", request_id="b0", recipient="bob")
+
+        first = queue.claim(limit=10)
+        other_worker = self._queue().claim(limit=10)
+
+        self.assertEqual([entry.message for entry in first], ["alice 0", "bob 0"])
+        self.assertEqual([entry.message for entry in other_worker], ["alice 1"])
+
+    def test_complete_stores_the_reply_and_release_retries(self):
+        queue = self._queue()
+        queue.append("question", request_id="r1", recipient="alice", result_token="t1")
+        queue.append("later", request_id="r2", recipient="bob", result_token="t2")
+        answered, failed = queue.claim()
+
+        queue.complete(answered, "answer", "ollama-local")
+        queue.release(failed)
+
+        self.assertEqual(queue.result("r1", "t1")["reply"], "answer")
+        self.assertEqual(queue.result("r1", "t1")["status"], "done")
+        self.assertEqual(queue.result("r2", "t2"), {"status": "queued"})
+        self.assertEqual([entry.attempts for entry in queue.claim()], [1])
+
+    def test_results_need_the_token_of_their_own_request(self):
+        queue = self._queue()
+        queue.append("alice's", request_id="same", recipient="alice", result_token="alice-token")
+        queue.append("bob's", request_id="same", recipient="bob", result_token="bob-token")
+        for entry in queue.claim():
+            queue.complete(entry, f"answer for {entry.recipient}", "ollama-local")
+
+        self.assertEqual(queue.result("same", "alice-token")["reply"], "answer for alice")
+        self.assertEqual(queue.result("same", "bob-token")["reply"], "answer for bob")
+        self.assertEqual(queue.result("same", "guess"), {"status": "unknown"})
+        self.assertEqual(queue.result("same", ""), {"status": "unknown"})
+        self.assertEqual(queue.result("other", "alice-token"), {"status": "unknown"})
+
+
+class PendingReplayTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "pending.sqlite"
+        self.addCleanup(self.tmp.cleanup)
+
+    def _router(self, primary: StubClient) -> LLMRouter:
+        queue = PendingQueue(self.path)
+        self.addCleanup(queue.close)
+        return LLMRouter(
+            intent_client=StubClient(),
+            primary_client=primary,
+            fallback_client=StubClient(),
+            pending_messages=queue,
+        )
+
+    def test_stubbed_message_is_answered_once_a_provider_recovers(self):
+        primary = StubClient()
+        router = self._router(primary)
+        stub = router.route_chat("remember me", request_id="r1", recipient="alice")
+        self.assertEqual(stub["provider"], "stub")
+        self.assertEqual(stub["request_id"], "r1")
+        self.assertGreaterEqual(len(stub["result_token"]), 16)
+        self.assertEqual(router.pending_result("r1", stub["result_token"]), {"status": "queued"})
+        self.assertEqual(router.pending_result("r1", "guess"), {"status": "unknown"})
+
+        primary.response = "remembered"
+        self.assertEqual(PendingReplayer(router).replay_once(), 1)
+
+        result = router.pending_result("r1", stub["result_token"])
+        self.assertEqual((result["status"], result["reply"]), ("done", "remembered"))
+        self.assertIn("remember me", primary.calls[-1])
+        self.assertEqual(len(router.pending_messages), 0)
+
+    def test_queued_messages_do_not_leak_into_other_prompts(self):
+        primary = StubClient()
+        router = self._router(primary)
+        router.route_chat("alice's secret", recipient="alice")
+
+        primary.response = "ok"
+        router.route_chat("bob's question", recipient="bob")
+
+        self.assertNotIn("alice's secret", primary.calls[-1])
+        self.assertEqual(router.pending_messages.messages("alice"), ["alice's secret"])
+
+    def test_another_worker_can_replay_and_serve_the_result(self):
+        down = self._router(StubClient())
+        stub = down.route_chat("remember me", request_id="r1")
+
+        up = self._router(StubClient(response="ok"))
+        PendingReplayer(up).replay_once()
+
+        self.assertEqual(down.pending_result("r1", stub["result_token"])["reply"], "ok")
+
+    def test_failed_replay_leaves_messages_queued(self):
+        router = self._router(StubClient())
+        first = router.route_chat("first", request_id="r1", recipient="alice")
+        second = router.route_chat("second", request_id="r2", recipient="bob")
+
+        self.assertEqual(PendingReplayer(router).replay_once(), 0)
+        self.assertEqual(router.pending_result("r1", first["result_token"]), {"status": "queued"})
+        self.assertEqual(router.pending_result("r2", second["result_token"]), {"status": "queued"})
+
+    def test_replay_waits_while_every_circuit_is_open(self):
+        primary = StubClient()
+        router = self._router(primary)
+        router.route_chat("first")
+        for breaker in router.breakers.values():
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure()
+        calls = len(primary.calls)
+
+        self.assertEqual(PendingReplayer(router).replay_once(), 0)
+        self.assertEqual(len(primary.calls), calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
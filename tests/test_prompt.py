@@ -0,0 +1,123 @@
+import unittest
+
+from cody.prompt import (
+    TRUNCATED_MARKER,
+    PromptBuilder,
+    TokenEstimator,
+    estimate_tokens,
+    estimator_for,
+)
+
+
+class TokenEstimatorTests(unittest.TestCase):
+    def test_prose_is_counted_by_characters_and_code_by_words_and_punctuation(self):
+        estimator = TokenEstimator(chars_per_token=4.0)
+
+        self.assertEqual(estimator.count("a" * 40), 10)
+        self.assertEqual(estimator.count("f(x) = 1;"), 7)
+        self.assertEqual(estimator.count(""), 0)
+        self.assertEqual(estimate_tokens(""), 1)
+
+    def test_counts_are_memoized_up_to_the_memo_size(self):
+        estimator = TokenEstimator(memo_size=2)
+        for text in ("one", "two", "three"):
+            estimator.count(text)
+
+        self.assertEqual(list(estimator._memo), ["two", "three"])
+
+    def test_long_texts_are_not_memoized(self):
+        estimator = TokenEstimator(memo_max_chars=10)
+
+        estimator.count("x" * 11)
+
+        self.assertEqual(len(estimator._memo), 0)
+
+    def test_estimators_are_shared_per_model(self):
+        self.assertIs(estimator_for("qwen3:0.6b"), estimator_for("qwen3:0.6b"))
+        self.assertLess(estimator_for("deepseek-coder:6.7b").chars_per_token, 4.0)
+
+
+class PromptBuilderTests(unittest.TestCase):
+    def test_budget_is_the_model_context_less_the_reply_reserve(self):
+        builder = PromptBuilder(
+            context_tokens={"big": 32_000}, default_context_tokens=4096, reply_tokens=1000
+        )
+
+        self.assertEqual(builder.budget("big"), 31_000)
+        self.assertEqual(builder.budget("other"), 3096)
+
+    def test_everything_fits_within_a_large_budget(self):
+        builder = PromptBuilder()
+
+        composed = builder.build(
+            "m",
+            "system",
+            "question",
+            history=["User: hi", "Assistant: hello"],
+            notes=["- topic: note"],
+        )
+
+        self.assertEqual(
+            composed.message,
+            "Relevant notes from long-term memory:\n- topic: note\n\n"
+            "Conversation so far:\nUser: hi\nAssistant: hello\n\nquestion",
+        )
+        self.assertEqual(
+            (composed.dropped_turns, composed.dropped_notes, composed.truncated), (0, 0, False)
+        )
+
+    def test_oldest_history_is_dropped_first(self):
+        history = [f"User: turn number {i} " + "word " * 20 for i in range(10)]
+        builder = PromptBuilder(default_context_tokens=200, reply_tokens=0)
+
+        composed = builder.build("m", "system", "question", history=history)
+
+        self.assertGreater(composed.dropped_turns, 0)
+        self.assertLessEqual(composed.tokens, composed.budget)
+        self.assertIn("turn number 9", composed.message)
+        self.assertNotIn("turn number 0", composed.message)
+        kept = [line for line in history if line in composed.message]
+        self.assertEqual(kept, history[-len(kept):])
+
+    def test_notes_fill_the_room_left_after_history(self):
+        builder = PromptBuilder(default_context_tokens=60, reply_tokens=0)
+
+        composed = builder.build(
+            "m",
+            "system",
+            "question",
+            history=["User: hi"],
+            notes=["- big: " + "word " * 100, "- small: fits"],
+        )
+
+        self.assertIn("User: hi", composed.message)
+        self.assertIn("- small: fits", composed.message)
+        self.assertEqual(composed.dropped_notes, 1)
+
+    def test_oversized_message_keeps_its_end(self):
+        builder = PromptBuilder(default_context_tokens=100, reply_tokens=0)
+        message = "start " + "filler " * 500 + "the actual question?"
+
+        composed = builder.build("m", "system", message, history=["User: hi"])
+
+        self.assertTrue(composed.truncated)
+        self.assertTrue(composed.message.startswith(TRUNCATED_MARKER))
+        self.assertTrue(composed.message.endswith("the actual question?"))
+        self.assertLessEqual(composed.tokens, composed.budget)
+        self.assertEqual(composed.dropped_turns, 1)
+
+    def test_stats_report_composed_token_counts(self):
+        builder = PromptBuilder(default_context_tokens=100, reply_tokens=0)
+        builder.build("m", "system", "short")
+        builder.build("m", "system", "word " * 500)
+
+        stats = builder.stats()
+
+        self.assertEqual(stats["composed"], 2)
+        self.assertEqual(stats["truncated"], 1)
+        self.assertLessEqual(stats["tokens_max"], 100)
+        self.assertIsNotNone(stats["tokens_p50"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from cody import semantic_cache
+from cody.semantic_cache import SemanticCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@unittest.skipUnless(semantic_cache.is_available(), "numpy not installed")
+class SemanticCacheTests(unittest.TestCase):
+    def test_similar_embedding_above_threshold_hits(self):
+        cache = SemanticCache(capacity=8, threshold=0.9)
+        cache.insert("ns", [1.0, 0.0, 0.0], "reply", "ollama-cloud")
+
+        hit = cache.lookup("ns", [0.95, 0.05, 0.0])
+
+        self.assertEqual(hit["reply"], "reply")
+        self.assertEqual(hit["provider"], "ollama-cloud")
+        self.assertGreater(hit["similarity"], 0.9)
+
+    def test_dissimilar_embedding_misses(self):
+        cache = SemanticCache(capacity=8, threshold=0.9)
+        cache.insert("ns", [1.0, 0.0, 0.0], "reply", "ollama-cloud")
+
+        self.assertIsNone(cache.lookup("ns", [0.0, 1.0, 0.0]))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_lookup_is_scoped_by_namespace(self):
+        cache = SemanticCache(capacity=8, threshold=0.9)
+        cache.insert("model-a", [1.0, 0.0], "reply", "ollama-cloud")
+
+        self.assertIsNone(cache.lookup("model-b", [1.0, 0.0]))
+
+    def test_returns_best_of_top_k(self):
+        cache = SemanticCache(capacity=8, threshold=0.5, top_k=2)
+        cache.insert("ns", [1.0, 0.0], "x-axis", "p")
+        cache.insert("ns", [0.0, 1.0], "y-axis", "p")
+        cache.insert("ns", [0.7, 0.7], "diagonal", "p")
+
+        hit = cache.lookup("ns", [0.6, 0.8])
+
+        self.assertEqual(hit["reply"], "diagonal")
+        self.assertEqual(len(hit["top_k"]), 2)
+        self.assertGreaterEqual(hit["top_k"][0], hit["top_k"][1])
+
+    def test_expired_entries_do_not_hit(self):
+        clock = FakeClock()
+        cache = SemanticCache(capacity=8, ttl_seconds=10, clock=clock)
+        cache.insert("ns", [1.0, 0.0], "reply", "p")
+
+        clock.now += 11
+
+        self.assertIsNone(cache.lookup("ns", [1.0, 0.0]))
+
+    def test_full_cache_evicts_least_recently_used(self):
+        clock = FakeClock()
+        cache = SemanticCache(capacity=2, threshold=0.99, clock=clock)
+        cache.insert("ns", [1.0, 0.0, 0.0], "a", "p")
+        clock.now += 1
+        cache.insert("ns", [0.0, 1.0, 0.0], "b", "p")
+        clock.now += 1
+        cache.lookup("ns", [1.0, 0.0, 0.0])
+        clock.now += 1
+
+        cache.insert("ns", [0.0, 0.0, 1.0], "c", "p")
+
+        self.assertEqual(cache.lookup("ns", [1.0, 0.0, 0.0])["reply"], "a")
+        self.assertIsNone(cache.lookup("ns", [0.0, 1.0, 0.0]))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_mismatched_dimensions_are_ignored(self):
+        cache = SemanticCache(capacity=4)
+        cache.insert("ns", [1.0, 0.0], "reply", "p")
+
+        self.assertIsNone(cache.lookup("ns", [1.0, 0.0, 0.0]))
+
+    def test_new_embedding_dimension_resets_the_cache(self):
+        cache = SemanticCache(capacity=4, threshold=0.9)
+        cache.insert("ns", [1.0, 0.0], "old model", "p")
+
+        with self.assertLogs("cody.semantic_cache", "WARNING") as logs:
+            cache.insert("ns", [0.0, 1.0, 0.0], "new model", "p")
+
+        self.assertIn("semantic_cache.dimension_changed old=2 new=3", logs.output[0])
+        self.assertEqual(cache.lookup("ns", [0.0, 1.0, 0.0])["reply"], "new model")
+        self.assertIsNone(cache.lookup("ns", [1.0, 0.0]))
+        self.assertEqual((cache.stats()["entries"], cache.stats()["resets"]), (1, 1))
+
+    def test_dimension_reset_rewrites_the_memory_mapped_index(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "semantic"
+            first = SemanticCache(capacity=4, path=path)
+            first.insert("ns", [1.0, 0.0], "old model", "p")
+            with self.assertLogs("cody.semantic_cache", "WARNING"):
+                first.insert("ns", [0.0, 0.0, 1.0], "new model", "p")
+            first.close()
+
+            second = SemanticCache(capacity=4, path=path)
+            hit = second.lookup("ns", [0.0, 0.0, 1.0])
+            entries = second.stats()["entries"]
+            second.close()
+
+        self.assertEqual(hit["reply"], "new model")
+        self.assertEqual(entries, 1)
+
+    def test_memory_mapped_index_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "semantic"
+            first = SemanticCache(capacity=4, path=path)
+            first.insert("ns", [1.0, 0.0], "persisted", "ollama-local")
+            first.close()
+
+            second = SemanticCache(capacity=4, path=path)
+            hit = second.lookup("ns", [1.0, 0.0])
+            second.close()
+
+        self.assertEqual(hit["reply"], "persisted")
+        self.assertEqual(hit["provider"], "ollama-local")
+
+    def test_hit_rate_metric(self):
+        cache = SemanticCache(capacity=4, threshold=0.9)
+        cache.insert("ns", [1.0, 0.0], "reply", "p")
+        cache.lookup("ns", [1.0, 0.0])
+        cache.lookup("ns", [0.0, 1.0])
+
+        self.assertEqual(cache.stats()["hit_rate"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
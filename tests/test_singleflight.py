@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import unittest
+
+from cody.singleflight import AsyncSingleFlight, SingleFlight
+
+
+class SingleFlightTests(unittest.TestCase):
+    def test_concurrent_callers_share_one_execution(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        executions = []
+
+        def work():
+            executions.append(1)
+            started.set()
+            release.wait(timeout=2)
+            return "answer"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do("k", work)))
+        leader.start()
+        started.wait(timeout=2)
+        followers = [
+            threading.Thread(target=lambda: results.append(flights.do("k", work))) for _ in range(3)
+        ]
+        for thread in followers:
+            thread.start()
+        while flights.stats()["shared"] < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(timeout=2)
+
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(sorted(results), [("answer", False)] + [("answer", True)] * 3)
+        self.assertEqual(
+            flights.stats(), {"calls": 4, "executions": 1, "shared": 3, "in_flight": 0}
+        )
+
+    def test_sequential_calls_execute_again(self):
+        flights = SingleFlight()
+        counter = iter(range(10))
+
+        self.assertEqual(flights.do("k", lambda: next(counter)), (0, False))
+        self.assertEqual(flights.do("k", lambda: next(counter)), (1, False))
+
+    def test_error_is_raised_to_every_waiter_and_key_is_released(self):
+        flights = SingleFlight()
+
+        def boom():
+            raise ValueError("upstream down")
+
+        with self.assertRaises(ValueError):
+            flights.do("k", boom)
+        self.assertEqual(flights.do("k", lambda: "ok"), ("ok", False))
+        self.assertEqual(flights.stats()["in_flight"], 0)
+
+
+class AsyncSingleFlightTests(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_coroutines_share_one_execution(self):
+        flights = AsyncSingleFlight()
+        executions = []
+
+        async def work():
+            executions.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flights.do("k", work) for _ in range(3)))
+
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(sorted(results), [("answer", False), ("answer", True), ("answer", True)])
+        self.assertEqual(flights.stats()["in_flight"], 0)
+
+    async def test_error_reaches_followers(self):
+        flights = AsyncSingleFlight()
+
+        async def boom():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream down")
+
+        results = await asyncio.gather(
+            flights.do("k", boom), flights.do("k", boom), return_exceptions=True
+        )
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(flights.stats()["executions"], 1)
+
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        flights = AsyncSingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return "answer"
+
+        leader = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await follower, ("answer", True))
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(flights.stats()["in_flight"], 0)
+
+    async def test_call_is_cancelled_once_nobody_waits(self):
+        flights = AsyncSingleFlight()
+        finished = []
+
+        async def work():
+            await asyncio.sleep(0.02)
+            finished.append(1)
+            return "answer"
+
+        callers = [asyncio.ensure_future(flights.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(finished, [])
+        self.assertEqual(flights.stats()["in_flight"], 0)
+        self.assertEqual(await flights.do("k", work), ("answer", False))
+
+
+if __name__ == "__main__":
+    unittest.main()
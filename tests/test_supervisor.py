@@ -0,0 +1,86 @@
+import os
+import signal
+import socket
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from cody.supervisor import Supervisor
+from cody.tcp_server import NDJSONRequestHandler, ReusePortTCPServer
+
+
+class SupervisorTests(unittest.TestCase):
+    def test_crashed_workers_are_restarted_until_stopped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spawns = Path(tmp) / "spawns"
+
+            def target():
+                with spawns.open("a") as handle:
+                    handle.write(f"{os.getpid()}\n")
+                if len(spawns.read_text().splitlines()) < 3:
+                    raise RuntimeError("worker crashed")
+                os.kill(os.getppid(), signal.SIGTERM)
+                time.sleep(5)
+
+            supervisor = Supervisor(target=target, workers=1, restart_delay=0.01)
+            supervisor.run()
+
+            stats = supervisor.stats()
+            self.assertEqual(len(spawns.read_text().splitlines()), 3)
+            self.assertEqual(stats["spawned"], 3)
+            self.assertEqual(stats["restarts"], 2)
+            self.assertEqual(stats["crashes"], 2)
+            self.assertEqual(stats["alive"], 0)
+
+    def test_clean_exits_are_not_restarted(self):
+        supervisor = Supervisor(target=lambda: None, workers=2, restart_delay=0.01)
+        supervisor.run()
+
+        stats = supervisor.stats()
+        self.assertEqual((stats["spawned"], stats["restarts"], stats["crashes"]), (2, 0, 0))
+
+    def test_pending_restart_does_not_delay_a_stop(self):
+        def target():
+            raise RuntimeError("worker crashed")
+
+        supervisor = Supervisor(target=target, workers=1, restart_delay=5.0)
+        previous = signal.signal(signal.SIGALRM, lambda *_: os.kill(os.getpid(), signal.SIGTERM))
+        self.addCleanup(signal.signal, signal.SIGALRM, previous)
+        signal.setitimer(signal.ITIMER_REAL, 0.3)
+        started = time.monotonic()
+        supervisor.run()
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(supervisor.stats()["spawned"], 1)
+        self.assertEqual(supervisor.stats()["restarts"], 0)
+
+    def test_stop_signal_is_forwarded_to_every_worker(self):
+        def target():
+            time.sleep(0.2)
+            os.kill(os.getppid(), signal.SIGTERM)
+            time.sleep(5)
+
+        supervisor = Supervisor(target=target, workers=3, restart_delay=0.01)
+        started = time.monotonic()
+        supervisor.run()
+
+        self.assertLess(time.monotonic() - started, 4)
+        self.assertEqual(supervisor.stats()["spawned"], 3)
+        self.assertEqual(supervisor.stats()["restarts"], 0)
+
+
+@unittest.skipUnless(hasattr(socket, "SO_REUSEPORT"), "SO_REUSEPORT not supported")
+class ReusePortTests(unittest.TestCase):
+    def test_two_servers_can_bind_the_same_port(self):
+        first = ReusePortTCPServer(("127.0.0.1", 0), NDJSONRequestHandler)
+        port = first.server_address[1]
+        try:
+            second = ReusePortTCPServer(("127.0.0.1", port), NDJSONRequestHandler)
+            second.server_close()
+        finally:
+            first.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
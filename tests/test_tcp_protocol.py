@@ -1,9 +1,19 @@
 import json
+import os
 import socket
+import stat
+import tempfile
 import threading
 import unittest
 
-from cody.tcp_server import NDJSONRequestHandler, ThreadedTCPServer, handle_command
+from cody import framing
+from cody.tcp_server import (
+    NDJSONRequestHandler,
+    ThreadedTCPServer,
+    ThreadedUnixServer,
+    handle_command,
+    handle_command_stream,
+)
 
 
 class StubRouter:
@@ -12,10 +22,39 @@ class StubRouter:
         self.provider = provider
         self.calls = []
 
-    def route_chat(self, message: str, request_id=None, recipient="unknown") -> dict:
-        self.calls.append({"message": message, "request_id": request_id, "recipient": recipient})
+    def route_chat(
+        self, message: str, request_id=None, recipient="unknown", conversation_id=None
+    ) -> dict:
+        self.calls.append(
+            {
+                "message": message,
+                "request_id": request_id,
+                "recipient": recipient,
+                "conversation_id": conversation_id,
+            }
+        )
         return {"reply": self.reply, "provider": self.provider}
 
+    def route_chat_stream(
+        self, message: str, request_id=None, recipient="unknown", conversation_id=None
+    ):
+        self.calls.append(
+            {
+                "message": message,
+                "request_id": request_id,
+                "recipient": recipient,
+                "conversation_id": conversation_id,
+            }
+        )
+        for token in self.reply.split():
+            yield {"type": "delta", "delta": token}
+        yield {"type": "final", "reply": self.reply, "provider": self.provider}
+
+    def pending_result(self, request_id: str, result_token: str) -> dict:
+        if (request_id, result_token) == ("req-done", "token"):
+            return {"status": "done", "reply": self.reply, "provider": self.provider}
+        return {"status": "unknown"}
+
 
 class TCPProtocolTests(unittest.TestCase):
     @classmethod
@@ -43,8 +82,12 @@ class TCPProtocolTests(unittest.TestCase):
         return json.loads(response.decode("utf-8"))
 
     def test_ping_command(self):
+        response = self._send_line(b'{"cmd":"ping","request_id":"req-p"}\n')
+        self.assertEqual(response, {"ok": True, "reply": "pong", "request_id": "req-p"})
+
+    def test_generated_request_id_is_echoed(self):
         response = self._send_line(b'{"cmd":"ping"}\n')
-        self.assertEqual(response, {"ok": True, "reply": "pong"})
+        self.assertEqual(len(response["request_id"]), 32)
 
     def test_phase_2_status_command(self):
         response = self._send_line(b'{"cmd":"get_phase_2_status"}\n')
@@ -57,6 +100,15 @@ class TCPProtocolTests(unittest.TestCase):
         self.assertTrue(response["ok"])
         self.assertIn("status", response)
         self.assertIn("tcp_contract_supports_phase_3", response["status"])
+        self.assertEqual(
+            set(response["router"]["providers"]),
+            {"ollama-cloud", "ollama-local"},
+        )
+
+    def test_provider_status_command_reports_breaker_state(self):
+        response = self._send_line(b'{"cmd":"get_provider_status"}\n')
+        self.assertTrue(response["ok"])
+        self.assertEqual(response["router"]["providers"]["ollama-cloud"]["state"], "closed")
 
     def test_invalid_json_framing(self):
         response = self._send_line(b'{"cmd":"ping"\n')
@@ -89,6 +141,270 @@ class TCPProtocolTests(unittest.TestCase):
         self.assertEqual(router_a.calls[0]["request_id"], "req-a")
         self.assertEqual(router_b.calls[0]["request_id"], "req-b")
 
+    def test_chat_passes_string_conversation_ids_only(self):
+        router = StubRouter(reply="ok")
+
+        handle_command({"cmd": "chat", "message": "hi", "conversation_id": "c1"}, router=router)
+        handle_command({"cmd": "chat", "message": "hi", "conversation_id": 7}, router=router)
+
+        self.assertEqual([call["conversation_id"] for call in router.calls], ["c1", None])
+
+    def test_get_result_reports_replayed_replies(self):
+        router = StubRouter(reply="later", provider="ollama-local")
+
+        fetch = {"cmd": "get_result", "request_id": "req-done"}
+        done = handle_command({**fetch, "result_token": "token"}, router=router)
+        wrong = handle_command({**fetch, "result_token": "guess"}, router=router)
+        missing = handle_command({"cmd": "get_result"}, router=router)
+        no_token = handle_command(fetch, router=router)
+
+        self.assertEqual(
+            done, {"ok": True, "status": "done", "reply": "later", "provider": "ollama-local"}
+        )
+        self.assertEqual(wrong, {"ok": True, "status": "unknown"})
+        self.assertEqual(missing, {"ok": False, "error": "missing_request_id"})
+        self.assertEqual(no_token, {"ok": False, "error": "missing_result_token"})
+
+
+class SlowStubRouter(StubRouter):
+    def __init__(self, delay: float):
+        super().__init__(reply="slow", provider="ollama-cloud")
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def route_chat(
+        self, message: str, request_id=None, recipient="unknown", conversation_id=None
+    ) -> dict:
+        import time
+
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return super().route_chat(message, request_id=request_id, recipient=recipient)
+
+
+class PipeliningTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadedTCPServer(("127.0.0.1", 0), NDJSONRequestHandler)
+        self.server.router = SlowStubRouter(delay=0.3)
+        self.server.max_in_flight = 2
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join(timeout=2)
+
+    def _exchange(self, lines: list[bytes], expected: int) -> list[dict]:
+        with socket.create_connection(
+            ("127.0.0.1", self.server.server_address[1]), timeout=5
+        ) as sock:
+            sock.sendall(b"".join(lines))
+            reader = sock.makefile("rb")
+            return [json.loads(reader.readline()) for _ in range(expected)]
+
+    def test_ping_is_answered_before_earlier_slow_chat(self):
+        responses = self._exchange(
+            [
+                b'{"cmd":"chat","message":"slow","request_id":"chat-1"}\n',
+                b'{"cmd":"ping","request_id":"ping-1"}\n',
+            ],
+            expected=2,
+        )
+
+        self.assertEqual([r["request_id"] for r in responses], ["ping-1", "chat-1"])
+        self.assertEqual(responses[1]["reply"], "slow")
+
+    def test_in_flight_commands_are_capped_per_connection(self):
+        lines = [
+            f'{{"cmd":"chat","message":"m{i}","request_id":"c{i}"}}\n'.encode() for i in range(4)
+        ]
+
+        responses = self._exchange(lines, expected=4)
+
+        self.assertEqual({r["request_id"] for r in responses}, {"c0", "c1", "c2", "c3"})
+        self.assertEqual(self.server.router.peak, 2)
+
+
+class UnixSocketTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cody.sock")
+        self.server = ThreadedUnixServer(self.path, NDJSONRequestHandler, socket_mode=0o600)
+        self.server.router = StubRouter(reply="over unix")
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join(timeout=2)
+        self.tmp.cleanup()
+
+    def test_same_protocol_over_unix_socket(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(self.path)
+            sock.sendall(
+                b'{"cmd":"ping","request_id":"p"}\n{"cmd":"chat","message":"x","request_id":"c"}\n'
+            )
+            reader = sock.makefile("rb")
+            responses = {
+                r["request_id"]: r for r in (json.loads(reader.readline()) for _ in range(2))
+            }
+
+        self.assertEqual(responses["p"]["reply"], "pong")
+        self.assertEqual(responses["c"]["reply"], "over unix")
+        self.assertEqual(self.server.router.calls[0]["recipient"], "unix-client")
+
+    def test_socket_permissions_and_cleanup(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+        self.server.shutdown()
+        self.server.server_close()
+
+        self.assertFalse(os.path.exists(self.path))
+
+
+class BinaryFramingTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadedTCPServer(("127.0.0.1", 0), NDJSONRequestHandler)
+        self.server.router = StubRouter(reply="framed reply")
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.sock = socket.create_connection(
+            ("127.0.0.1", self.server.server_address[1]), timeout=5
+        )
+        self.reader = self.sock.makefile("rb")
+
+    def tearDown(self):
+        self.reader.close()
+        self.sock.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join(timeout=2)
+
+    def test_hello_switches_connection_to_binary_frames(self):
+        self.sock.sendall(
+            b'{"cmd":"hello","encoding":"json","compression":"deflate","request_id":"h"}\n'
+        )
+        response = json.loads(self.reader.readline())
+        self.assertEqual(response["framing"], "binary")
+        self.assertEqual(response["request_id"], "h")
+
+        codec = framing.FrameCodec(encoding="json", compression="deflate")
+        self.sock.sendall(codec.encode({"cmd": "chat", "message": "x", "request_id": "c1"}))
+        reply = codec.read_frame(self.reader)
+
+        self.assertEqual(reply["reply"], "framed reply")
+        self.assertEqual(reply["request_id"], "c1")
+
+    def test_hello_after_a_command_is_refused(self):
+        self.sock.sendall(b'{"cmd":"ping","request_id":"p"}\n')
+        self.assertEqual(json.loads(self.reader.readline())["reply"], "pong")
+
+        self.sock.sendall(b'{"cmd":"hello","request_id":"h"}\n')
+        self.assertEqual(json.loads(self.reader.readline())["error"], "hello_must_be_first")
+
+    def test_invalid_frame_closes_connection(self):
+        self.sock.sendall(b'{"cmd":"hello"}\n')
+        json.loads(self.reader.readline())
+
+        self.sock.sendall(framing.HEADER.pack(3, 0) + b"{x}")
+
+        codec = framing.FrameCodec()
+        self.assertEqual(codec.read_frame(self.reader)["error"], "invalid_frame")
+        self.assertIsNone(codec.read_frame(self.reader))
+
+
+class BatchCommandTests(unittest.TestCase):
+    def test_batch_returns_results_in_order_with_isolated_errors(self):
+        router = StubRouter(reply="hi", provider="ollama-cloud")
+
+        response = handle_command(
+            {
+                "cmd": "batch",
+                "items": [
+                    {"cmd": "chat", "message": "a"},
+                    {"cmd": "run", "language": "ruby"},
+                    {"cmd": "ping", "request_id": "own-id"},
+                ],
+            },
+            router=router,
+            request_id="b1",
+        )
+
+        self.assertTrue(response["ok"])
+        self.assertEqual(response["failed"], 1)
+        results = response["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2])
+        self.assertEqual(results[0]["reply"], "hi")
+        self.assertEqual(results[1]["error"], "unsupported_language")
+        self.assertEqual(results[2]["request_id"], "own-id")
+        self.assertEqual(router.calls[0]["request_id"], "b1.0")
+
+    def test_batch_validation_errors(self):
+        self.assertEqual(handle_command({"cmd": "batch"})["error"], "invalid_batch")
+        too_many = {"cmd": "batch", "items": [{"cmd": "ping"}] * 1000}
+        self.assertEqual(handle_command(too_many)["error"], "batch_too_large")
+
+
+class StreamingCommandTests(unittest.TestCase):
+    def test_streaming_chat_emits_delta_frames_tagged_with_request_id(self):
+        router = StubRouter(reply="hello world", provider="ollama-cloud")
+
+        frames = list(
+            handle_command_stream(
+                {"cmd": "chat", "message": "hi", "stream": True},
+                router=router,
+                request_id="req-s",
+            )
+        )
+
+        self.assertEqual(
+            frames,
+            [
+                {"ok": True, "request_id": "req-s", "type": "delta", "delta": "hello"},
+                {"ok": True, "request_id": "req-s", "type": "delta", "delta": "world"},
+                {
+                    "ok": True,
+                    "request_id": "req-s",
+                    "type": "final",
+                    "reply": "hello world",
+                    "provider": "ollama-cloud",
+                },
+            ],
+        )
+
+    def test_streaming_batch_emits_item_frames_then_summary(self):
+        frames = list(
+            handle_command_stream(
+                {"cmd": "batch", "stream": True, "items": [{"cmd": "ping"}, {"cmd": "nope"}]},
+                router=StubRouter(reply="unused"),
+                request_id="b1",
+            )
+        )
+
+        self.assertEqual([frame["type"] for frame in frames], ["item", "item", "final"])
+        by_index = {frame["index"]: frame["result"] for frame in frames[:2]}
+        self.assertEqual(
+            by_index[0], {"index": 0, "request_id": "b1.0", "ok": True, "reply": "pong"}
+        )
+        self.assertEqual(by_index[1]["error"], "unknown_command")
+        self.assertEqual(
+            frames[-1], {"ok": True, "request_id": "b1", "type": "final", "count": 2, "failed": 1}
+        )
+
+    def test_non_streaming_commands_yield_single_response(self):
+        frames = list(handle_command_stream({"cmd": "ping"}))
+        self.assertEqual(frames, [{"ok": True, "reply": "pong"}])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,457 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cody import health, transport
+from cody.llm import AsyncOllamaClient, OllamaClient, StreamTruncatedError
+from cody.transport import AsyncConnectionPool, ConnectionPool
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    drop_after_response = False
+    received: list[dict] = []
+
+    def do_GET(self):
+        body = json.dumps({"models": [{"name": "resident:1b", "model": "resident:1b"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request_body = json.loads(self.rfile.read(length) or b"{}")
+        self.received.append(request_body)
+        if request_body.get("stream"):
+            self._send_stream(request_body.get("prompt", ""))
+            return
+        if self.path.endswith("/api/embed"):
+            body = json.dumps({"embeddings": [[float(len(request_body["input"])), 1.0]]}).encode()
+        else:
+            body = json.dumps({"response": f"echo:{request_body.get('prompt', '')}"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.drop_after_response:
+            # Simulate a server that silently closes idle keep-alive sockets.
+            self.close_connection = True
+
+    def _send_stream(self, prompt):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunks = [{"response": token, "done": False} for token in prompt.split()]
+        chunks.append({"response": "", "done": True})
+        for chunk in chunks:
+            data = (json.dumps(chunk) + "\n").encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        return
+
+
+class DroppingHandler(KeepAliveHandler):
+    drop_after_response = True
+
+
+class TruncatingHandler(KeepAliveHandler):
+    def _send_stream(self, prompt):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        data = (json.dumps({"response": prompt, "done": False}) + "\n").encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+        self.close_connection = True  # dropped before the done chunk and terminator
+
+
+class SlowHandler(KeepAliveHandler):
+    def do_POST(self):
+        time.sleep(0.3)
+        super().do_POST()
+
+
+class _ServerMixin:
+    handler_class = KeepAliveHandler
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), cls.handler_class)
+        cls.server.daemon_threads = True
+        cls.endpoint = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join(timeout=2)
+
+    def setUp(self):
+        transport.close_pools()
+
+    def tearDown(self):
+        transport.close_pools()
+
+
+class ConnectionPoolTests(_ServerMixin, unittest.TestCase):
+    def _pool(self, **kwargs):
+        port = self.server.server_address[1]
+        return ConnectionPool(scheme="http", host="127.0.0.1", port=port, **kwargs)
+
+    def test_sequential_requests_reuse_one_connection(self):
+        pool = self._pool()
+        for _ in range(5):
+            status, body = pool.request("POST", "/api/generate", body=b'{"prompt":"x"}')
+            self.assertEqual(status, 200)
+            self.assertEqual(json.loads(body)["response"], "echo:x")
+
+        stats = pool.stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["reused"], 4)
+        self.assertEqual(stats["idle"], 1)
+        self.assertEqual(stats["in_use"], 0)
+        pool.close()
+
+    def test_idle_connections_are_evicted_after_timeout(self):
+        pool = self._pool(idle_timeout=0.0)
+        pool.request("POST", "/api/generate", body=b"{}")
+        pool.request("POST", "/api/generate", body=b"{}")
+
+        stats = pool.stats()
+        self.assertEqual(stats["created"], 2)
+        self.assertEqual(stats["reused"], 0)
+        self.assertGreaterEqual(stats["evicted"], 1)
+        pool.close()
+
+    def test_per_host_limit_blocks_until_connection_is_free(self):
+        pool = self._pool(max_connections=1)
+        with pool.stream("POST", "/api/generate", body=b"{}") as response:
+            with self.assertRaises(TimeoutError):
+                pool.request("POST", "/api/generate", body=b"{}", timeout=0.05)
+            response.read()
+
+        self.assertEqual(pool.stats()["waits"], 1)
+        status, _ = pool.request("POST", "/api/generate", body=b"{}")
+        self.assertEqual(status, 200)
+        pool.close()
+
+    def test_unread_streamed_response_is_not_returned_to_pool(self):
+        pool = self._pool()
+        with pool.stream("POST", "/api/generate", body=b"{}"):
+            pass
+
+        self.assertEqual(pool.stats()["idle"], 0)
+        pool.close()
+
+
+class StaleConnectionTests(_ServerMixin, unittest.TestCase):
+    handler_class = DroppingHandler
+
+    def test_stale_socket_is_replaced_transparently(self):
+        port = self.server.server_address[1]
+        pool = ConnectionPool(scheme="http", host="127.0.0.1", port=port)
+        pool.request("POST", "/api/generate", body=b"{}")
+        status, _ = pool.request("POST", "/api/generate", body=b"{}")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(pool.stats()["stale_reconnects"], 1)
+        self.assertEqual(pool.stats()["created"], 2)
+        pool.close()
+
+    def test_replacement_connection_is_closed_when_the_retry_fails(self):
+        port = self.server.server_address[1]
+        pool = ConnectionPool(scheme="http", host="127.0.0.1", port=port)
+        pool.request("POST", "/api/generate", body=b"{}")
+        closed = []
+        connect = pool._connect
+
+        def tracked_connect(timeout):
+            conn = connect(timeout)
+            close = conn.close
+            conn.close = lambda: (closed.append(conn), close())
+            return conn
+
+        def always_reset(*args):
+            raise ConnectionResetError("reset")
+
+        pool._connect = tracked_connect
+        pool._send = always_reset
+
+        with self.assertRaises(ConnectionResetError):
+            pool.request("POST", "/api/generate", body=b"{}")
+        self.assertEqual(len(closed), 1)
+        self.assertEqual(pool.stats()["in_use"], 0)
+        pool.close()
+
+
+class OllamaClientPoolingTests(_ServerMixin, unittest.TestCase):
+    def test_clients_for_same_endpoint_share_a_pool(self):
+        first = OllamaClient(self.endpoint)
+        second = OllamaClient(self.endpoint + "/")
+
+        self.assertEqual(first.chat("a", model="m"), "echo:a")
+        self.assertEqual(second.chat("b", model="m"), "echo:b")
+
+        stats = transport.pool_stats()
+        self.assertEqual(len(stats), 1)
+        only = next(iter(stats.values()))
+        self.assertEqual(only["created"], 1)
+        self.assertEqual(only["reused"], 1)
+        self.assertEqual(first.pool_stats(), only)
+
+    def test_chat_stream_yields_ndjson_chunks_and_reuses_connection(self):
+        client = OllamaClient(self.endpoint)
+
+        self.assertEqual(
+            list(client.chat_stream("one two three", model="m")), ["one", "two", "three"]
+        )
+        self.assertEqual(list(client.chat_stream("four", model="m")), ["four"])
+
+        stats = client.pool_stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["reused"], 1)
+
+    def test_chat_stream_yields_nothing_when_endpoint_unreachable(self):
+        client = OllamaClient("http://127.0.0.1:9", timeout=0.5)
+        self.assertEqual(list(client.chat_stream("hello", model="m")), [])
+
+    def test_embed_returns_first_embedding(self):
+        client = OllamaClient(self.endpoint)
+        self.assertEqual(client.embed("abc", model="m"), [3.0, 1.0])
+
+    def test_chat_returns_none_when_endpoint_unreachable(self):
+        client = OllamaClient("http://127.0.0.1:9", timeout=0.5)
+        self.assertIsNone(client.chat("hello", model="m"))
+
+    def test_chat_returns_none_without_endpoint(self):
+        self.assertIsNone(OllamaClient(None).chat("hello", model="m"))
+
+    def test_latency_is_tracked_per_model_and_operation(self):
+        client = OllamaClient(self.endpoint)
+        client.chat("a", model="small")
+        client.chat("b", model="small")
+        client.embed("c", model="embedder")
+        list(client.chat_stream("d e", model="small"))
+
+        stats = client.latency_stats()
+
+        self.assertEqual(stats["small"]["generate"]["count"], 2)
+        self.assertEqual(stats["small"]["stream"]["count"], 1)
+        self.assertEqual(stats["embedder"]["embed"]["count"], 1)
+        self.assertEqual(stats["small"]["generate"]["timeout"], 30.0)  # too few samples to adapt
+
+    def test_timeout_adapts_once_enough_samples_are_recorded(self):
+        client = OllamaClient(
+            self.endpoint, timeouts=health.AdaptiveTimeout(min_samples=3, floor=0.25, ceiling=5.0)
+        )
+        for _ in range(3):
+            client.chat("a", model="small")
+
+        self.assertEqual(client.timeouts.timeout("small", "generate"), 0.25)
+
+
+    def test_keep_alive_is_sent_with_every_request(self):
+        client = OllamaClient(self.endpoint, keep_alive="30m")
+        KeepAliveHandler.received.clear()
+
+        client.chat("a", model="m")
+        client.embed("b", model="m")
+        list(client.chat_stream("c", model="m"))
+
+        self.assertEqual([body["keep_alive"] for body in KeepAliveHandler.received], ["30m"] * 3)
+        OllamaClient(self.endpoint).chat("d", model="m")
+        self.assertNotIn("keep_alive", KeepAliveHandler.received[-1])
+
+    def test_load_sends_no_prompt_and_is_tracked_apart_from_generation(self):
+        client = OllamaClient(self.endpoint, keep_alive=-1)
+        KeepAliveHandler.received.clear()
+
+        self.assertTrue(client.load("m"))
+
+        self.assertEqual(KeepAliveHandler.received, [{"model": "m", "keep_alive": -1}])
+        self.assertEqual(set(client.latency_stats()["m"]), {"load"})
+
+    def test_probe_generates_one_token_and_is_tracked_apart_from_generation(self):
+        KeepAliveHandler.received = []
+        client = OllamaClient(self.endpoint, timeouts=health.AdaptiveTimeout(default=5.0))
+
+        self.assertTrue(client.probe("m"))
+
+        self.assertEqual(KeepAliveHandler.received[-1]["options"], {"num_predict": 1})
+        self.assertEqual(set(client.latency_stats()["m"]), {"probe"})
+        self.assertFalse(OllamaClient("http://127.0.0.1:9", timeout=0.5).probe("m"))
+
+    def test_running_models_lists_loaded_models(self):
+        self.assertEqual(OllamaClient(self.endpoint).running_models(), {"resident:1b"})
+        self.assertIsNone(OllamaClient("http://127.0.0.1:9").running_models(timeout=0.5))
+
+
+class TruncatedStreamTests(_ServerMixin, unittest.TestCase):
+    handler_class = TruncatingHandler
+
+    def test_stream_dropped_before_its_done_chunk_raises_after_the_text(self):
+        deltas = []
+
+        with self.assertRaises(StreamTruncatedError):
+            for delta in OllamaClient(self.endpoint).chat_stream("partial", model="m"):
+                deltas.append(delta)
+
+        self.assertEqual(deltas, ["partial"])
+
+
+class AsyncTruncatedStreamTests(_ServerMixin, unittest.IsolatedAsyncioTestCase):
+    handler_class = TruncatingHandler
+
+    async def test_stream_dropped_before_its_done_chunk_raises_after_the_text(self):
+        deltas = []
+
+        with self.assertRaises(StreamTruncatedError):
+            async for delta in AsyncOllamaClient(self.endpoint).chat_stream("partial", model="m"):
+                deltas.append(delta)
+
+        self.assertEqual(deltas, ["partial"])
+
+
+class SlowOllamaTests(_ServerMixin, unittest.TestCase):
+    handler_class = SlowHandler
+
+    def test_timed_out_calls_are_recorded_at_the_time_waited(self):
+        client = OllamaClient(self.endpoint, timeout=0.1)
+
+        self.assertIsNone(client.chat("hello", model="m"))
+
+        stats = client.latency_stats()["m"]["generate"]
+        self.assertEqual(stats["count"], 1)
+        self.assertGreaterEqual(stats["p50"], 0.1)
+
+
+class AsyncConnectionPoolTests(_ServerMixin, unittest.IsolatedAsyncioTestCase):
+    def _pool(self, **kwargs):
+        port = self.server.server_address[1]
+        return AsyncConnectionPool(scheme="http", host="127.0.0.1", port=port, **kwargs)
+
+    async def test_sequential_requests_reuse_one_connection(self):
+        pool = self._pool()
+        for _ in range(3):
+            status, body = await pool.request("POST", "/api/generate", body=b'{"prompt":"x"}')
+            self.assertEqual(status, 200)
+            self.assertEqual(json.loads(body)["response"], "echo:x")
+
+        stats = pool.stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["reused"], 2)
+        self.assertEqual(stats["in_use"], 0)
+        pool.close()
+
+    async def test_per_host_limit_times_out_waiting_for_a_connection(self):
+        pool = self._pool(max_connections=1)
+        async with pool.stream("POST", "/api/generate", body=b"{}") as response:
+            with self.assertRaises(TimeoutError):
+                await pool.request("POST", "/api/generate", body=b"{}", timeout=0.05)
+            await response.read()
+
+        self.assertEqual(pool.stats()["waits"], 1)
+        pool.close()
+
+    async def test_chunked_body_is_read_line_by_line(self):
+        pool = self._pool()
+        body = json.dumps({"prompt": "a b", "stream": True}).encode()
+        async with pool.stream("POST", "/api/generate", body=body) as response:
+            lines = [json.loads(line) async for line in response.iter_lines()]
+
+        self.assertEqual([line["response"] for line in lines], ["a", "b", ""])
+        self.assertEqual(pool.stats()["idle"], 1)
+        pool.close()
+
+
+class AsyncStaleConnectionTests(_ServerMixin, unittest.IsolatedAsyncioTestCase):
+    handler_class = DroppingHandler
+
+    async def test_closed_idle_socket_is_not_reused(self):
+        port = self.server.server_address[1]
+        pool = AsyncConnectionPool(scheme="http", host="127.0.0.1", port=port)
+        await pool.request("POST", "/api/generate", body=b"{}")
+        status, _ = await pool.request("POST", "/api/generate", body=b"{}")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(pool.stats()["created"], 2)
+        pool.close()
+
+
+class AsyncStaleRetryTests(_ServerMixin, unittest.IsolatedAsyncioTestCase):
+    async def test_replacement_connection_is_closed_when_the_retry_fails(self):
+        port = self.server.server_address[1]
+        pool = AsyncConnectionPool(scheme="http", host="127.0.0.1", port=port)
+        await pool.request("POST", "/api/generate", body=b"{}")
+        writers = []
+        connect = pool._connect
+
+        async def tracked_connect(timeout):
+            reader, writer = await connect(timeout)
+            writers.append(writer)
+            return reader, writer
+
+        async def always_reset(*args):
+            raise ConnectionResetError("reset")
+
+        pool._connect = tracked_connect
+        pool._send = always_reset
+
+        with self.assertRaises(ConnectionResetError):
+            await pool.request("POST", "/api/generate", body=b"{}")
+        self.assertEqual(pool.stats()["stale_reconnects"], 1)
+        self.assertTrue(writers[0].is_closing())
+        pool.close()
+
+
+class AsyncOllamaClientTests(_ServerMixin, unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        transport.close_async_pools()
+
+    async def test_chat_and_embed_share_the_loop_pool(self):
+        client = AsyncOllamaClient(self.endpoint)
+
+        self.assertEqual(await client.chat("a", model="m"), "echo:a")
+        self.assertEqual(await client.embed("abc", model="m"), [3.0, 1.0])
+
+        stats = transport.async_pool_stats()[self.endpoint]
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["reused"], 1)
+
+    async def test_async_client_shares_latency_histograms_with_its_sync_client(self):
+        sync_client = OllamaClient(self.endpoint)
+        client = AsyncOllamaClient.from_client(sync_client)
+
+        await client.chat("a", model="m")
+
+        self.assertIs(client.timeouts, sync_client.timeouts)
+        self.assertEqual(sync_client.latency_stats()["m"]["generate"]["count"], 1)
+
+    async def test_chat_stream_yields_ndjson_chunks(self):
+        client = AsyncOllamaClient(self.endpoint)
+
+        deltas = [delta async for delta in client.chat_stream("one two", model="m")]
+
+        self.assertEqual(deltas, ["one", "two"])
+
+    async def test_chat_returns_none_when_endpoint_unreachable(self):
+        client = AsyncOllamaClient("http://127.0.0.1:9", timeout=0.5)
+
+        self.assertIsNone(await client.chat("hello", model="m"))
+        self.assertEqual([delta async for delta in client.chat_stream("hello", model="m")], [])
+
+
+if __name__ == "__main__":
+    unittest.main()